@@ -1,16 +1,19 @@
 # Author: SANJAY KR
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import inspect
 from flask_cors import CORS
 import os
+import time
 from dotenv import load_dotenv
+from .utils.metrics import metrics
 
 load_dotenv()
 
 db = SQLAlchemy()
+_log_handler = None
 
 def create_app():
+    started = time.perf_counter()
     app = Flask(__name__,
                 static_folder='static',
                 template_folder='templates')
@@ -19,131 +22,96 @@ def create_app():
     # Load all configurations first
     app.config.update(
         DEBUG=True,
+        LAZY_STARTUP=os.environ.get('LAZY_STARTUP', 'false').lower() in ('1', 'true', 'yes'),
         SQLALCHEMY_DATABASE_URI=os.environ.get('DATABASE_URL', 'postgresql://postgres:postgres@db:5432/whatsapp_bot'),
         SQLALCHEMY_TRACK_MODIFICATIONS=False,
+        DB_POOL_SIZE=int(os.environ.get('DB_POOL_SIZE', '5')),
+        DB_MAX_OVERFLOW=int(os.environ.get('DB_MAX_OVERFLOW', '10')),
+        DB_POOL_TIMEOUT=float(os.environ.get('DB_POOL_TIMEOUT', '30')),
+        DB_POOL_RECYCLE=int(os.environ.get('DB_POOL_RECYCLE', '1800')),
+        DB_POOL_PRE_PING=os.environ.get('DB_POOL_PRE_PING', 'true').lower() in ('1', 'true', 'yes'),
+        DB_STATEMENT_TIMEOUT_MS=int(os.environ.get('DB_STATEMENT_TIMEOUT_MS', '0')),
         JWT_SECRET_KEY=os.environ.get('JWT_SECRET_KEY', 'development-secret-key-do-not-use-in-production'),
         JWT_ALGORITHM=os.environ.get('JWT_ALGORITHM', 'HS256'),
         JWT_ACCESS_TOKEN_EXPIRE_MINUTES=int(os.environ.get('JWT_ACCESS_TOKEN_EXPIRE_MINUTES', '30')),
         ADMIN_USERNAME=os.environ.get('ADMIN_USERNAME', 'admin'),
-        ADMIN_PASSWORD=os.environ.get('ADMIN_PASSWORD', 'admin')
+        ADMIN_PASSWORD=os.environ.get('ADMIN_PASSWORD', 'admin'),
+        JWT_CACHE_SIZE=int(os.environ.get('JWT_CACHE_SIZE', '1024')),
+        SESSION_STORE=os.environ.get('SESSION_STORE', 'memory'),
+        SESSION_STORE_URL=os.environ.get('SESSION_STORE_URL'),
+        SESSION_STORE_POOL_SIZE=int(os.environ.get('SESSION_STORE_POOL_SIZE', '5')),
+        SESSION_STORE_MAX_OVERFLOW=int(os.environ.get('SESSION_STORE_MAX_OVERFLOW', '10')),
+        SESSION_TTL_SECONDS=int(os.environ.get('SESSION_TTL_SECONDS', '3600')),
+        SESSION_MAX_SESSIONS=int(os.environ.get('SESSION_MAX_SESSIONS', '10000')),
+        SESSION_SWEEP_INTERVAL=int(os.environ.get('SESSION_SWEEP_INTERVAL', '60')),
+        SESSION_LOCK_STRIPES=int(os.environ.get('SESSION_LOCK_STRIPES', '1024')),
+        MESSAGE_DEDUP_STORE=os.environ.get('MESSAGE_DEDUP_STORE'),
+        MESSAGE_DEDUP_TTL_SECONDS=int(os.environ.get('MESSAGE_DEDUP_TTL_SECONDS', '3600')),
+        MESSAGE_DEDUP_MAX_ENTRIES=int(os.environ.get('MESSAGE_DEDUP_MAX_ENTRIES', '10000')),
+        FAMILY_DIRECTORY_TTL_SECONDS=int(os.environ.get('FAMILY_DIRECTORY_TTL_SECONDS', '300')),
+        FAMILY_DIRECTORY_MAX_ENTRIES=int(os.environ.get('FAMILY_DIRECTORY_MAX_ENTRIES', '50000')),
+        ADMIN_RESPONSE_CACHE_SIZE=int(os.environ.get('ADMIN_RESPONSE_CACHE_SIZE', '256')),
+        ADMIN_RESPONSE_CACHE_MAX_BYTES=int(os.environ.get('ADMIN_RESPONSE_CACHE_MAX_BYTES', str(64 * 1024 * 1024))),
+        OUTBOUND_QUEUE_WORKERS=int(os.environ.get('OUTBOUND_QUEUE_WORKERS', '4')),
+        OUTBOUND_QUEUE_SIZE=int(os.environ.get('OUTBOUND_QUEUE_SIZE', '1000')),
+        OUTBOUND_MAX_RETRIES=int(os.environ.get('OUTBOUND_MAX_RETRIES', '3')),
+        OUTBOUND_RETRY_BACKOFF=float(os.environ.get('OUTBOUND_RETRY_BACKOFF', '0.5')),
+        OUTBOUND_RESERVE_TIMEOUT=float(os.environ.get('OUTBOUND_RESERVE_TIMEOUT', '2')),
+        SEND_RATE_PER_SECOND=float(os.environ.get('SEND_RATE_PER_SECOND', '10')),
+        SEND_RATE_BURST=os.environ.get('SEND_RATE_BURST'),
+        SEND_RATE_STORE=os.environ.get('SEND_RATE_STORE'),
+        BROADCAST_WORKERS=int(os.environ.get('BROADCAST_WORKERS', '16')),
+        BROADCAST_BATCH_SIZE=int(os.environ.get('BROADCAST_BATCH_SIZE', '500')),
+        BROADCAST_COUNTRY_CODE=os.environ.get('BROADCAST_COUNTRY_CODE', '91'),
+        BROADCAST_LEASE_SECONDS=float(os.environ.get('BROADCAST_LEASE_SECONDS', '60')),
+        ASGI_DB_CONCURRENCY=int(os.environ.get('ASGI_DB_CONCURRENCY', '10')),
+        ASGI_WSGI_THREADS=int(os.environ.get('ASGI_WSGI_THREADS', '8')),
+        ASGI_OUTBOUND_CONCURRENCY=int(os.environ.get('ASGI_OUTBOUND_CONCURRENCY', '64'))
     )
     
     # Configure logging
     import logging
     import sys
     
-    handler = logging.StreamHandler(sys.stdout)
-    handler.setLevel(logging.DEBUG)
-    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-    handler.setFormatter(formatter)
-    app.logger.addHandler(handler)
+    global _log_handler
+    # Apps share the "app" logger, so later create_app() calls reuse the handler
+    if _log_handler is None:
+        _log_handler = logging.StreamHandler(sys.stdout)
+        _log_handler.setLevel(logging.DEBUG)
+        formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+        _log_handler.setFormatter(formatter)
+    if _log_handler not in app.logger.handlers:
+        app.logger.addHandler(_log_handler)
     app.logger.setLevel(logging.DEBUG)
     
     app.logger.info("Starting Flask application")
     
-    # Log environment variables
-    app.logger.info("Environment variables:")
-    for key, value in os.environ.items():
-        if not any(sensitive in key.lower() for sensitive in ['password', 'secret', 'token']):
-            app.logger.info(f"{key}: {value}")
-            
     # Set Flask secret key
-    app.config['SECRET_KEY'] = os.environ.get('JWT_SECRET_KEY', 'development-secret-key-do-not-use-in-production')
-    app.logger.info("Flask configuration loaded")
-    
-    # Load configuration
-    # JWT Configuration
-    app.config.update(
-        JWT_SECRET_KEY=os.environ.get('JWT_SECRET_KEY', 'development-secret-key-do-not-use-in-production'),
-        JWT_ALGORITHM=os.environ.get('JWT_ALGORITHM', 'HS256'),
-        JWT_ACCESS_TOKEN_EXPIRE_MINUTES=int(os.environ.get('JWT_ACCESS_TOKEN_EXPIRE_MINUTES', '30')),
-        ADMIN_USERNAME=os.environ.get('ADMIN_USERNAME', 'admin'),
-        ADMIN_PASSWORD=os.environ.get('ADMIN_PASSWORD', 'admin')
-    )
-    
-    # Log configuration status
-    app.logger.info(f"JWT_ALGORITHM: {app.config['JWT_ALGORITHM']}")
-    app.logger.info(f"JWT_ACCESS_TOKEN_EXPIRE_MINUTES: {app.config['JWT_ACCESS_TOKEN_EXPIRE_MINUTES']}")
-    app.logger.info(f"JWT_SECRET_KEY is set: {bool(app.config['JWT_SECRET_KEY'])}")
-    app.logger.info(f"JWT_SECRET_KEY configured: {bool(app.config.get('JWT_SECRET_KEY'))}")
-    app.logger.info(f"JWT_ALGORITHM configured: {app.config.get('JWT_ALGORITHM')}")
-    app.logger.info("Flask configuration loaded successfully")
-    
-    # Verify configuration loaded correctly
-    app.logger.info("Verifying configuration...")
-    app.logger.info(f"ADMIN_USERNAME: {app.config.get('ADMIN_USERNAME')}")
-    app.logger.info(f"JWT_SECRET_KEY: {bool(app.config.get('JWT_SECRET_KEY'))}")
-    app.logger.info(f"JWT_ALGORITHM: {app.config.get('JWT_ALGORITHM')}")
+    app.config['SECRET_KEY'] = app.config['JWT_SECRET_KEY']
     
     # Ensure critical config values are set
     assert app.config.get('ADMIN_USERNAME'), "ADMIN_USERNAME must be configured"
     assert app.config.get('ADMIN_PASSWORD'), "ADMIN_PASSWORD must be configured"
     assert app.config.get('JWT_SECRET_KEY'), "JWT_SECRET_KEY must be configured"
     
-    # Log configuration values for debugging (without sensitive data)
-    app.logger.info("Configuration loaded:")
-    app.logger.info(f"JWT_ALGORITHM: {app.config['JWT_ALGORITHM']}")
-    app.logger.info(f"JWT_ACCESS_TOKEN_EXPIRE_MINUTES: {app.config['JWT_ACCESS_TOKEN_EXPIRE_MINUTES']}")
-    app.logger.info(f"JWT_SECRET_KEY is set: {bool(app.config.get('JWT_SECRET_KEY'))}")
-    
-    # Log configuration for debugging
-    app.logger.info(f"JWT_SECRET_KEY configured: {bool(app.config.get('JWT_SECRET_KEY'))}")
-    app.logger.info(f"JWT_ALGORITHM configured: {app.config.get('JWT_ALGORITHM')}")
-    
-    # Ensure critical config values are set
-    assert "JWT_SECRET_KEY" in app.config, "JWT_SECRET_KEY must be configured"
-    assert "JWT_ACCESS_TOKEN_EXPIRE_MINUTES" in app.config, "JWT_ACCESS_TOKEN_EXPIRE_MINUTES must be configured"
-    
-    app.logger.info("Flask configuration loaded successfully")
+    app.logger.info(f"Flask configuration loaded (JWT_ALGORITHM: {app.config['JWT_ALGORITHM']}, "
+                    f"JWT_ACCESS_TOKEN_EXPIRE_MINUTES: {app.config['JWT_ACCESS_TOKEN_EXPIRE_MINUTES']})")
     
+    # One pooled engine per worker; requests release their session at teardown
+    from .models.base import engine_options, init_session_lifecycle, pool_stats
+    from .models import family, broadcast  # noqa: F401  (register every table before create_all)
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config, app.config['SQLALCHEMY_DATABASE_URI'])
     db.init_app(app)
-    
+    init_session_lifecycle(app)
     with app.app_context():
+        engine = db.engine
+    metrics.register_gauges("db_pool", lambda: pool_stats(engine))
+    
+    # Lazy startup leaves tables, sample data and the Twilio check to `flask preflight`
+    if not app.config['LAZY_STARTUP']:
+        from .utils.startup import prepare_database
         try:
-            app.logger.info("Initializing database connection...")
-            app.logger.info(f"Database URI: {app.config['SQLALCHEMY_DATABASE_URI']}")
-            
-            app.logger.info("Checking database tables...")
-            from .models.family import Samaj, Member
-            
-            inspector = inspect(db.engine)
-            existing_tables = inspector.get_table_names()
-            app.logger.info(f"Existing tables: {existing_tables}")
-            
-            if not existing_tables:
-                app.logger.info("Creating database tables...")
-                db.create_all()
-                app.logger.info("Database tables created successfully")
-                
-                # Check if there's any data
-                samaj_count = db.session.query(Samaj).count()
-                if samaj_count == 0:
-                    app.logger.info("Generating sample data...")
-                    try:
-                        from app.utils.generate_sample_data import generate_sample_data
-                        generate_sample_data(db.session, 50)
-                        app.logger.info("Sample data generated successfully")
-                    except Exception as e:
-                        app.logger.error(f"Error during sample data generation: {str(e)}")
-                        db.session.rollback()
-                        raise
-                    app.logger.info("Sample data generation completed")
-                else:
-                    app.logger.info(f"Using existing data: {samaj_count} samaj records found")
-            else:
-                app.logger.info(f"Using existing tables: {existing_tables}")
-            
-            if db.session.query(Samaj).first() is None:
-                app.logger.info("Generating sample data...")
-                try:
-                    from app.utils.generate_sample_data import generate_sample_data
-                    generate_sample_data(db.session, 50)
-                    app.logger.info("Sample data generated successfully")
-                except Exception as e:
-                    app.logger.error(f"Error during sample data generation: {str(e)}")
-                    db.session.rollback()
-                    raise
-                app.logger.info("Sample data generation completed")
+            prepare_database(app)
         except Exception as e:
             app.logger.error(f"Error during database initialization: {str(e)}")
             raise
@@ -152,19 +120,42 @@ def create_app():
     from .services.whatsapp_service import WhatsAppService, get_whatsapp_service
     
     # Initialize service in app context
+    from .services.broadcast import get_broadcast_runner
     with app.app_context():
         get_whatsapp_service()
+        # Renews this worker's broadcast leases and resumes jobs whose worker died
+        get_broadcast_runner().start_monitor()
     
     from .routes.whatsapp import whatsapp_bp
     from .routes.admin import admin_bp
     from .routes.auth import auth_bp
+    from .routes.metrics import metrics_bp
+    from .routes.health import health_bp
     
     app.register_blueprint(whatsapp_bp, url_prefix="/api/v1/whatsapp")
     app.register_blueprint(admin_bp, url_prefix="/api/v1/admin")
     app.register_blueprint(auth_bp, url_prefix="/api/v1/auth")
+    app.register_blueprint(metrics_bp)
+    app.register_blueprint(health_bp)
     
     # Register CLI commands
-    from .cli import check_db
+    from .cli import (check_db, session_stats, create_indexes, import_members_command, generate_data, preflight,
+                      rebuild_analytics, fold_analytics, backfill_tags, normalize_names)
     app.cli.add_command(check_db)
+    app.cli.add_command(session_stats)
+    app.cli.add_command(create_indexes)
+    app.cli.add_command(import_members_command)
+    app.cli.add_command(generate_data)
+    app.cli.add_command(preflight)
+    app.cli.add_command(rebuild_analytics)
+    app.cli.add_command(fold_analytics)
+    app.cli.add_command(backfill_tags)
+    app.cli.add_command(normalize_names)
+    
+    boot_seconds = time.perf_counter() - started
+    app.extensions['boot_seconds'] = boot_seconds
+    metrics.register_gauges("app", lambda: {"boot_seconds": boot_seconds})
+    app.logger.info(f"Application started in {boot_seconds * 1000:.0f} ms "
+                    f"({'lazy' if app.config['LAZY_STARTUP'] else 'full'} startup)")
     
     return app
@@ -0,0 +1,203 @@
+# Author: SANJAY KR
+"""Optional ASGI entry point, alongside the WSGI app in app.main.
+
+    uvicorn --factory app.asgi:create_asgi_app --host 0.0.0.0 --port 8000 --workers 4
+
+The WhatsApp webhook is served on the event loop: the form is parsed there and replies go
+out through an AsyncOutboundQueue, so a slow Twilio call holds a coroutine, not a worker.
+The conversation step itself is WhatsAppService's usual code on the sync SQLAlchemy
+engine, run on a pool of ASGI_DB_CONCURRENCY threads; keep that at or below the database
+pool size. Every other route is the Flask app, called through a small WSGI bridge.
+"""
+import asyncio
+import io
+import json
+import logging
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl
+
+from flask import Flask
+
+from .controllers.whatsapp_controller import handle_webhook
+from .models.base import get_db
+from .services.async_outbound import AsyncOutboundQueue
+from .services.outbound_queue import OutboundQueueFull
+from .routes.whatsapp import (
+    MEDIA_REJECTED, ERROR_REPLY, BUSY_RETRY_AFTER, has_media, sender_phone, dev_reply, twiml_reply
+)
+from .utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_PATH = "/api/v1/whatsapp/webhook"
+
+Response = Tuple[int, str, bytes]
+
+
+class ASGIApp:
+    def __init__(self, flask_app: Flask):
+        self.flask_app = flask_app
+        self.service = flask_app.extensions.get("whatsapp_service")
+        self.dev_mode = os.getenv("FLASK_ENV") == "development"
+        self.db_executor = ThreadPoolExecutor(int(flask_app.config.get("ASGI_DB_CONCURRENCY", 10)),
+                                              thread_name_prefix="asgi-db")
+        self.wsgi_executor = ThreadPoolExecutor(int(flask_app.config.get("ASGI_WSGI_THREADS", 8)),
+                                                thread_name_prefix="asgi-wsgi")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self.lifespan(receive, send)
+        elif scope["type"] == "http":
+            if scope["path"] == WEBHOOK_PATH and scope["method"] == "POST":
+                await self.webhook(receive, send)
+            else:
+                await self.wsgi(scope, receive, send)
+
+    async def lifespan(self, receive, send) -> None:
+        while True:
+            event = await receive()
+            if event["type"] == "lifespan.startup":
+                await self.startup()
+                await send({"type": "lifespan.startup.complete"})
+            elif event["type"] == "lifespan.shutdown":
+                await self.shutdown()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def startup(self) -> None:
+        if self.service is not None:
+            self.service.start_async_outbound(self.flask_app)
+
+    async def shutdown(self) -> None:
+        outbound = self.service.outbound_queue if self.service is not None else None
+        if isinstance(outbound, AsyncOutboundQueue):
+            await outbound.join()
+            await outbound.close()
+        http_client = getattr(getattr(self.service, "async_client", None), "http_client", None)
+        if http_client is not None and hasattr(http_client, "close"):
+            await http_client.close()
+        self.db_executor.shutdown()
+        self.wsgi_executor.shutdown()
+
+    async def webhook(self, receive, send) -> None:
+        with metrics.span("webhook"):
+            status, content_type, body = await self._webhook(await read_body(receive))
+        headers = [(b"content-type", content_type.encode("latin-1")),
+                   (b"content-length", str(len(body)).encode("latin-1"))]
+        if status == 503:
+            headers.append((b"retry-after", BUSY_RETRY_AFTER.encode("latin-1")))
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
+
+    async def _webhook(self, body: bytes) -> Response:
+        try:
+            with metrics.span("parse_form"):
+                form = dict(parse_qsl(body.decode("utf-8"), keep_blank_values=True))
+            if has_media(form):
+                return json_response({"success": False, "message": MEDIA_REJECTED}, 400)
+
+            phone_number = sender_phone(form)
+            message = form.get("Body", "")
+            loop = asyncio.get_running_loop()
+            response, success = await loop.run_in_executor(
+                self.db_executor, self._handle, phone_number, message, form.get("MessageSid")
+            )
+            if self.dev_mode:
+                return json_response(dev_reply(response, phone_number, message))
+            return 200, "text/xml", twiml_reply(response).encode("utf-8")
+        except OutboundQueueFull as e:
+            logger.warning(f"Webhook refused, {str(e)}")
+            return 503, "text/plain", b""
+        except Exception as e:
+            logger.error(f"Webhook error: {str(e)}")
+            return 500, "text/xml", twiml_reply(ERROR_REPLY).encode("utf-8")
+
+    def _handle(self, phone_number: str, message: str, message_sid: Optional[str]) -> Tuple[str, bool]:
+        """The Flask webhook's conversation step, in an app context on a DB thread"""
+        with self.flask_app.app_context():
+            self.flask_app.logger.info(f"Received webhook: from={phone_number}, message={message}")
+            with metrics.span("handle_webhook"):
+                return handle_webhook(phone_number=phone_number, message=message, db=get_db(),
+                                      message_sid=message_sid)
+
+    async def wsgi(self, scope, receive, send) -> None:
+        """Run any other route through Flask on a thread, streaming its body back"""
+        environ = wsgi_environ(scope, await read_body(receive))
+        loop = asyncio.get_running_loop()
+
+        def send_from_thread(event: Dict[str, Any]) -> None:
+            asyncio.run_coroutine_threadsafe(send(event), loop).result()
+
+        def start_response(status: str, headers: List[Tuple[str, str]], exc_info=None):
+            send_from_thread({"type": "http.response.start", "status": int(status.split(" ", 1)[0]),
+                              "headers": [(name.lower().encode("latin-1"), value.encode("latin-1"))
+                                          for name, value in headers]})
+            return lambda data: send_from_thread({"type": "http.response.body", "body": data, "more_body": True})
+
+        def run() -> None:
+            result = self.flask_app(environ, start_response)
+            try:
+                for chunk in result:
+                    if chunk:
+                        send_from_thread({"type": "http.response.body", "body": chunk, "more_body": True})
+            finally:
+                if hasattr(result, "close"):
+                    result.close()
+            send_from_thread({"type": "http.response.body", "body": b""})
+
+        await loop.run_in_executor(self.wsgi_executor, run)
+
+
+async def read_body(receive) -> bytes:
+    chunks = []
+    while True:
+        event = await receive()
+        chunks.append(event.get("body", b""))
+        if not event.get("more_body"):
+            return b"".join(chunks)
+
+
+def json_response(payload: Dict[str, Any], status: int = 200) -> Response:
+    return status, "application/json", json.dumps(payload).encode("utf-8")
+
+
+def wsgi_environ(scope, body: bytes) -> Dict[str, Any]:
+    """PEP 3333 environ for an ASGI HTTP scope"""
+    server = scope.get("server") or ("localhost", 80)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "CONTENT_LENGTH": str(len(body)),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    if scope.get("client"):
+        environ["REMOTE_ADDR"] = scope["client"][0]
+    for name, value in scope.get("headers", []):
+        name, value = name.decode("latin-1"), value.decode("latin-1")
+        if name == "content-type":
+            environ["CONTENT_TYPE"] = value
+        elif name != "content-length":
+            key = "HTTP_" + name.upper().replace("-", "_")
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+def create_asgi_app(flask_app: Optional[Flask] = None) -> ASGIApp:
+    if flask_app is None:
+        from . import create_app
+        flask_app = create_app()
+    return ASGIApp(flask_app)
@@ -16,5 +16,142 @@ def check_db():
     except Exception as e:
         click.echo(f'Error checking database: {str(e)}')
 
+@click.command('session-stats')
+@click.option('--sweep', is_flag=True, help='Evict expired sessions before reporting.')
+@with_appcontext
+def session_stats(sweep):
+    """Show conversation session store metrics."""
+    from .services.whatsapp_service import get_whatsapp_service
+    try:
+        store = get_whatsapp_service().session_store
+        if sweep:
+            click.echo(f'Evicted sessions: {store.sweep()}')
+        for key, value in store.stats().items():
+            click.echo(f'{key}: {value}')
+    except Exception as e:
+        click.echo(f'Error reading session store: {str(e)}')
+
+@click.command('create-indexes')
+@with_appcontext
+def create_indexes():
+    """Add missing indexes to an existing database."""
+    from .models.base import create_indexes as create_missing_indexes
+    try:
+        created = create_missing_indexes()
+        click.echo(f'Created indexes: {", ".join(created) if created else "none"}')
+    except Exception as e:
+        click.echo(f'Error creating indexes: {str(e)}')
+
+@click.command('import-members')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'ndjson']), help='Defaults to the file extension.')
+@click.option('--batch-size', default=1000, show_default=True, help='Rows inserted per transaction.')
+@with_appcontext
+def import_members_command(path, fmt, batch_size):
+    """Bulk import members from a CSV or NDJSON file."""
+    from .services.bulk_import import import_members
+    fmt = fmt or ('ndjson' if path.endswith(('.ndjson', '.jsonl')) else 'csv')
+    with open(path, encoding='utf-8-sig', newline='') as stream:
+        report = import_members(db.session, stream, fmt, batch_size)
+    click.echo(f'Imported {report.imported} of {report.total} rows in {report.elapsed:.2f}s '
+               f'({report.rows_per_sec:.0f} rows/sec)')
+    for error in report.errors:
+        click.echo(f'Row {error["row"]}: {error["error"]}')
+    if report.failed > len(report.errors):
+        click.echo(f'... and {report.failed - len(report.errors)} more errors')
+
+@click.command('generate-data')
+@click.option('--samaj', 'samaj_count', default=10, show_default=True, help='Number of Samaj to fill.')
+@click.option('--families-per-samaj', default=5, show_default=True)
+@click.option('--members-per-family', default=5, show_default=True)
+@click.option('--seed', type=int, help='Random seed; the same seed generates the same data.')
+@click.option('--batch-size', default=1000, show_default=True, help='Families inserted per transaction.')
+@click.option('--workers', default=1, show_default=True, help='Processes generating rows.')
+@with_appcontext
+def generate_data(samaj_count, families_per_samaj, members_per_family, seed, batch_size, workers):
+    """Generate synthetic Samaj, families and members for load testing."""
+    from .utils.generate_sample_data import generate_dataset
+    total = samaj_count * families_per_samaj
+    with click.progressbar(length=total, label='Generating families') as bar:
+        stats = generate_dataset(
+            db.session, samaj_count, families_per_samaj, members_per_family, seed=seed,
+            batch_size=batch_size, workers=workers, progress=lambda families, members: bar.update(families)
+        )
+    click.echo(f'Generated {stats["samaj"]} samaj, {stats["families"]} families and {stats["members"]} members '
+               f'in {stats["elapsed"]:.2f}s ({stats["members_per_sec"]:.0f} members/sec, seed {stats["seed"]})')
+    if stats["samaj"] < samaj_count:
+        click.echo(f'Skipped {samaj_count - stats["samaj"]} samaj that already exist')
+
+@click.command('preflight')
+@click.option('--create-tables', is_flag=True, help='Create missing tables first.')
+@click.option('--sample-data', is_flag=True, help='With --create-tables, fill an empty database with sample data.')
+@with_appcontext
+def preflight(create_tables, sample_data):
+    """Run the database and Twilio checks that LAZY_STARTUP skips."""
+    from flask import current_app
+    from .utils.startup import prepare_database, run_checks
+    app = current_app._get_current_object()
+    if create_tables:
+        prepare_database(app, sample_data=sample_data)
+    results = run_checks(app)
+    for name, result in results.items():
+        status = 'ok' if result['ok'] else f'FAILED ({result["error"]})'
+        if result.get('skipped'):
+            status = f'skipped ({result["skipped"]})'
+        click.echo(f'{name}: {status} in {result["seconds"] * 1000:.0f} ms')
+    if not all(result['ok'] for result in results.values()):
+        raise SystemExit(1)
+
+@click.command('rebuild-analytics')
+@with_appcontext
+def rebuild_analytics():
+    """Recount the /admin/analytics counters from the member table."""
+    from .models.analytics import rebuild_member_stats
+    try:
+        click.echo(f'Analytics counters rebuilt from {rebuild_member_stats(db.session)} members')
+    except Exception as e:
+        click.echo(f'Error rebuilding analytics: {str(e)}')
+
+@click.command('fold-analytics')
+@with_appcontext
+def fold_analytics():
+    """Fold the member_stat_delta rows into the /admin/analytics counters."""
+    from .models.analytics import fold_member_stat_deltas
+    try:
+        click.echo(f'Folded {fold_member_stat_deltas(db.session)} analytics deltas')
+    except Exception as e:
+        click.echo(f'Error folding analytics: {str(e)}')
+
+@click.command('backfill-tags')
+@click.option('--batch-size', default=1000, show_default=True, help='Members per transaction')
+@with_appcontext
+def backfill_tags(batch_size):
+    """Rebuild the member tag tables from the comma-separated member columns."""
+    from .models.tags import backfill_member_tags
+    try:
+        click.echo(f'Tags rebuilt for {backfill_member_tags(db.session, batch_size)} members')
+    except Exception as e:
+        click.echo(f'Error rebuilding tags: {str(e)}')
+
+@click.command('normalize-names')
+@click.option('--batch-size', default=1000, show_default=True, help='Members per transaction')
+@with_appcontext
+def normalize_names(batch_size):
+    """Collapse repeated spaces in member names saved by older versions."""
+    from .services.family_directory import normalize_member_names
+    try:
+        click.echo(f'Normalized {normalize_member_names(db.session, batch_size)} member names')
+    except Exception as e:
+        click.echo(f'Error normalizing names: {str(e)}')
+
 def init_app(app):
     app.cli.add_command(check_db)
+    app.cli.add_command(session_stats)
+    app.cli.add_command(create_indexes)
+    app.cli.add_command(import_members_command)
+    app.cli.add_command(generate_data)
+    app.cli.add_command(preflight)
+    app.cli.add_command(rebuild_analytics)
+    app.cli.add_command(fold_analytics)
+    app.cli.add_command(backfill_tags)
+    app.cli.add_command(normalize_names)
@@ -1,23 +1,41 @@
 # Author: SANJAY KR
-from sqlalchemy.orm import Session
-from sqlalchemy import and_
+from sqlalchemy.orm import Session, aliased, joinedload
+from sqlalchemy import and_, func, select
 from ..models.family import Samaj, Member, Family
-from typing import List, Optional, Dict
+from ..models.tags import TAG_KINDS, tag_filter
+from ..models.analytics import AGE_BANDS, OLDEST_BAND, UNKNOWN, read_member_stats
+from typing import Iterator, List, Optional, Dict, Tuple
 import csv
 from io import StringIO
 from flask import current_app
 from app import db
 
-def get_members(db_session=None, filters: Optional[Dict] = None) -> List[Member]:
-    if db_session is None:
-        db_session = db.session
-    query = db_session.query(Member).\
-        join(Family, Member.family_id == Family.id).\
-        join(Samaj, and_(Member.samaj_id == Samaj.id, Family.samaj_id == Samaj.id)).\
-        distinct()
-    
+MEMBER_PAGE_SIZE = 100
+MAX_MEMBER_PAGE_SIZE = 1000
+ANALYTICS_TOP = 20
+
+# Columns returned by the member list; selecting them directly avoids loading
+# full Member rows and lazy-loading samaj/family for every member
+MEMBER_LIST_COLUMNS = (
+    Member.id,
+    Samaj.name.label("samaj"),
+    Family.name.label("family"),
+    Member.name,
+    Member.family_role.label("role"),
+    Member.age,
+    Member.blood_group,
+    Member.mobile_1.label("mobile"),
+    Member.email,
+    Member.current_city.label("city"),
+    Member.profession_category.label("profession"),
+    Member.is_family_head
+)
+
+def filter_members(query, filters: Optional[Dict] = None):
+    """Apply the admin member filters to a query joining Member, Family and Samaj.
+    Raises ValueError for a non-numeric family_id, age_min or age_max."""
     if not filters:
-        return query.all()
+        return query
         
     if filters.get("samaj_name"):
         query = query.filter(Samaj.name.ilike(f"%{filters['samaj_name']}%"))
@@ -25,6 +43,9 @@ def get_members(db_session=None, filters: Optional[Dict] = None) -> List[Member]
     if filters.get("family_name"):
         query = query.filter(Family.name.ilike(f"%{filters['family_name']}%"))
         
+    if filters.get("family_id"):
+        query = query.filter(Member.family_id == int(filters["family_id"]))
+        
     if filters.get("name"):
         query = query.filter(Member.name.ilike(f"%{filters['name']}%"))
         
@@ -49,13 +70,100 @@ def get_members(db_session=None, filters: Optional[Dict] = None) -> List[Member]
     if filters.get("is_family_head") is not None:
         query = query.filter(Member.is_family_head == filters["is_family_head"])
         
-    return query.all()
+    # Comma-separated tags; members need any of them, or all with tag_match=all
+    match_all = filters.get("tag_match") == "all"
+    for kind in TAG_KINDS:
+        if filters.get(kind):
+            query = query.filter(tag_filter(kind, filters[kind], match_all))
+        
+    return query
+
+def get_members(db_session=None, filters: Optional[Dict] = None) -> List[Member]:
+    if db_session is None:
+        db_session = db.session
+    query = db_session.query(Member).\
+        join(Family, Member.family_id == Family.id).\
+        join(Samaj, and_(Member.samaj_id == Samaj.id, Family.samaj_id == Samaj.id))
+    return filter_members(query, filters).order_by(Member.id).all()
+
+def get_members_page(db_session=None, filters: Optional[Dict] = None, limit: int = MEMBER_PAGE_SIZE,
+                     after: Optional[int] = None) -> Tuple[List[Dict], Optional[int]]:
+    """One page of the member list ordered by id, starting after the given cursor.
+    Returns the rows and the cursor for the next page (None on the last page)."""
+    if db_session is None:
+        db_session = db.session
+    limit = max(1, min(limit, MAX_MEMBER_PAGE_SIZE))
+    query = db_session.query(*MEMBER_LIST_COLUMNS).\
+        select_from(Member).\
+        join(Family, Member.family_id == Family.id).\
+        join(Samaj, and_(Member.samaj_id == Samaj.id, Family.samaj_id == Samaj.id))
+    query = filter_members(query, filters)
+    if after is not None:
+        query = query.filter(Member.id > after)
+    rows = query.order_by(Member.id).limit(limit + 1).all()
+    
+    next_after = rows[limit - 1].id if len(rows) > limit else None
+    return [row._asdict() for row in rows[:limit]], next_after
+
+def iter_members(db_session=None, filters: Optional[Dict] = None, after: Optional[int] = None,
+                 batch_size: int = MAX_MEMBER_PAGE_SIZE) -> Iterator[Dict]:
+    """Yield every matching member row, fetching one keyset page at a time"""
+    while True:
+        rows, after = get_members_page(db_session, filters, batch_size, after)
+        yield from rows
+        if after is None:
+            return
 
 def get_samaj_list(db_session=None) -> List[Samaj]:
     if db_session is None:
         db_session = db.session
     return db_session.query(Samaj).all()
 
+def _count_by(column):
+    """Subquery of row counts per value of column, for joining onto parent rows"""
+    return select(column.label("key"), func.count().label("count")).group_by(column).subquery()
+
+def get_samaj_summary(db_session=None) -> List[dict]:
+    """Samaj rows with family and member counts, aggregated in one query"""
+    if db_session is None:
+        db_session = db.session
+    family_counts = _count_by(Family.samaj_id)
+    member_counts = _count_by(Member.samaj_id)
+    rows = db_session.query(
+        Samaj.id, Samaj.name, Samaj.created_at,
+        func.coalesce(family_counts.c.count, 0).label("family_count"),
+        func.coalesce(member_counts.c.count, 0).label("member_count")
+    ).\
+        outerjoin(family_counts, family_counts.c.key == Samaj.id).\
+        outerjoin(member_counts, member_counts.c.key == Samaj.id).\
+        order_by(Samaj.id).all()
+    return [row._asdict() for row in rows]
+
+def _top(counts: Dict[str, int], limit: int) -> Dict[str, int]:
+    return dict(sorted(counts.items(), key=lambda item: (-item[1], item[0]))[:limit])
+
+def get_member_analytics(db_session=None, top: int = ANALYTICS_TOP) -> dict:
+    """Dashboard analytics read from the member_stat counters (and their unfolded deltas)
+    rather than GROUP BYs over members; samaj, cities and professions are cut to the `top` largest values"""
+    if db_session is None:
+        db_session = db.session
+    stats = read_member_stats(db_session)
+    samaj_names = dict(db_session.query(Samaj.id, Samaj.name).filter(
+        Samaj.id.in_([int(samaj_id) for samaj_id in stats["samaj"]])
+    ).all()) if stats["samaj"] else {}
+    band_order = [label for _, label in AGE_BANDS] + [OLDEST_BAND, UNKNOWN]
+    return {
+        "total_members": sum(stats["role"].values()),
+        "gender_distribution": stats["gender"],
+        "age_groups": {band: stats["age_band"][band] for band in band_order if band in stats["age_band"]},
+        "blood_groups": stats["blood_group"],
+        "family_roles": stats["role"],
+        "profession_categories": _top(stats["profession"], top),
+        "cities": _top(stats["city"], top),
+        "samaj": _top({samaj_names[int(samaj_id)]: count for samaj_id, count in stats["samaj"].items()
+                       if int(samaj_id) in samaj_names}, top)
+    }
+
 def get_family_list(db_session=None, samaj_name: Optional[str] = None) -> List[Family]:
     if db_session is None:
         db_session = db.session
@@ -72,9 +180,15 @@ def get_family_members(family_id: int, db_session=None) -> List[Member]:
 def get_family_summary(db_session=None, filters: dict = None) -> List[dict]:
     if db_session is None:
         db_session = db.session
-    query = db_session.query(Family).\
+    head = aliased(Member)
+    member_counts = _count_by(Member.family_id)
+    query = db_session.query(
+        Family.id, Family.name, Samaj.name.label("samaj"), head.name.label("head_name"),
+        member_counts.c.count.label("member_count"), Family.created_at
+    ).\
         join(Samaj, Family.samaj_id == Samaj.id).\
-        join(Member, Member.family_id == Family.id)
+        join(member_counts, member_counts.c.key == Family.id).\
+        outerjoin(head, and_(head.family_id == Family.id, head.is_family_head == True))
     
     if filters:
         if filters.get("samaj_name"):
@@ -82,74 +196,66 @@ def get_family_summary(db_session=None, filters: dict = None) -> List[dict]:
         if filters.get("family_name"):
             query = query.filter(Family.name.ilike(f"%{filters['family_name']}%"))
             
-    families = query.distinct().all()
-    result = []
-    
-    for family in families:
-        head = next((m for m in family.members if m.is_family_head), None)
-        result.append({
-            "id": family.id,
-            "name": family.name,
-            "samaj": family.samaj.name,
-            "head_name": head.name if head else None,
-            "member_count": len(family.members),
-            "created_at": family.created_at
-        })
-    
-    return result
+    return [row._asdict() for row in query.order_by(Family.id).all()]
 
 def get_member(member_id: int, db_session=None) -> Optional[Member]:
     if db_session is None:
         db_session = db.session
-    return db_session.query(Member).filter(Member.id == member_id).first()
+    return db_session.query(Member).\
+        options(joinedload(Member.samaj), joinedload(Member.family)).\
+        filter(Member.id == member_id).first()
+
+EXPORT_HEADERS = ["Samaj", "Family", "Name", "Gender", "Age", "Blood Group", "Mobile 1", "Mobile 2",
+                  "Education", "Occupation", "Marital Status", "Address", "Email",
+                  "Birth Date", "Anniversary Date", "Native Place", "Current City",
+                  "Languages Known", "Skills", "Hobbies", "Emergency Contact",
+                  "Relationship Status", "Family Role", "Medical Conditions",
+                  "Dietary Preferences", "Social Media Handles", "Profession Category",
+                  "Volunteer Interests"]
 
-def export_members_csv(db_session, filters: Optional[Dict] = None) -> tuple[str, str]:
+EXPORT_COLUMNS = (
+    Samaj.name, Family.name,
+    Member.name, Member.gender, Member.age, Member.blood_group,
+    Member.mobile_1, Member.mobile_2, Member.education,
+    Member.occupation, Member.marital_status, Member.address,
+    Member.email, Member.birth_date, Member.anniversary_date,
+    Member.native_place, Member.current_city, Member.languages_known,
+    Member.skills, Member.hobbies, Member.emergency_contact,
+    Member.relationship_status, Member.family_role, Member.medical_conditions,
+    Member.dietary_preferences, Member.social_media_handles,
+    Member.profession_category, Member.volunteer_interests
+)
+
+EXPORT_BATCH_SIZE = 1000
+
+def export_members_csv(db_session, filters: Optional[Dict] = None,
+                       batch_size: int = EXPORT_BATCH_SIZE) -> Tuple[Iterator[str], str]:
+    """CSV export as a generator of text chunks plus the download filename.
+    Rows are fetched through a server-side cursor, batch_size at a time, so memory
+    stays flat however many members match."""
     if db_session is None:
         db_session = db.session
-    query = db_session.query(Member).\
+    query = db_session.query(*EXPORT_COLUMNS).\
+        select_from(Member).\
         join(Family, and_(Member.family_id == Family.id, Member.samaj_id == Family.samaj_id)).\
-        join(Samaj, and_(Member.samaj_id == Samaj.id, Family.samaj_id == Samaj.id)).\
-        distinct()
+        join(Samaj, and_(Member.samaj_id == Samaj.id, Family.samaj_id == Samaj.id))
+    query = filter_members(query, filters).\
+        order_by(Member.id).\
+        execution_options(yield_per=batch_size)
     
-    if filters:
-        if filters.get("samaj_name"):
-            query = query.filter(Samaj.name.ilike(f"%{filters['samaj_name']}%"))
-        if filters.get("family_name"):
-            query = query.filter(Family.name.ilike(f"%{filters['family_name']}%"))
-        if filters.get("name"):
-            query = query.filter(Member.name.ilike(f"%{filters['name']}%"))
-        if filters.get("blood_group"):
-            query = query.filter(Member.blood_group == filters["blood_group"])
-    
-    members = query.all()
     samaj_name = filters.get("samaj_name", "all") if filters else "all"
-    
+    filename = f"members_{samaj_name}.csv"
+    return _csv_chunks(query, batch_size), filename
+
+def _csv_chunks(rows, batch_size: int) -> Iterator[str]:
     output = StringIO()
     writer = csv.writer(output)
+    writer.writerow(EXPORT_HEADERS)
     
-    headers = ["Samaj", "Family", "Name", "Gender", "Age", "Blood Group", "Mobile 1", "Mobile 2",
-               "Education", "Occupation", "Marital Status", "Address", "Email",
-               "Birth Date", "Anniversary Date", "Native Place", "Current City",
-               "Languages Known", "Skills", "Hobbies", "Emergency Contact",
-               "Relationship Status", "Family Role", "Medical Conditions",
-               "Dietary Preferences", "Social Media Handles", "Profession Category",
-               "Volunteer Interests"]
-    writer.writerow(headers)
-    
-    for member in members:
-        writer.writerow([
-            member.samaj.name, member.family.name,
-            member.name, member.gender, member.age, member.blood_group,
-            member.mobile_1, member.mobile_2, member.education,
-            member.occupation, member.marital_status, member.address,
-            member.email, member.birth_date, member.anniversary_date,
-            member.native_place, member.current_city, member.languages_known,
-            member.skills, member.hobbies, member.emergency_contact,
-            member.relationship_status, member.family_role, member.medical_conditions,
-            member.dietary_preferences, member.social_media_handles,
-            member.profession_category, member.volunteer_interests
-        ])
-    
-    output.seek(0)
-    filename = f"members_{samaj_name}.csv"
-    return output.getvalue(), filename
+    for count, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if count % batch_size == 0:
+            yield output.getvalue()
+            output.seek(0)
+            output.truncate()
+    yield output.getvalue()
@@ -3,19 +3,31 @@ from jose import JWTError, jwt
 from datetime import datetime, timedelta
 from flask import current_app
 from passlib.context import CryptContext
+import hashlib
 import os
-from typing import Optional, Dict
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Dict, Tuple
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+TOKEN_CACHE_SIZE = 1024
+
+# Verified tokens: sha256(algorithm, key, token) -> (subject, exp); entries are
+# dropped once the token expires, so a cached token is never accepted past its exp
+_verified_tokens: "OrderedDict[bytes, Tuple[str, float]]" = OrderedDict()
+_verified_tokens_lock = threading.Lock()
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     try:
         to_encode = data.copy()
         expire = datetime.utcnow() + (expires_delta or timedelta(minutes=15))
         to_encode.update({"exp": expire})
         
-        secret_key = os.environ.get("JWT_SECRET_KEY", current_app.config.get("JWT_SECRET_KEY"))
-        algorithm = os.environ.get("JWT_ALGORITHM", current_app.config.get("JWT_ALGORITHM", "HS256"))
+        # Same source as verify_token, so tokens verify wherever they were issued
+        secret_key = current_app.config.get("JWT_SECRET_KEY") or os.environ.get("JWT_SECRET_KEY")
+        algorithm = current_app.config.get("JWT_ALGORITHM") or os.environ.get("JWT_ALGORITHM", "HS256")
         
         current_app.logger.info(f"Using algorithm: {algorithm}")
         current_app.logger.info(f"Secret key is set: {bool(secret_key)}")
@@ -34,26 +46,38 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
         raise
 
 def verify_token(token: str) -> Optional[str]:
+    secret_key = current_app.config.get("JWT_SECRET_KEY", "development-secret-key-do-not-use-in-production")
+    algorithm = current_app.config.get("JWT_ALGORITHM", "HS256")
+    cache_size = current_app.config.get("JWT_CACHE_SIZE", TOKEN_CACHE_SIZE)
+    
+    key = hashlib.sha256(f"{algorithm}:{secret_key}:{token}".encode("utf-8")).digest()
+    with _verified_tokens_lock:
+        cached = _verified_tokens.get(key)
+        if cached is not None:
+            if cached[1] > time.time():
+                _verified_tokens.move_to_end(key)
+                return cached[0]
+            del _verified_tokens[key]
+    
     try:
-        from flask import current_app
-        import jwt
-        
-        secret_key = current_app.config.get("JWT_SECRET_KEY", "development-secret-key-do-not-use-in-production")
-        algorithm = current_app.config.get("JWT_ALGORITHM", "HS256")
-        
-        current_app.logger.info(f"Verifying token with algorithm: {algorithm}")
-        
         payload = jwt.decode(
             token,
             secret_key,
             algorithms=[algorithm]
         )
-        username = payload.get("sub")
-        if not isinstance(username, str) or username is None:
-            return None
-        return username
     except JWTError:
         return None
+    username = payload.get("sub")
+    if not isinstance(username, str):
+        return None
+    
+    expires_at = payload.get("exp")
+    if cache_size > 0 and isinstance(expires_at, (int, float)):
+        with _verified_tokens_lock:
+            _verified_tokens[key] = (username, float(expires_at))
+            while len(_verified_tokens) > cache_size:
+                _verified_tokens.popitem(last=False)
+    return username
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
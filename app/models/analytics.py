@@ -0,0 +1,198 @@
+# Author: SANJAY KR
+from collections import Counter
+from typing import Any, Callable, Dict, Iterable, Mapping, Optional, Tuple
+from sqlalchemy import delete, event, func, insert, select, union_all
+from sqlalchemy.orm import Session, attributes, object_session
+from .. import db
+from .base import upsert
+from .family import Member
+
+UNKNOWN = "Unknown"
+
+AGE_BANDS = ((17, "Under 18"), (30, "18-30"), (45, "31-45"), (60, "46-60"))
+OLDEST_BAND = "Over 60"
+
+def age_band(age: Optional[int]) -> str:
+    if age is None:
+        return UNKNOWN
+    for upper, label in AGE_BANDS:
+        if age <= upper:
+            return label
+    return OLDEST_BAND
+
+def _text(value) -> str:
+    value = " ".join(str(value).split()) if value is not None else ""
+    return value[:100] or UNKNOWN
+
+# Dimension -> (member columns it reads, value from a row of those columns)
+DIMENSIONS: Dict[str, Tuple[Tuple[str, ...], Callable[[Mapping[str, Any]], str]]] = {
+    "samaj": (("samaj_id",), lambda row: str(row.get("samaj_id"))),
+    "gender": (("gender",), lambda row: _text(row.get("gender"))),
+    "age_band": (("age",), lambda row: age_band(row.get("age"))),
+    "blood_group": (("blood_group",), lambda row: _text(row.get("blood_group"))),
+    "city": (("current_city",), lambda row: _text(row.get("current_city"))),
+    "profession": (("profession_category",), lambda row: _text(row.get("profession_category"))),
+    "role": (("family_role",), lambda row: _text(row.get("family_role"))),
+}
+STAT_COLUMNS = tuple(sorted({column for columns, _ in DIMENSIONS.values() for column in columns}))
+
+class MemberStat(db.Model):
+    """Member counts per value of each analytics dimension, as of the last fold of
+    member_stat_delta"""
+    __tablename__ = "member_stat"
+    dimension = db.Column(db.String(20), primary_key=True)
+    value = db.Column(db.String(100), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+class MemberStatDelta(db.Model):
+    """Counter changes appended by member writes. Writers only insert here, so concurrent
+    registrations never wait on each other's hot counter rows; reads add these to
+    member_stat and fold_member_stat_deltas moves them into it."""
+    __tablename__ = "member_stat_delta"
+    id = db.Column(db.BigInteger().with_variant(db.Integer, "sqlite"), primary_key=True, autoincrement=True)
+    dimension = db.Column(db.String(20), nullable=False)
+    value = db.Column(db.String(100), nullable=False)
+    count = db.Column(db.Integer, nullable=False)
+
+def stat_keys(row: Mapping[str, Any]) -> Tuple[Tuple[str, str], ...]:
+    """The (dimension, value) counters one member row contributes to"""
+    return tuple((dimension, value_of(row)) for dimension, (_, value_of) in DIMENSIONS.items())
+
+def record_member_stats(connection, rows: Iterable[Mapping[str, Any]], sign: int = 1) -> None:
+    """Count member rows inserted (sign=1) or deleted (sign=-1) outside the ORM, e.g. by
+    executemany inserts; must run on the connection of the transaction that wrote them"""
+    deltas = Counter()
+    for row in rows:
+        for key in stat_keys(row):
+            deltas[key] += sign
+    apply_stat_deltas(connection, deltas)
+
+def apply_stat_deltas(connection, deltas: Mapping[Tuple[str, str], int]) -> None:
+    """Append the deltas to member_stat_delta with one executemany insert"""
+    rows = [{"dimension": dimension, "value": value, "count": delta}
+            for (dimension, value), delta in deltas.items() if delta]
+    if rows:
+        connection.execute(insert(MemberStatDelta.__table__), rows)
+
+def _add_to_stats(connection, deltas: Mapping[Tuple[str, str], int]) -> None:
+    # In key order, so concurrent folds lock the counter rows in the same order
+    rows = [{"dimension": dimension, "value": value, "count": delta}
+            for (dimension, value), delta in sorted(deltas.items()) if delta]
+    table = MemberStat.__table__
+    upsert(connection, table, rows, ("dimension", "value"),
+           lambda excluded: {"count": table.c.count + excluded["count"]})
+
+def fold_member_stat_deltas(session: Session) -> int:
+    """Move the committed deltas into member_stat in one short transaction; returns the
+    number of delta rows folded. Only rows the DELETE removed are added, so deltas
+    committed meanwhile are left for the next fold. Run by `flask fold-analytics`."""
+    table = MemberStatDelta.__table__
+    connection = session.connection()
+    columns = (table.c.dimension, table.c.value, table.c.count)
+    if connection.dialect.delete_returning:
+        rows = connection.execute(delete(table).returning(*columns)).all()
+    else:
+        rows = connection.execute(select(table.c.id, *columns)).all()
+        deleted = connection.execute(delete(table).where(table.c.id.in_([row[0] for row in rows]))).rowcount
+        if deleted != len(rows):
+            # A concurrent fold deleted some of these rows first and adds them itself
+            session.rollback()
+            return 0
+        rows = [row[1:] for row in rows]
+    deltas = Counter()
+    for dimension, value, count in rows:
+        deltas[(dimension, value)] += count
+    _add_to_stats(connection, deltas)
+    session.commit()
+    return len(rows)
+
+def rebuild_member_stats(session: Session) -> int:
+    """Recount every dimension from the member table (for databases that had members
+    before the counters existed); returns the number of members counted"""
+    session.execute(delete(MemberStat.__table__))
+    session.execute(delete(MemberStatDelta.__table__))
+    connection = session.connection()
+    deltas = Counter()
+    rows = connection.execution_options(yield_per=10000).execute(
+        select(*(getattr(Member, column) for column in STAT_COLUMNS), func.count()).
+        group_by(*(getattr(Member, column) for column in STAT_COLUMNS))
+    )
+    total = 0
+    for row in rows:
+        count = row[-1]
+        total += count
+        for key in stat_keys(dict(zip(STAT_COLUMNS, row))):
+            deltas[key] += count
+    _add_to_stats(connection, deltas)
+    session.commit()
+    return total
+
+def read_member_stats(session: Session) -> Dict[str, Dict[str, int]]:
+    """Non-zero counters by dimension and value, including deltas not folded yet"""
+    stats: Dict[str, Dict[str, int]] = {dimension: {} for dimension in DIMENSIONS}
+    stat, delta = MemberStat.__table__, MemberStatDelta.__table__
+    counts = union_all(
+        select(stat.c.dimension, stat.c.value, stat.c.count),
+        select(delta.c.dimension, delta.c.value, delta.c.count)
+    ).subquery()
+    total = func.sum(counts.c.count)
+    rows = session.execute(
+        select(counts.c.dimension, counts.c.value, total).
+        group_by(counts.c.dimension, counts.c.value).having(total > 0)
+    )
+    for dimension, value, count in rows:
+        stats.setdefault(dimension, {})[value] = count
+    return stats
+
+_PENDING = "member_stat_deltas"
+
+def _pending(target) -> Optional[Counter]:
+    session = object_session(target)
+    return session.info.setdefault(_PENDING, Counter()) if session is not None else None
+
+def _current(target) -> Dict[str, Any]:
+    return {column: getattr(target, column) for column in STAT_COLUMNS}
+
+@event.listens_for(Member, "after_insert")
+def _count_inserted(mapper, connection, target):
+    pending = _pending(target)
+    if pending is not None:
+        pending.update(stat_keys(_current(target)))
+
+@event.listens_for(Member, "after_delete")
+def _count_deleted(mapper, connection, target):
+    pending = _pending(target)
+    if pending is not None:
+        pending.subtract(stat_keys(_current(target)))
+
+def _load_old_value(target, value, oldvalue, initiator):
+    return value
+
+# Load the old value before a counted column is overwritten, even when it was expired
+for _column in STAT_COLUMNS:
+    event.listen(getattr(Member, _column), "set", _load_old_value, active_history=True, retval=True)
+
+@event.listens_for(Member, "after_update")
+def _count_updated(mapper, connection, target):
+    old = {}
+    for column in STAT_COLUMNS:
+        history = attributes.get_history(target, column)
+        if history.deleted:
+            old[column] = history.deleted[0]
+    pending = _pending(target) if old else None
+    if pending is None:
+        return
+    new = _current(target)
+    pending.subtract(stat_keys(dict(new, **old)))
+    pending.update(stat_keys(new))
+
+@event.listens_for(Session, "after_flush")
+def _apply_pending(session, flush_context):
+    # Appended inside the flush's transaction, so a rollback undoes the counts with the rows
+    pending = session.info.pop(_PENDING, None)
+    if pending:
+        apply_stat_deltas(session.connection(), pending)
+
+@event.listens_for(Session, "after_soft_rollback")
+def _drop_pending(session, previous_transaction):
+    session.info.pop(_PENDING, None)
@@ -1,8 +1,13 @@
 # Author: SANJAY KR
+import time
+from contextlib import contextmanager
 from flask import current_app
-from sqlalchemy import create_engine, inspect
-from sqlalchemy.orm import scoped_session, sessionmaker
+from sqlalchemy import and_, event, insert, inspect, literal, select, text, update, exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+from typing import Any, Callable, Dict, List, Mapping, Optional, Sequence
 from .. import db
+from ..utils.metrics import metrics
 
 def init_db():
     try:
@@ -41,13 +46,185 @@ def init_db():
         current_app.logger.error(f"Database initialization error: {str(e)}")
         raise
 
-def get_db():
+# Indexes dropped from the models; create_indexes removes them from existing databases.
+# ix_member_blood_group_age: ix_member_blood_group_city_age leads with blood_group too
+RETIRED_INDEXES = ("ix_member_blood_group_age",)
+
+def create_indexes(engine=None) -> List[str]:
+    """Create model indexes missing from an existing database (create_all only
+    adds them to new tables) and drop retired ones. On PostgreSQL each index is
+    built CONCURRENTLY in its own autocommit statement, so writes to the table
+    carry on during the build. Returns the names of the indexes created."""
+    from ..models.family import Samaj, Family, Member
+    engine = engine or db.engine
+    attempted = {}
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        concurrently = conn.dialect.name == "postgresql"
+        if concurrently:
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        inspector = inspect(conn)
+        for table in db.metadata.tables.values():
+            if not inspector.has_table(table.name):
+                continue
+            existing = _index_names(conn, table.name)
+            for name in existing.intersection(RETIRED_INDEXES):
+                conn.execute(text(f"DROP INDEX {'CONCURRENTLY ' if concurrently else ''}{name}"))
+            for index in sorted(table.indexes, key=lambda index: index.name):
+                if index.name in existing:
+                    continue
+                # Dialect-specific indexes (trigram) are skipped by create() elsewhere
+                if concurrently:
+                    # A failed concurrent build leaves an invalid index of the same name behind
+                    conn.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS "{index.name}"'))
+                    with _concurrently(index):
+                        index.create(conn)
+                else:
+                    index.create(conn)
+                attempted[index.name] = table.name
+        
+        return [
+            name for name, table_name in attempted.items()
+            if name in _index_names(conn, table_name)
+        ]
+
+@contextmanager
+def _concurrently(index):
+    options = index.dialect_options["postgresql"]
+    previous = options["concurrently"]
+    options["concurrently"] = True
     try:
-        if not hasattr(db, 'session'):
-            engine = create_engine(current_app.config['SQLALCHEMY_DATABASE_URI'])
-            db.session = scoped_session(sessionmaker(bind=engine))
-            current_app.logger.info("Created new database session")
-        return db.session
-    except Exception as e:
-        current_app.logger.error(f"Database session error: {str(e)}")
-        raise
+        yield
+    finally:
+        options["concurrently"] = previous
+
+def _index_names(conn, table_name: str) -> set:
+    if conn.dialect.name == "sqlite":
+        # SQLite reflection leaves out expression indexes such as lower(current_city)
+        return set(conn.execute(
+            text("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = :table"),
+            {"table": table_name}
+        ).scalars())
+    if conn.dialect.name == "postgresql":
+        # Only valid indexes: an interrupted CREATE INDEX CONCURRENTLY leaves an unusable one
+        return set(conn.execute(
+            text("SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+                 "JOIN pg_class t ON t.oid = i.indrelid "
+                 "WHERE t.relname = :table AND i.indisvalid AND t.relkind = 'r'"),
+            {"table": table_name}
+        ).scalars())
+    return {index["name"] for index in inspect(conn).get_indexes(table_name)}
+
+class _Excluded(dict):
+    """Stand-in for ON CONFLICT's `excluded` row when upserting without it"""
+    __getattr__ = dict.__getitem__
+
+def upsert(connection, table, rows: Sequence[Mapping[str, Any]], index_elements: Sequence[str],
+           set_: Optional[Callable[[Any], Mapping[str, Any]]] = None, returning: Sequence = ()) -> List:
+    """Insert rows, resolving conflicts on the unique index_elements columns: set_ receives the
+    `excluded` (incoming) row and returns the values to update, or is None to keep the existing
+    row. PostgreSQL and SQLite use INSERT .. ON CONFLICT; other dialects UPDATE, then INSERT
+    the rows not found. Returns the `returning` columns of the rows written."""
+    if not rows:
+        return []
+    dialect = connection.dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        stmt = dialect_insert(table)
+        index_columns = [table.c[name] for name in index_elements]
+        if set_ is None:
+            stmt = stmt.on_conflict_do_nothing(index_elements=index_columns)
+        else:
+            stmt = stmt.on_conflict_do_update(index_elements=index_columns, set_=set_(stmt.excluded))
+        if returning:
+            return list(connection.execute(stmt.returning(*returning), list(rows)))
+        connection.execute(stmt, list(rows))
+        return []
+    written = []
+    for row in rows:
+        match = and_(*(table.c[name] == row[name] for name in index_elements))
+        if set_ is not None:
+            excluded = _Excluded((column.name, literal(row.get(column.name), column.type)) for column in table.c)
+            if connection.execute(update(table).where(match).values(set_(excluded))).rowcount:
+                written.append(row)
+                continue
+        elif connection.execute(select(table.c[index_elements[0]]).where(match)).first() is not None:
+            continue
+        connection.execute(insert(table).values(row))
+        written.append(row)
+    return [tuple(row.get(column.name) for column in returning) for row in written]
+
+class MeteredQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited for a connection"""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            metrics.increment("db_pool_timeouts_total")
+            raise
+        finally:
+            metrics.observe("db_pool_wait_seconds", time.perf_counter() - started)
+
+def engine_options(config, url: str) -> Dict[str, Any]:
+    """create_engine() arguments from the DB_POOL_* and DB_STATEMENT_TIMEOUT_MS settings"""
+    options: Dict[str, Any] = {
+        "pool_pre_ping": bool(config.get("DB_POOL_PRE_PING", True)),
+        "pool_recycle": int(config.get("DB_POOL_RECYCLE", 1800)),
+    }
+    sa_url = make_url(url)
+    if sa_url.get_backend_name() == "sqlite" and sa_url.database in (None, "", ":memory:"):
+        # In-memory SQLite is a single shared connection, not a pool
+        return options
+    options.update(
+        poolclass=MeteredQueuePool,
+        pool_size=int(config.get("DB_POOL_SIZE", 5)),
+        max_overflow=int(config.get("DB_MAX_OVERFLOW", 10)),
+        pool_timeout=float(config.get("DB_POOL_TIMEOUT", 30)),
+    )
+    statement_timeout = int(config.get("DB_STATEMENT_TIMEOUT_MS", 0))
+    if statement_timeout and sa_url.get_backend_name() == "postgresql":
+        options["connect_args"] = {"options": f"-c statement_timeout={statement_timeout}"}
+    return options
+
+def pool_stats(engine) -> Dict[str, float]:
+    """Connections held by requests, idle in the pool and opened beyond pool_size"""
+    pool = engine.pool
+    if not isinstance(pool, QueuePool):
+        return {}
+    return {
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": max(0, pool.overflow()),
+    }
+
+def _mark_flushed(session, flush_context) -> None:
+    session.info["uncommitted_writes"] = True
+
+def _clear_flushed(session) -> None:
+    session.info.pop("uncommitted_writes", None)
+
+def init_session_lifecycle(app) -> None:
+    """Release each request's session at teardown, rolling back writes it left uncommitted"""
+    # Flushed rows no longer show up in session.new/dirty, so track them until commit or rollback
+    if not event.contains(db.session, "after_flush", _mark_flushed):
+        event.listen(db.session, "after_flush", _mark_flushed)
+        event.listen(db.session, "after_commit", _clear_flushed)
+        event.listen(db.session, "after_rollback", _clear_flushed)
+
+    @app.teardown_appcontext
+    def remove_session(exception=None):
+        if db.session.registry.has():
+            session = db.session()
+            if session.new or session.dirty or session.deleted or session.info.get("uncommitted_writes"):
+                current_app.logger.warning("Rolling back uncommitted changes left by the request")
+                metrics.increment("db_session_rollbacks_total")
+        db.session.remove()
+
+def get_db():
+    """The app's request-scoped session, bound to the one pooled engine"""
+    return db.session
@@ -0,0 +1,58 @@
+# Author: SANJAY KR
+from datetime import datetime
+from typing import Any, Dict
+from .. import db
+
+class BroadcastJob(db.Model):
+    """One message sent to every member matching a set of admin member filters"""
+    __tablename__ = "broadcast_job"
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    message = db.Column(db.Text, nullable=False)
+    filters = db.Column(db.JSON, nullable=False, default=dict)
+    # queued -> running -> completed, or cancelling -> cancelled, or failed
+    status = db.Column(db.String(20), nullable=False, default="queued")
+    # Last member id scanned; members are read in id order
+    cursor = db.Column(db.Integer, nullable=False, default=0)
+    recipients = db.Column(db.Integer, nullable=False, default=0)
+    duplicates = db.Column(db.Integer, nullable=False, default=0)
+    invalid = db.Column(db.Integer, nullable=False, default=0)
+    sent = db.Column(db.Integer, nullable=False, default=0)
+    failed = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.String(500))
+    # Worker running the job, and when it last renewed that claim; a lease left to expire
+    # means the worker died, and another worker resumes the job
+    lease_owner = db.Column(db.String(100))
+    heartbeat_at = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "status": self.status,
+            "filters": self.filters,
+            "recipients": self.recipients,
+            "duplicates": self.duplicates,
+            "invalid": self.invalid,
+            "sent": self.sent,
+            "failed": self.failed,
+            "pending": self.recipients - self.sent - self.failed,
+            "error": self.error,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None
+        }
+
+class BroadcastRecipient(db.Model):
+    """A number claimed by a job; the primary key keeps each number to one message per job"""
+    __tablename__ = "broadcast_recipient"
+    __table_args__ = (
+        db.Index("ix_broadcast_recipient_job_id_status_phone", "job_id", "status", "phone"),
+    )
+    job_id = db.Column(db.Integer, db.ForeignKey("broadcast_job.id", ondelete="CASCADE"), primary_key=True)
+    phone = db.Column(db.String(16), primary_key=True)
+    member_id = db.Column(db.Integer, nullable=False)
+    # pending -> sent or failed
+    status = db.Column(db.String(10), nullable=False, default="pending")
+    error = db.Column(db.String(200))
@@ -1,11 +1,30 @@
 # Author: SANJAY KR
 from .. import db
-from sqlalchemy.orm import relationship
-from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session, relationship
+from sqlalchemy import DDL, event, func, select
 from datetime import datetime
+from typing import Dict, List, NamedTuple, Optional
+
+def trigram_index(name: str, column: str) -> db.Index:
+    """GIN trigram index serving ilike('%...%') filters; PostgreSQL only, skipped elsewhere"""
+    return db.Index(
+        name, column,
+        postgresql_using="gin",
+        postgresql_ops={column: "gin_trgm_ops"}
+    ).ddl_if(dialect="postgresql")
+
+event.listen(
+    db.metadata, "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql")
+)
 
 class Family(db.Model):
     __tablename__ = "family"
+    __table_args__ = (
+        db.Index("ix_family_samaj_id", "samaj_id"),
+        db.Index("ix_family_head_of_family_id", "head_of_family_id"),
+        trigram_index("ix_family_name_trgm", "name"),
+    )
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     name = db.Column(db.String(100), nullable=False)
     samaj_id = db.Column(db.Integer, db.ForeignKey("samaj.id", ondelete="CASCADE"), nullable=False)
@@ -17,6 +36,9 @@ class Family(db.Model):
 
 class Samaj(db.Model):
     __tablename__ = "samaj"
+    __table_args__ = (
+        trigram_index("ix_samaj_name_trgm", "name"),
+    )
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     name = db.Column(db.String(100), unique=True, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
@@ -29,6 +51,15 @@ class Samaj(db.Model):
 
 class Member(db.Model):
     __tablename__ = "member"
+    __table_args__ = (
+        # Leading columns double as the samaj_id / family_id foreign key indexes
+        db.Index("ix_member_samaj_id_family_role", "samaj_id", "family_role"),
+        db.Index("ix_member_family_id_is_family_head", "family_id", "is_family_head"),
+        db.Index("ix_member_name", "name"),
+        trigram_index("ix_member_name_trgm", "name"),
+        trigram_index("ix_member_current_city_trgm", "current_city"),
+        trigram_index("ix_member_profession_category_trgm", "profession_category"),
+    )
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     samaj_id = db.Column(db.Integer, db.ForeignKey("samaj.id", ondelete="CASCADE"), nullable=False)
     family_id = db.Column(db.Integer, db.ForeignKey("family.id", ondelete="CASCADE"), nullable=False)
@@ -63,43 +94,28 @@ class Member(db.Model):
     samaj = relationship("Samaj", back_populates="members")
     family = relationship("Family", back_populates="members", foreign_keys=[family_id])
 
-    def validate_family_role(self):
+    def validate_family_role(self, session=None):
         if not self.family_role:
             raise ValueError("Family role is required")
             
         if self.family_role == "Head" and not self.is_family_head:
             raise ValueError("Member with Head role must be marked as family head")
             
+        summary = family_role_summary(session or object_session(self) or db.session, self.family_id)
+        existing = summary.without(self.id)
+        
         # Check for existing family head
         if self.is_family_head:
-            existing_head = Member.query.filter(
-                Member.family_id == self.family_id,
-                Member.is_family_head == True,
-                Member.id != self.id
-            ).first()
+            existing_head = existing.head()
             if existing_head:
                 raise ValueError(f"Family already has a head member: {existing_head.name}")
                 
-        # Get all existing family members and their roles
-        existing_members = Member.query.filter(
-            Member.family_id == self.family_id,
-            Member.id != self.id
-        ).all()
-        
-        # Count roles and store member details for validation messages
-        role_counts = {}
-        role_members = {}
-        for member in existing_members:
-            role = member.family_role
-            role_counts[role] = role_counts.get(role, 0) + 1
-            if role not in role_members:
-                role_members[role] = []
-            role_members[role].append(member)
+        role_counts = existing.role_counts()
             
         # Validate role-specific constraints with detailed error messages
         if self.family_role == "Spouse":
             if role_counts.get("Spouse", 0) > 0:
-                spouse = role_members["Spouse"][0]
+                spouse = existing.with_roles("Spouse")[0]
                 raise ValueError(
                     f"Family already has a spouse member: {spouse.name} "
                     f"(age: {spouse.age}, relationship: {spouse.relationship_status})"
@@ -107,14 +123,13 @@ class Member(db.Model):
                 
         elif self.family_role == "Parent":
             if role_counts.get("Parent", 0) >= 2:
-                parents = [f"{m.name} ({m.relationship_status})" for m in role_members["Parent"]]
+                parents = [f"{m.name} ({m.relationship_status})" for m in existing.with_roles("Parent")]
                 raise ValueError(
                     f"Family already has maximum parents: {', '.join(parents)}"
                 )
                 
         elif self.family_role == "Child":
-            parent_roles = ["Head", "Spouse", "Parent"]
-            has_parent = any(role_counts.get(role, 0) > 0 for role in parent_roles)
+            has_parent = any(role_counts.get(role, 0) > 0 for role in PARENT_ROLES)
             if not has_parent:
                 raise ValueError(
                     "Family must have at least one parent figure (Head/Spouse/Parent) "
@@ -131,34 +146,132 @@ class Member(db.Model):
         # Additional validation for age-based relationships
         if self.age:
             if self.family_role == "Child":
-                parent_members = []
-                for role in ["Head", "Spouse", "Parent"]:
-                    if role in role_members:
-                        parent_members.extend(role_members[role])
-                        
-                for parent in parent_members:
-                    if parent.age and parent.age <= self.age:
-                        raise ValueError(
-                            f"Child's age ({self.age}) cannot be greater than or equal to "
-                            f"parent's age ({parent.age}, {parent.name})"
-                        )
+                parent = existing.youngest(*PARENT_ROLES)
+                if parent and parent.age <= self.age:
+                    raise ValueError(
+                        f"Child's age ({self.age}) cannot be greater than or equal to "
+                        f"parent's age ({parent.age}, {parent.name})"
+                    )
                         
             elif self.family_role == "Parent":
-                children = role_members.get("Child", [])
-                for child in children:
-                    if child.age and child.age >= self.age:
-                        raise ValueError(
-                            f"Parent's age ({self.age}) cannot be less than or equal to "
-                            f"child's age ({child.age}, {child.name})"
-                        )
+                child = existing.oldest("Child")
+                if child and child.age >= self.age:
+                    raise ValueError(
+                        f"Parent's age ({self.age}) cannot be less than or equal to "
+                        f"child's age ({child.age}, {child.name})"
+                    )
 
     def __repr__(self):
         return f"<Member {self.name} of {self.samaj.name if self.samaj else 'Unknown Samaj'}>"
 
+# Donor search: compatible groups in one city (matched case-insensitively) within an age range
+db.Index("ix_member_blood_group_city_age", Member.blood_group, func.lower(Member.current_city), Member.age)
+# Family head lookup by name, regardless of case
+db.Index("ix_member_samaj_id_lower_name", Member.samaj_id, func.lower(Member.name))
+
+PARENT_ROLES = ("Head", "Spouse", "Parent")
+
+class FamilyMemberInfo(NamedTuple):
+    id: int
+    name: str
+    family_role: Optional[str]
+    age: Optional[int]
+    is_family_head: bool
+    relationship_status: Optional[str]
+
+class FamilyRoleSummary:
+    """The members of one family reduced to what role validation needs: role counts,
+    the head, and the youngest/oldest member per role"""
+
+    def __init__(self, members: Dict[int, FamilyMemberInfo] = None):
+        self.members = members or {}
+
+    @classmethod
+    def load(cls, connection, family_id: int) -> "FamilyRoleSummary":
+        return cls.load_many(connection, [family_id])[family_id]
+
+    @classmethod
+    def load_many(cls, connection, family_ids) -> Dict[int, "FamilyRoleSummary"]:
+        """Summaries for several families from a single query"""
+        table = Member.__table__
+        summaries = {family_id: cls() for family_id in family_ids}
+        rows = connection.execute(
+            select(table.c.family_id, table.c.id, table.c.name, table.c.family_role, table.c.age,
+                   table.c.is_family_head, table.c.relationship_status).
+            where(table.c.family_id.in_(list(summaries))).
+            order_by(table.c.id)
+        )
+        for row in rows:
+            summaries[row[0]].members[row.id] = FamilyMemberInfo(*row[1:])
+        return summaries
+
+    def without(self, member_id: Optional[int]) -> "FamilyRoleSummary":
+        if member_id not in self.members:
+            return self
+        return FamilyRoleSummary({k: v for k, v in self.members.items() if k != member_id})
+
+    def add(self, member: "Member", key=None) -> None:
+        """Record a member; key defaults to its id (pass one for rows not inserted yet)"""
+        self.members[member.id if key is None else key] = FamilyMemberInfo(
+            member.id, member.name, member.family_role, member.age,
+            bool(member.is_family_head), member.relationship_status
+        )
+
+    def remove(self, member_id: int) -> None:
+        self.members.pop(member_id, None)
+
+    def role_counts(self) -> Dict[str, int]:
+        counts = {}
+        for member in self.members.values():
+            counts[member.family_role] = counts.get(member.family_role, 0) + 1
+        return counts
+
+    def head(self) -> Optional[FamilyMemberInfo]:
+        return next((m for m in self.members.values() if m.is_family_head), None)
+
+    def with_roles(self, *roles: str) -> List[FamilyMemberInfo]:
+        return [m for m in self.members.values() if m.family_role in roles]
+
+    def youngest(self, *roles: str) -> Optional[FamilyMemberInfo]:
+        aged = [m for m in self.with_roles(*roles) if m.age]
+        return min(aged, key=lambda m: m.age) if aged else None
+
+    def oldest(self, *roles: str) -> Optional[FamilyMemberInfo]:
+        aged = [m for m in self.with_roles(*roles) if m.age]
+        return max(aged, key=lambda m: m.age) if aged else None
+
+_SUMMARY_CACHE = "family_role_summaries"
+
+def family_role_summary(session: Session, family_id: Optional[int], connection=None) -> FamilyRoleSummary:
+    """Role summary of a family, loaded with one query and then cached on the session
+    for the rest of the transaction; member insert/update/delete events keep it current."""
+    if family_id is None:
+        return FamilyRoleSummary()
+    cache = session.info.setdefault(_SUMMARY_CACHE, {})
+    summary = cache.get(family_id)
+    if summary is None:
+        summary = cache[family_id] = FamilyRoleSummary.load(connection or session.connection(), family_id)
+    return summary
+
+def preload_family_role_summaries(session: Session, family_ids) -> None:
+    """Load the summaries of several families into the session cache with one query"""
+    cache = session.info.setdefault(_SUMMARY_CACHE, {})
+    missing = {family_id for family_id in family_ids if family_id is not None and family_id not in cache}
+    if missing:
+        cache.update(FamilyRoleSummary.load_many(session.connection(), missing))
+
+def _cached_summaries(target) -> Dict[int, FamilyRoleSummary]:
+    session = object_session(target)
+    return session.info.get(_SUMMARY_CACHE, {}) if session is not None else {}
+
 @event.listens_for(Member, 'before_insert')
 @event.listens_for(Member, 'before_update')
 def validate_member(mapper, connection, target):
-    target.validate_family_role()
+    session = object_session(target)
+    if session is not None:
+        # Load through the flush's connection rather than starting a query mid-flush
+        family_role_summary(session, target.family_id, connection)
+    target.validate_family_role(session)
 
 @event.listens_for(Member, 'after_insert')
 def update_family_head(mapper, connection, target):
@@ -168,3 +281,30 @@ def update_family_head(mapper, connection, target):
             where(Family.id == target.family_id).
             values(head_of_family_id=target.id)
         )
+
+@event.listens_for(Member, 'after_insert')
+@event.listens_for(Member, 'after_update')
+def refresh_family_role_summary(mapper, connection, target):
+    summaries = _cached_summaries(target)
+    for summary in summaries.values():
+        summary.remove(target.id)
+    if target.family_id in summaries:
+        summaries[target.family_id].add(target)
+
+@event.listens_for(Member, 'after_delete')
+def drop_from_family_role_summary(mapper, connection, target):
+    for summary in _cached_summaries(target).values():
+        summary.remove(target.id)
+
+@event.listens_for(Session, 'after_commit')
+@event.listens_for(Session, 'after_soft_rollback')
+def clear_family_role_summaries(session, *args):
+    # Other workers may change the family once this transaction ends
+    session.info.pop(_SUMMARY_CACHE, None)
+
+# Member counters for /admin/analytics, updated by the Member events registered there
+from . import analytics  # noqa: E402,F401
+# Tag tables for the comma-separated member columns, kept in sync by Member events there
+from . import tags  # noqa: E402,F401
+# Write counters behind the admin read endpoints' ETags
+from . import versions  # noqa: E402,F401
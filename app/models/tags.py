@@ -0,0 +1,171 @@
+# Author: SANJAY KR
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple
+from sqlalchemy import delete, event, func, insert, select, tuple_
+from sqlalchemy.orm import Session, attributes, object_session
+from .. import db
+from .base import upsert
+from .family import Member
+
+# Comma-separated member columns -> tag kind; the kinds double as member filter names
+TAG_FIELDS = {
+    "languages_known": "language",
+    "skills": "skill",
+    "hobbies": "hobby",
+    "volunteer_interests": "volunteer_interest",
+}
+TAG_KINDS = tuple(TAG_FIELDS.values())
+# RETURNING clause for executemany member inserts: each row carries its own tag columns,
+# so the rows need not come back in parameter order (which SQLite would insert one by one)
+TAG_RETURNING = (Member.__table__.c.id,) + tuple(Member.__table__.c[column] for column in TAG_FIELDS)
+TAG_BACKFILL_BATCH_SIZE = 1000
+
+class Tag(db.Model):
+    """One distinct value of a comma-separated member column, matched case-insensitively"""
+    __tablename__ = "tag"
+    __table_args__ = (
+        db.UniqueConstraint("kind", "name", name="uq_tag_kind_name"),
+    )
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    kind = db.Column(db.String(20), nullable=False)
+    # Lower-cased with spaces collapsed; label keeps the spelling first seen
+    name = db.Column(db.String(100), nullable=False)
+    label = db.Column(db.String(100), nullable=False)
+
+class MemberTag(db.Model):
+    __tablename__ = "member_tag"
+    __table_args__ = (
+        # Tag filters look up members by tag
+        db.Index("ix_member_tag_tag_id_member_id", "tag_id", "member_id"),
+    )
+    member_id = db.Column(db.Integer, db.ForeignKey("member.id", ondelete="CASCADE"), primary_key=True)
+    tag_id = db.Column(db.Integer, db.ForeignKey("tag.id", ondelete="CASCADE"), primary_key=True)
+
+def split_tags(value: Optional[str]) -> Dict[str, str]:
+    """Tag name -> label for each comma-separated entry of a column value"""
+    tags: Dict[str, str] = {}
+    for part in (value or "").split(","):
+        label = " ".join(part.split())[:100]
+        if label and label.lower() != "skip":
+            tags.setdefault(label.lower(), label)
+    return tags
+
+def write_member_tags(connection, members: Mapping[int, Optional[Mapping[str, Any]]],
+                      replace: Iterable[int] = ()) -> None:
+    """Store the tags of members (id -> column values; None for a deleted member).
+    Existing associations are dropped first for the ids in `replace`."""
+    stale = list(replace)
+    if stale:
+        connection.execute(delete(MemberTag.__table__).where(MemberTag.member_id.in_(stale)))
+    wanted: Dict[Tuple[str, str], str] = {}
+    member_keys: List[Tuple[int, Tuple[str, str]]] = []
+    for member_id, row in members.items():
+        if row is None:
+            continue
+        for column, kind in TAG_FIELDS.items():
+            for name, label in split_tags(row.get(column)).items():
+                wanted.setdefault((kind, name), label)
+                member_keys.append((member_id, (kind, name)))
+    if not member_keys:
+        return
+    tag_ids = _tag_ids(connection, wanted)
+    connection.execute(insert(MemberTag.__table__), [
+        {"member_id": member_id, "tag_id": tag_ids[key]} for member_id, key in member_keys
+    ])
+
+def _tag_ids(connection, wanted: Dict[Tuple[str, str], str]) -> Dict[Tuple[str, str], int]:
+    table = Tag.__table__
+    keys = list(wanted)
+    found = {}
+    for start in range(0, len(keys), 500):
+        chunk = keys[start:start + 500]
+        found.update(((kind, name), tag_id) for tag_id, kind, name in connection.execute(
+            select(table.c.id, table.c.kind, table.c.name).where(tuple_(table.c.kind, table.c.name).in_(chunk))
+        ))
+    missing = [{"kind": kind, "name": name, "label": wanted[(kind, name)]}
+               for kind, name in keys if (kind, name) not in found]
+    if missing:
+        # Another transaction may add the same tag meanwhile
+        upsert(connection, table, missing, ("kind", "name"))
+        for start in range(0, len(missing), 500):
+            chunk = [(row["kind"], row["name"]) for row in missing[start:start + 500]]
+            found.update(((kind, name), tag_id) for tag_id, kind, name in connection.execute(
+                select(table.c.id, table.c.kind, table.c.name).where(tuple_(table.c.kind, table.c.name).in_(chunk))
+            ))
+    return found
+
+def backfill_member_tags(session: Session, batch_size: int = TAG_BACKFILL_BATCH_SIZE) -> int:
+    """Rebuild the tags of every member, batch_size members per transaction; returns members read"""
+    columns = (Member.id,) + tuple(getattr(Member, column) for column in TAG_FIELDS)
+    after, total = 0, 0
+    while True:
+        rows = session.execute(
+            select(*columns).where(Member.id > after).order_by(Member.id).limit(batch_size)
+        ).all()
+        if not rows:
+            return total
+        members = {row[0]: dict(zip(TAG_FIELDS, row[1:])) for row in rows}
+        write_member_tags(session.connection(), members, replace=members)
+        session.commit()
+        after = rows[-1][0]
+        total += len(rows)
+
+def tag_filter(kind: str, value: str, match_all: bool = False):
+    """Member.id condition for members with any (or all) of the comma-separated tags,
+    resolved through the tag and member_tag indexes"""
+    names = list(split_tags(value))
+    tagged = select(MemberTag.member_id).\
+        join(Tag, Tag.id == MemberTag.tag_id).\
+        where(Tag.kind == kind, Tag.name.in_(names))
+    if match_all and len(names) > 1:
+        tagged = tagged.group_by(MemberTag.member_id).having(func.count() == len(names))
+    return Member.id.in_(tagged)
+
+_PENDING = "member_tag_changes"
+
+def _pending(target) -> Optional[Dict[str, Dict]]:
+    session = object_session(target)
+    if session is None:
+        return None
+    return session.info.setdefault(_PENDING, {"members": {}, "replace": set()})
+
+def _values(target) -> Dict[str, Any]:
+    return {column: getattr(target, column) for column in TAG_FIELDS}
+
+@event.listens_for(Member, "after_insert")
+def _tag_inserted(mapper, connection, target):
+    pending = _pending(target)
+    if pending is not None:
+        pending["members"][target.id] = _values(target)
+
+@event.listens_for(Member, "after_update")
+def _tag_updated(mapper, connection, target):
+    if not any(attributes.get_history(target, column).has_changes() for column in TAG_FIELDS):
+        return
+    pending = _pending(target)
+    if pending is not None:
+        pending["members"][target.id] = _values(target)
+        pending["replace"].add(target.id)
+
+@event.listens_for(Member, "after_delete")
+def _tag_deleted(mapper, connection, target):
+    pending = _pending(target)
+    if pending is not None:
+        pending["members"][target.id] = None
+        pending["replace"].add(target.id)
+
+@event.listens_for(Session, "after_flush")
+def _apply_pending(session, flush_context):
+    pending = session.info.pop(_PENDING, None)
+    if pending:
+        write_member_tags(session.connection(), pending["members"], pending["replace"])
+
+@event.listens_for(Session, "after_bulk_delete")
+def _drop_orphans(delete_context):
+    # ON DELETE CASCADE covers this elsewhere; SQLite does not enforce foreign keys by default
+    connection = delete_context.session.connection()
+    if delete_context.mapper.class_ is Member and connection.dialect.name == "sqlite":
+        connection.execute(delete(MemberTag.__table__).where(MemberTag.member_id.not_in(select(Member.id))))
+
+@event.listens_for(Session, "after_soft_rollback")
+def _drop_pending(session, previous_transaction):
+    session.info.pop(_PENDING, None)
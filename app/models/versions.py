@@ -0,0 +1,96 @@
+# Author: SANJAY KR
+import logging
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Tuple
+from sqlalchemy import DateTime, event, select
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.functions import FunctionElement
+from .. import db
+from .base import upsert
+
+logger = logging.getLogger(__name__)
+
+# Tables whose writes bump their version; admin read responses are validated against these
+VERSIONED_TABLES = ("samaj", "family", "member")
+
+class utcnow(FunctionElement):
+    """The database's current UTC time, so every worker stamps writes from one clock"""
+    type = DateTime()
+    inherit_cache = True
+
+@compiles(utcnow)
+def _compile_utcnow(element, compiler, **kw):
+    # SQLite's CURRENT_TIMESTAMP is already UTC
+    return "CURRENT_TIMESTAMP"
+
+@compiles(utcnow, "postgresql")
+def _compile_utcnow_postgresql(element, compiler, **kw):
+    return "TIMEZONE('utc', CURRENT_TIMESTAMP)"
+
+class TableVersion(db.Model):
+    """Write counter per table, bumped right after each transaction that changes the table"""
+    __tablename__ = "table_version"
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.BigInteger, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False, server_default=utcnow())
+
+def bump_versions(connection, tables: Iterable[str]) -> None:
+    """Increment the versions of the tables, in name order so concurrent transactions
+    lock the rows in the same order"""
+    rows = [{"name": name, "version": 1} for name in sorted(set(tables))]
+    table = TableVersion.__table__
+    upsert(connection, table, rows, ("name",),
+           lambda excluded: {"version": table.c.version + 1, "updated_at": utcnow()})
+
+def read_versions(session: Session, tables: Iterable[str]) -> Dict[str, Tuple[int, Optional[datetime]]]:
+    """Version and last write time of each table; (0, None) for tables never bumped"""
+    tables = tuple(tables)
+    versions = {name: (0, None) for name in tables}
+    rows = session.execute(
+        select(TableVersion.name, TableVersion.version, TableVersion.updated_at).
+        where(TableVersion.name.in_(tables))
+    )
+    for name, version, updated_at in rows:
+        versions[name] = (version, updated_at)
+    return versions
+
+_TOUCHED = "versioned_tables"
+
+def _touch(session, tables) -> None:
+    tables = set(tables).intersection(VERSIONED_TABLES)
+    if tables:
+        session.info.setdefault(_TOUCHED, set()).update(tables)
+
+@event.listens_for(Session, "after_flush")
+def _touch_flushed(session, flush_context):
+    # new/dirty/deleted still hold the flushed objects here
+    _touch(session, (getattr(obj, "__tablename__", None) for obj in session.new | session.deleted))
+    _touch(session, (getattr(obj, "__tablename__", None) for obj in session.dirty
+                     if session.is_modified(obj, include_collections=False)))
+
+@event.listens_for(Session, "do_orm_execute")
+def _touch_executed(orm_execute_state):
+    # Executemany inserts, bulk updates and Query.delete() bypass the flush
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        _touch(orm_execute_state.session, (getattr(orm_execute_state.statement.table, "name", None),))
+
+@event.listens_for(Session, "after_commit")
+def _bump_committed(session):
+    # Bumped in a transaction of its own once the data is committed, so the version rows
+    # are locked for one short upsert rather than for the whole write. A reader that sees
+    # the new version therefore also sees the new data.
+    tables = session.info.pop(_TOUCHED, None)
+    if not tables:
+        return
+    try:
+        with session.get_bind(TableVersion).begin() as connection:
+            bump_versions(connection, tables)
+    except Exception:
+        # The data is committed; cached responses stay stale until the next write
+        logger.exception("Could not bump the versions of %s", ", ".join(sorted(tables)))
+
+@event.listens_for(Session, "after_transaction_end")
+def _drop_touched(session, transaction):
+    if transaction.parent is None:
+        session.info.pop(_TOUCHED, None)
@@ -1,13 +1,21 @@
 # Author: SANJAY KR
-from flask import Blueprint, request, jsonify, send_file, render_template, current_app
+from flask import Blueprint, request, jsonify, render_template, current_app, Response, stream_with_context
+import io
+import json
 from ..models.family import Samaj, Member, Family
+from ..models.broadcast import BroadcastJob, BroadcastRecipient
+from ..models.tags import TAG_KINDS
 from ..controllers.admin_controller import (
-    get_members, get_samaj_list, get_member,
+    get_members_page, iter_members, get_samaj_summary, get_member,
     export_members_csv, get_family_members,
-    get_family_summary
+    get_family_summary, get_member_analytics, MEMBER_PAGE_SIZE, ANALYTICS_TOP
 )
-from io import StringIO
+from ..services.bulk_import import import_members, IMPORT_BATCH_SIZE
+from ..services.broadcast import get_broadcast_runner, audience_query, BROADCAST_FILTERS, MAX_MESSAGE_LENGTH
+from ..services.donor_search import search_donors, DONOR_AGE_MIN, DONOR_AGE_MAX, DONOR_PAGE_SIZE
 from ..utils.auth import login_required
+from ..utils.response_cache import versioned_response
+from ..utils.streaming import accepts_gzip, gzip_chunks
 from .. import db
 
 admin_bp = Blueprint("admin", __name__)
@@ -23,6 +31,7 @@ def list_members():
         filters = {
             "samaj_name": request.args.get("samaj_name"),
             "family_name": request.args.get("family_name"),
+            "family_id": request.args.get("family_id", type=int),
             "name": request.args.get("name"),
             "role": request.args.get("role"),
             "age_min": request.args.get("age_min"),
@@ -30,49 +39,84 @@ def list_members():
             "blood_group": request.args.get("blood_group"),
             "city": request.args.get("city"),
             "profession": request.args.get("profession"),
-            "is_family_head": request.args.get("is_family_head", type=bool)
+            "is_family_head": request.args.get("is_family_head", type=bool),
+            "tag_match": request.args.get("tag_match"),
+            **{kind: request.args.get(kind) for kind in TAG_KINDS}
         }
         
         # Remove None values
         filters = {k: v for k, v in filters.items() if v is not None}
         
-        members = get_members(db.session, filters)
-        return jsonify([{
-            "id": member.id,
-            "samaj": member.samaj.name,
-            "family": member.family.name,
-            "name": member.name,
-            "role": member.family_role,
-            "age": member.age,
-            "blood_group": member.blood_group,
-            "mobile": member.mobile_1,
-            "email": member.email,
-            "city": member.current_city,
-            "profession": member.profession_category,
-            "is_family_head": member.is_family_head
-        } for member in members])
+        after = request.args.get("after", type=int)
+        
+        # NDJSON streams every matching member, one keyset page at a time
+        if request.args.get("format") == "ndjson" or \
+                request.accept_mimetypes.best == "application/x-ndjson":
+            rows = iter_members(db.session, filters, after)
+            return _stream(
+                stream_with_context(json.dumps(row) + "\n" for row in rows),
+                "application/x-ndjson"
+            )
+        
+        limit = request.args.get("limit", MEMBER_PAGE_SIZE, type=int)
+        members, next_after = get_members_page(db.session, filters, limit, after)
+        response = jsonify(members)
+        if next_after is not None:
+            response.headers["X-Next-Cursor"] = str(next_after)
+        return response
     except Exception as e:
         current_app.logger.error(f"Error in list_members: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
 @admin_bp.route("/samaj", methods=["GET"])
 @login_required
+@versioned_response("samaj", "family", "member")
 def list_samaj():
     try:
-        samaj_list = get_samaj_list(db.session)
-        return jsonify([{
-            "id": samaj.id,
-            "name": samaj.name,
-            "family_count": len(samaj.families),
-            "member_count": len(samaj.members),
-            "created_at": samaj.created_at
-        } for samaj in samaj_list])
+        return jsonify(get_samaj_summary(db.session))
     except Exception as e:
         current_app.logger.error(f"Error in list_samaj: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
+@admin_bp.route("/analytics", methods=["GET"])
+@login_required
+def analytics():
+    try:
+        top = request.args.get("top", ANALYTICS_TOP, type=int)
+        return jsonify(get_member_analytics(db.session, max(1, top)))
+    except Exception as e:
+        current_app.logger.error(f"Error in analytics: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@admin_bp.route("/donors", methods=["GET"])
+@login_required
+def find_donors():
+    """Members in a city who can donate to the given recipient blood group, best match first"""
+    blood_group = request.args.get("blood_group")
+    city = request.args.get("city")
+    if not blood_group or not city:
+        return jsonify({"error": "blood_group and city are required"}), 400
+    try:
+        donors, next_after = search_donors(
+            db.session, blood_group, city,
+            age_min=request.args.get("age_min", DONOR_AGE_MIN, type=int),
+            age_max=request.args.get("age_max", DONOR_AGE_MAX, type=int),
+            limit=request.args.get("limit", DONOR_PAGE_SIZE, type=int),
+            after=request.args.get("after")
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        current_app.logger.error(f"Error in find_donors: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+    response = jsonify(donors)
+    if next_after is not None:
+        response.headers["X-Next-Cursor"] = next_after
+    return response
+
 @admin_bp.route("/families/summary", methods=["GET"])
 @login_required
+@versioned_response("samaj", "family", "member")
 def list_families():
     try:
         filters = {
@@ -88,6 +132,7 @@ def list_families():
 
 @admin_bp.route("/families/<int:family_id>/members", methods=["GET"])
 @login_required
+@versioned_response("member")
 def get_family_members_list(family_id: int):
     try:
         members = get_family_members(family_id, db.session)
@@ -106,6 +151,7 @@ def get_family_members_list(family_id: int):
 
 @admin_bp.route("/members/<int:member_id>", methods=["GET"])
 @login_required
+@versioned_response("samaj", "family", "member")
 def get_member_details(member_id: int):
     try:
         member = get_member(member_id, db.session)
@@ -158,25 +204,111 @@ def export_csv():
             "name": request.args.get("name"),
             "role": request.args.get("role"),
             "city": request.args.get("city"),
-            "profession": request.args.get("profession")
+            "profession": request.args.get("profession"),
+            "tag_match": request.args.get("tag_match"),
+            **{kind: request.args.get(kind) for kind in TAG_KINDS}
         }
         
         # Remove None values
         filters = {k: v for k, v in filters.items() if v is not None}
         
-        csv_data, filename = export_members_csv(db.session, filters)
-        
-        from io import BytesIO
-        output = BytesIO()
-        output.write(csv_data.encode('utf-8'))
-        output.seek(0)
-        
-        return send_file(
-            output,
-            mimetype="text/csv",
-            as_attachment=True,
-            download_name=filename
+        chunks, filename = export_members_csv(db.session, filters)
+        return _stream(
+            stream_with_context(chunks),
+            "text/csv",
+            {"Content-Disposition": f'attachment; filename="{filename}"'}
         )
     except Exception as e:
         current_app.logger.error(f"Error in export_csv: {str(e)}")
         return jsonify({"error": str(e)}), 500
+
+@admin_bp.route("/import", methods=["POST"])
+@login_required
+def bulk_import():
+    """Import members from an uploaded CSV or NDJSON file (multipart field 'file' or the raw body)"""
+    try:
+        upload = request.files.get("file")
+        name = upload.filename if upload else ""
+        fmt = request.args.get("format") or ("ndjson" if name.endswith((".ndjson", ".jsonl")) or
+                                             request.mimetype == "application/x-ndjson" else "csv")
+        if fmt not in ("csv", "ndjson"):
+            return jsonify({"error": "format must be csv or ndjson"}), 400
+        
+        stream = io.TextIOWrapper(upload.stream if upload else request.stream, encoding="utf-8-sig", newline="")
+        batch_size = request.args.get("batch_size", IMPORT_BATCH_SIZE, type=int)
+        report = import_members(db.session, stream, fmt, batch_size)
+        current_app.logger.info(
+            f"Bulk import: {report.imported}/{report.total} members at {report.rows_per_sec:.0f} rows/sec"
+        )
+        return jsonify(report.to_dict())
+    except Exception as e:
+        current_app.logger.error(f"Error in bulk_import: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@admin_bp.route("/broadcasts", methods=["POST"])
+@login_required
+def create_broadcast():
+    """Send a message to every member matching the member list filters, in the background"""
+    payload = request.get_json(silent=True) or {}
+    message = (payload.get("message") or "").strip()
+    filters = payload.get("filters") or {}
+    if not message or len(message) > MAX_MESSAGE_LENGTH:
+        return jsonify({"error": f"message is required (at most {MAX_MESSAGE_LENGTH} characters)"}), 400
+    if not isinstance(filters, dict) or set(filters) - set(BROADCAST_FILTERS):
+        return jsonify({"error": f"filters may only use: {', '.join(BROADCAST_FILTERS)}"}), 400
+    try:
+        # Builds the query without running it, so bad values fail here rather than in the runner
+        audience_query(db.session, filters)
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": f"Invalid filters: {str(e)}"}), 400
+    try:
+        job = get_broadcast_runner().create(db.session, message, filters)
+        current_app.logger.info(f"Broadcast {job.id} started with filters {filters}")
+        return jsonify(job.to_dict()), 202
+    except Exception as e:
+        current_app.logger.error(f"Error in create_broadcast: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@admin_bp.route("/broadcasts/<int:job_id>", methods=["GET"])
+@login_required
+def get_broadcast(job_id: int):
+    job = db.session.get(BroadcastJob, job_id)
+    if job is None:
+        return jsonify({"error": "Broadcast not found"}), 404
+    return jsonify(job.to_dict())
+
+@admin_bp.route("/broadcasts/<int:job_id>/failures", methods=["GET"])
+@login_required
+def list_broadcast_failures(job_id: int):
+    """Failed recipients of a job by phone, paged with the X-Next-Cursor header"""
+    limit = max(1, min(request.args.get("limit", MEMBER_PAGE_SIZE, type=int), 1000))
+    query = db.session.query(BroadcastRecipient.phone, BroadcastRecipient.member_id, BroadcastRecipient.error).\
+        filter(BroadcastRecipient.job_id == job_id, BroadcastRecipient.status == "failed")
+    after = request.args.get("after")
+    if after:
+        query = query.filter(BroadcastRecipient.phone > after)
+    rows = query.order_by(BroadcastRecipient.phone).limit(limit + 1).all()
+    response = jsonify([row._asdict() for row in rows[:limit]])
+    if len(rows) > limit:
+        response.headers["X-Next-Cursor"] = rows[limit - 1].phone
+    return response
+
+@admin_bp.route("/broadcasts/<int:job_id>/cancel", methods=["POST"])
+@login_required
+def cancel_broadcast(job_id: int):
+    """Stop a job after its current page; numbers not yet sent stay pending"""
+    job = db.session.get(BroadcastJob, job_id)
+    if job is None:
+        return jsonify({"error": "Broadcast not found"}), 404
+    if job.status in ("queued", "running"):
+        job.status = "cancelling"
+        db.session.commit()
+    return jsonify(job.to_dict())
+
+def _stream(chunks, mimetype: str, headers: dict = None) -> Response:
+    """Streaming response, gzipped on the fly when the client accepts it"""
+    headers = dict(headers or {}, Vary="Accept-Encoding")
+    if accepts_gzip(request):
+        chunks = gzip_chunks(chunks)
+        headers["Content-Encoding"] = "gzip"
+    return Response(chunks, mimetype=mimetype, headers=headers)
@@ -0,0 +1,27 @@
+# Author: SANJAY KR
+from flask import Blueprint, current_app, jsonify, request
+from ..utils.auth import login_required
+from ..utils.startup import run_checks
+
+health_bp = Blueprint("health", __name__)
+
+@health_bp.route("/health", methods=["GET"])
+def health():
+    """Liveness and boot time, open to load balancers; ?deep=1 needs an admin token"""
+    if request.args.get("deep") in ("1", "true"):
+        return deep_health()
+    return jsonify(_liveness())
+
+@login_required
+def deep_health():
+    """Liveness plus the database and Twilio checks (503 on failure). Each check calls out,
+    Twilio's on its API quota, and its error text is internal, so only admins may run it."""
+    body = _liveness()
+    body["checks"] = run_checks(current_app._get_current_object())
+    if all(check["ok"] for check in body["checks"].values()):
+        return jsonify(body)
+    body["status"] = "error"
+    return jsonify(body), 503
+
+def _liveness():
+    return {"status": "ok", "boot_seconds": round(current_app.extensions.get("boot_seconds", 0.0), 4)}
@@ -0,0 +1,10 @@
+# Author: SANJAY KR
+from flask import Blueprint
+from ..utils.metrics import metrics
+
+metrics_bp = Blueprint("metrics", __name__)
+
+@metrics_bp.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    """Prometheus scrape endpoint for this worker's counters and latency histograms"""
+    return metrics.render(), 200, {"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
@@ -1,56 +1,88 @@
 # Author: SANJAY KR
 from flask import Blueprint, request, jsonify, current_app
 import os
+from typing import Dict, Any
 from sqlalchemy.orm import Session
 from ..models.base import get_db
 from ..controllers.whatsapp_controller import handle_webhook
+from ..services.outbound_queue import OutboundQueueFull
+from ..utils.metrics import metrics
 
 whatsapp_bp = Blueprint("whatsapp", __name__)
 
 @whatsapp_bp.route("/webhook", methods=["POST"])
 def webhook():
-    try:
-        request_data = request.form
-        if 'NumMedia' in request_data and int(request_data['NumMedia']) > 0:
-            return jsonify({
-                "success": False,
-                "message": "Media attachments are not supported. Please send text messages only."
-            }), 400
+    with metrics.span("webhook"):
+        return _webhook()
+
+
+MEDIA_REJECTED = "Media attachments are not supported. Please send text messages only."
+ERROR_REPLY = "An error occurred. Please try again by sending 'Start'."
+# Seconds Twilio is asked to wait before redelivering a message refused for a full outbound queue
+BUSY_RETRY_AFTER = "5"
+
+
+def has_media(form) -> bool:
+    return 'NumMedia' in form and int(form['NumMedia']) > 0
+
+
+def sender_phone(form) -> str:
+    """E.164 number from Twilio's 'whatsapp:+91...' From field"""
+    phone_number = form.get("From", "").split(":")[-1].strip()
+    if not phone_number.startswith("+"):
+        phone_number = "+" + phone_number
+    return phone_number
 
-        phone_number = request_data.get("From", "").split(":")[-1].strip()
-        if not phone_number.startswith("+"):
-            phone_number = "+" + phone_number
 
+def dev_reply(response: str, phone_number: str, message: str) -> Dict[str, Any]:
+    """JSON body returned instead of TwiML in development mode"""
+    return {
+        "success": True,
+        "message": response,
+        "debug_info": {
+            "phone": phone_number,
+            "original_message": message,
+            "processed": True
+        }
+    }
+
+
+def twiml_reply(message: str) -> str:
+    from twilio.twiml.messaging_response import MessagingResponse
+    twiml = MessagingResponse()
+    twiml.message(message)
+    return str(twiml)
+
+
+def _webhook():
+    try:
+        with metrics.span("parse_form"):
+            request_data = request.form
+        if has_media(request_data):
+            return jsonify({"success": False, "message": MEDIA_REJECTED}), 400
+
+        phone_number = sender_phone(request_data)
         message = request_data.get("Body", "")
         current_app.logger.info(f"Received webhook: from={phone_number}, message={message}")
 
         db = get_db()
-        response, success = handle_webhook(
-            phone_number=phone_number,
-            message=message,
-            db=db
-        )
+        with metrics.span("handle_webhook"):
+            response, success = handle_webhook(
+                phone_number=phone_number,
+                message=message,
+                db=db,
+                message_sid=request_data.get("MessageSid")
+            )
 
         if os.getenv("FLASK_ENV") == "development":
-            return jsonify({
-                "success": True,
-                "message": response,
-                "debug_info": {
-                    "phone": phone_number,
-                    "original_message": message,
-                    "processed": True
-                }
-            })
+            return jsonify(dev_reply(response, phone_number, message))
 
         # Create TwiML response for Twilio
-        from twilio.twiml.messaging_response import MessagingResponse
-        twiml = MessagingResponse()
-        twiml.message(response)
-        return str(twiml), 200, {'Content-Type': 'text/xml'}
+        return twiml_reply(response), 200, {'Content-Type': 'text/xml'}
+    except OutboundQueueFull as e:
+        current_app.logger.warning(f"Webhook refused, {str(e)}")
+        return "", 503, {'Retry-After': BUSY_RETRY_AFTER}
     except Exception as e:
         current_app.logger.error(f"Webhook error: {str(e)}")
         # Create error TwiML response
-        from twilio.twiml.messaging_response import MessagingResponse
-        twiml = MessagingResponse()
-        twiml.message("An error occurred. Please try again by sending 'Start'.")
-        return str(twiml), 500, {'Content-Type': 'text/xml'}
+        return twiml_reply(ERROR_REPLY), 500, {'Content-Type': 'text/xml'}
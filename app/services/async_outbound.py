@@ -0,0 +1,120 @@
+# Author: SANJAY KR
+import asyncio
+import logging
+import threading
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from .outbound_queue import OutboundQueueFull, Reservation, is_retryable, reserve_slot
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class AsyncOutboundQueue:
+    """OutboundQueue counterpart that sends from coroutines on an event loop.
+
+    A send waiting on Twilio holds a coroutine instead of a thread, so many more sends
+    can be in flight. enqueue() may be called from any thread. As with OutboundQueue,
+    each destination is pinned to one worker, which keeps a phone's replies in order.
+    """
+
+    def __init__(self, send: Callable[[str, str, str], Awaitable[object]], workers: int = 64,
+                 max_pending: int = 1000, max_retries: int = 3, backoff_seconds: float = 0.5):
+        self.send = send
+        self.workers = workers
+        self.max_pending = max_pending
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.counters = {"sent": 0, "failed": 0, "retried": 0, "dropped": 0}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._slots: List[threading.BoundedSemaphore] = []
+        self._queues: List[asyncio.Queue] = []
+        self._tasks: List[asyncio.Task] = []
+
+    def start(self) -> None:
+        """Start the workers on the running event loop"""
+        self._loop = asyncio.get_running_loop()
+        per_worker = max(1, self.max_pending // self.workers)
+        # Thread semaphores, as places are reserved from the DB threads
+        self._slots = [threading.BoundedSemaphore(per_worker) for _ in range(self.workers)]
+        self._queues = [asyncio.Queue() for _ in range(self.workers)]
+        self._tasks = [self._loop.create_task(self._run(i)) for i in range(self.workers)]
+
+    def running(self) -> bool:
+        return self._loop is not None and not self._loop.is_closed()
+
+    def reserve(self, to: str, timeout: Optional[float] = None) -> Reservation:
+        """Hold a place for a message to the destination, raising OutboundQueueFull if
+        none frees up within timeout. Must not be called on the event loop's thread."""
+        if not self.running():
+            raise OutboundQueueFull("Async outbound queue not running")
+        return reserve_slot(self._slots, to, timeout)
+
+    def enqueue(self, to: str, from_: str, body: str, reservation: Optional[Reservation] = None) -> bool:
+        """Queue a message in its reserved place, or in a free one; returns False if the
+        queue is full or not running"""
+        if not self.running():
+            logger.error(f"Async outbound queue not running, dropping message to {to}")
+            return False
+        if reservation is None:
+            try:
+                reservation = reserve_slot(self._slots, to, 0)
+            except OutboundQueueFull:
+                self.counters["dropped"] += 1
+                logger.error(f"Outbound queue full, dropping message to {to}")
+                return False
+        self._loop.call_soon_threadsafe(self._queues[reservation.take()].put_nowait, (to, from_, body))
+        return True
+
+    async def _run(self, worker: int) -> None:
+        q = self._queues[worker]
+        while True:
+            item = await q.get()
+            try:
+                if item is _STOP:
+                    return
+                self._slots[worker].release()
+                await self._deliver(*item)
+            finally:
+                q.task_done()
+
+    async def _deliver(self, to: str, from_: str, body: str) -> None:
+        attempt = 0
+        while True:
+            try:
+                await self.send(from_, to, body)
+                self.counters["sent"] += 1
+                return
+            except Exception as e:
+                if attempt < self.max_retries and is_retryable(e):
+                    delay = self.backoff_seconds * (2 ** attempt)
+                    attempt += 1
+                    self.counters["retried"] += 1
+                    logger.warning(f"Retrying message to {to} in {delay:.2f}s (attempt {attempt}): {str(e)}")
+                    await asyncio.sleep(delay)
+                    continue
+                self.counters["failed"] += 1
+                logger.error(f"Failed to send WhatsApp message to {to}: {str(e)}")
+                return
+
+    def pending(self) -> int:
+        return sum(q.qsize() for q in self._queues)
+
+    def stats(self) -> Dict[str, int]:
+        stats = dict(self.counters)
+        stats["pending"] = self.pending()
+        return stats
+
+    async def join(self) -> None:
+        """Wait until every queued message has been delivered or given up on"""
+        # Let puts scheduled by enqueue() land first
+        await asyncio.sleep(0)
+        for q in self._queues:
+            await q.join()
+
+    async def close(self) -> None:
+        for q in self._queues:
+            await q.put(_STOP)
+        await asyncio.gather(*self._tasks)
+        self._loop = None
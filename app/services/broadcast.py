@@ -0,0 +1,414 @@
+# Author: SANJAY KR
+"""Broadcast jobs: one WhatsApp message to every member matching the admin member filters.
+
+A job runs on a background thread of the worker that claimed it. That thread reads the
+matching members a page at a time in id order and claims each page's numbers (mobile_1 and
+mobile_2, normalized to E.164) in broadcast_recipient. The table's (job_id, phone) primary
+key drops numbers the job already has, so duplicates are found by the database rather than
+by a set of every number in memory. New numbers go to a bounded queue read by sender
+threads. Each Twilio call waits for the sending number's shared send rate (see send_rate),
+so broadcasts and webhook replies from every worker stay under one limit together. Counts
+and failures are written back after every page, so any worker can report on a job.
+
+The claim is a lease that the worker's monitor thread renews. If the worker dies, the lease
+expires and another worker's monitor takes the job over. It re-queues the numbers still
+pending in broadcast_recipient, then resumes the member scan from the saved cursor. A number
+sent just before the death but not yet recorded may therefore get the message twice.
+"""
+import logging
+import os
+import queue
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+from flask import Flask, current_app, has_app_context
+from sqlalchemy import and_, bindparam, case, or_, select, update
+from sqlalchemy.orm import Session
+
+from .outbound_queue import is_retryable
+from .. import db
+from ..controllers.admin_controller import filter_members
+from ..models.base import upsert
+from ..models.broadcast import BroadcastJob, BroadcastRecipient
+from ..models.family import Samaj, Family, Member
+from ..models.tags import TAG_KINDS
+from ..utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+BROADCAST_FILTERS = ("samaj_name", "family_name", "name", "role", "age_min", "age_max",
+                     "blood_group", "city", "profession", "is_family_head", "tag_match") + TAG_KINDS
+MAX_MESSAGE_LENGTH = 1600
+# Statuses of a job some worker should be running
+ACTIVE_STATUSES = ("running", "cancelling")
+
+_STOP = object()
+
+
+def normalize_phone(number: Optional[str], country_code: str) -> Optional[str]:
+    """E.164 form of a stored mobile number; 10-digit numbers get the default country code"""
+    digits = "".join(ch for ch in number if ch.isdigit()) if number else ""
+    if len(digits) == 10:
+        digits = country_code + digits
+    return f"+{digits}" if 10 < len(digits) <= 15 else None
+
+
+def audience_query(session: Session, filters: Dict):
+    """Member ids and numbers matching the admin member filters"""
+    query = session.query(Member.id, Member.mobile_1, Member.mobile_2).\
+        select_from(Member).\
+        join(Family, Member.family_id == Family.id).\
+        join(Samaj, and_(Member.samaj_id == Samaj.id, Family.samaj_id == Samaj.id))
+    return filter_members(query, filters)
+
+
+def claim_recipients(session: Session, job_id: int, numbers: Dict[str, int]) -> List[str]:
+    """Insert the numbers (phone -> member id) the job has not claimed yet; returns those"""
+    if not numbers:
+        return []
+    table = BroadcastRecipient.__table__
+    rows = [{"job_id": job_id, "phone": phone, "member_id": member_id, "status": "pending"}
+            for phone, member_id in numbers.items()]
+    claimed = upsert(session.connection(), table, rows, ("job_id", "phone"), returning=(table.c.phone,))
+    return [phone for phone, in claimed]
+
+
+def lease_expired(stale: datetime):
+    """Active jobs whose runner has not renewed its lease since `stale`"""
+    return and_(BroadcastJob.status.in_(ACTIVE_STATUSES),
+                or_(BroadcastJob.heartbeat_at.is_(None), BroadcastJob.heartbeat_at < stale))
+
+
+class BroadcastRunner:
+    """Runs broadcast jobs on background threads of this worker, each under a lease of
+    lease_seconds. `send` is expected to wait for the sender's rate, as
+    WhatsAppService._deliver does."""
+
+    def __init__(self, app: Flask, send: Callable[[str, str, str], object], from_: str,
+                 workers: int = 16, batch_size: int = 500, country_code: str = "91",
+                 max_retries: int = 3, backoff_seconds: float = 0.5, lease_seconds: float = 60):
+        self.app = app
+        self.send = send
+        self.from_ = from_
+        self.workers = max(1, workers)
+        self.batch_size = batch_size
+        self.country_code = country_code
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.lease_seconds = lease_seconds
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._threads: Dict[int, threading.Thread] = {}
+        # Jobs this worker holds the lease of, each with the event set if it loses the lease
+        self._leases: Dict[int, threading.Event] = {}
+        self._lock = threading.Lock()
+        self._monitor: Optional[threading.Thread] = None
+        self._stop_monitor = threading.Event()
+
+    def create(self, session: Session, message: str, filters: Dict) -> BroadcastJob:
+        job = BroadcastJob(message=message, filters=filters)
+        session.add(job)
+        session.commit()
+        self.start(job.id)
+        return job
+
+    def start(self, job_id: int) -> None:
+        thread = threading.Thread(target=self._run, args=(job_id,), name=f"broadcast-{job_id}", daemon=True)
+        with self._lock:
+            self._threads = {k: t for k, t in self._threads.items() if t.is_alive()}
+            if job_id in self._threads:
+                return
+            self._threads[job_id] = thread
+        thread.start()
+
+    def start_monitor(self) -> None:
+        """Every third of the lease, from a daemon thread: renew the leases of this worker's
+        jobs and resume the jobs of dead workers"""
+        if self.lease_seconds <= 0 or self._monitor is not None:
+            return
+
+        def run():
+            while not self._stop_monitor.wait(self.lease_seconds / 3):
+                with self.app.app_context():
+                    try:
+                        self.renew(db.session)
+                        for job_id in self.recover(db.session):
+                            logger.warning(f"Resuming broadcast {job_id}, whose lease expired")
+                    except Exception as e:
+                        db.session.rollback()
+                        logger.error(f"Broadcast lease check failed: {str(e)}")
+
+        self._stop_monitor.clear()
+        self._monitor = threading.Thread(target=run, name="broadcast-monitor", daemon=True)
+        self._monitor.start()
+
+    def stop_monitor(self) -> None:
+        if self._monitor is not None:
+            self._stop_monitor.set()
+            self._monitor.join()
+            self._monitor = None
+
+    def renew(self, session: Session) -> None:
+        """Extend the leases this worker holds; a job whose lease another worker took stops"""
+        with self._lock:
+            leases = dict(self._leases)
+        now = datetime.utcnow()
+        for job_id, lost in leases.items():
+            renewed = session.execute(
+                update(BroadcastJob).
+                where(BroadcastJob.id == job_id, BroadcastJob.lease_owner == self.owner).
+                values(heartbeat_at=now)
+            ).rowcount
+            if not renewed:
+                lost.set()
+        session.commit()
+
+    def recover(self, session: Session) -> List[int]:
+        """Start the jobs whose lease expired, and queued jobs nobody claimed within a lease
+        (their worker died before starting them); returns their ids"""
+        stale = datetime.utcnow() - timedelta(seconds=self.lease_seconds)
+        job_ids = session.scalars(
+            select(BroadcastJob.id).
+            where(or_(lease_expired(stale),
+                      and_(BroadcastJob.status == "queued", BroadcastJob.created_at < stale))).
+            order_by(BroadcastJob.id)
+        ).all()
+        session.commit()
+        with self._lock:
+            job_ids = [job_id for job_id in job_ids if job_id not in self._leases]
+        for job_id in job_ids:
+            self.start(job_id)
+        return job_ids
+
+    def claim(self, session: Session, job_id: int) -> bool:
+        """Take the job's lease if it is queued or its lease expired; only one worker wins"""
+        now = datetime.utcnow()
+        stale = now - timedelta(seconds=self.lease_seconds)
+        claimed = session.execute(
+            update(BroadcastJob).
+            where(BroadcastJob.id == job_id, or_(BroadcastJob.status == "queued", lease_expired(stale))).
+            values(status=case((BroadcastJob.status == "queued", "running"), else_=BroadcastJob.status),
+                   lease_owner=self.owner, heartbeat_at=now)
+        ).rowcount
+        session.commit()
+        return claimed == 1
+
+    def wait(self, job_id: int, timeout: Optional[float] = None) -> None:
+        """Block until the job's thread in this worker finishes"""
+        thread = self._threads.get(job_id)
+        if thread is not None:
+            thread.join(timeout)
+
+    def stats(self) -> Dict[str, int]:
+        return {"running_jobs": sum(thread.is_alive() for thread in list(self._threads.values()))}
+
+    def _run(self, job_id: int) -> None:
+        with self.app.app_context():
+            if not self.claim(db.session, job_id):
+                # Another worker holds the lease
+                return
+            lost = threading.Event()
+            with self._lock:
+                self._leases[job_id] = lost
+            try:
+                self._execute(db.session, job_id, lost)
+            except Exception as e:
+                logger.error(f"Broadcast {job_id} failed: {str(e)}")
+                db.session.rollback()
+                db.session.execute(
+                    update(BroadcastJob).
+                    where(BroadcastJob.id == job_id, BroadcastJob.lease_owner == self.owner).
+                    values(status="failed", error=str(e)[:500], finished_at=datetime.utcnow())
+                )
+                db.session.commit()
+            finally:
+                with self._lock:
+                    self._leases.pop(job_id, None)
+
+    def _execute(self, session: Session, job_id: int, lost: threading.Event) -> None:
+        job = session.get(BroadcastJob, job_id)
+        if job.status == "cancelling":
+            job.status = "cancelled"
+            job.finished_at = datetime.utcnow()
+            session.commit()
+            return
+        job.started_at = job.started_at or datetime.utcnow()
+        session.commit()
+        message, filters = job.message, dict(job.filters or {})
+
+        # Bounded, so reading members never runs far ahead of sending
+        pending: "queue.Queue" = queue.Queue(maxsize=self.workers * 4)
+        results: "queue.SimpleQueue[Tuple[str, Optional[str]]]" = queue.SimpleQueue()
+        cancelled = threading.Event()
+
+        def stopped() -> bool:
+            return cancelled.is_set() or lost.is_set()
+
+        senders = [
+            threading.Thread(target=self._send_loop, args=(pending, results, stopped, message),
+                             name=f"broadcast-{job_id}-sender-{i}", daemon=True)
+            for i in range(self.workers)
+        ]
+        for sender in senders:
+            sender.start()
+
+        try:
+            # Numbers an earlier runner of the job claimed but did not record as sent
+            after_phone = ""
+            while not stopped():
+                phones = session.scalars(
+                    select(BroadcastRecipient.phone).
+                    where(BroadcastRecipient.job_id == job_id, BroadcastRecipient.status == "pending",
+                          BroadcastRecipient.phone > after_phone).
+                    order_by(BroadcastRecipient.phone).limit(self.batch_size)
+                ).all()
+                if not phones:
+                    break
+                after_phone = phones[-1]
+                if not self._record(session, job_id, results, lost):
+                    break
+                if self._status(session, job_id) == "cancelling":
+                    cancelled.set()
+                session.commit()
+                for phone in phones:
+                    pending.put(phone)
+
+            after = job.cursor
+            while not stopped():
+                rows = audience_query(session, filters).\
+                    filter(Member.id > after).order_by(Member.id).limit(self.batch_size).all()
+                if not rows:
+                    break
+                numbers: Dict[str, int] = {}
+                valid = invalid = 0
+                for member_id, *mobiles in rows:
+                    for mobile in mobiles:
+                        if not mobile or mobile.strip().lower() == "skip":
+                            continue
+                        phone = normalize_phone(mobile, self.country_code)
+                        if phone is None:
+                            invalid += 1
+                            continue
+                        valid += 1
+                        numbers.setdefault(phone, member_id)
+                new = claim_recipients(session, job_id, numbers)
+                after = rows[-1].id
+                if not self._record(session, job_id, results, lost, cursor=after,
+                                    recipients=BroadcastJob.recipients + len(new),
+                                    duplicates=BroadcastJob.duplicates + valid - len(new),
+                                    invalid=BroadcastJob.invalid + invalid):
+                    break
+                if self._status(session, job_id) == "cancelling":
+                    cancelled.set()
+                # Committed before queueing, so no transaction stays open while senders catch up
+                session.commit()
+                for phone in new:
+                    pending.put(phone)
+        finally:
+            for _ in senders:
+                pending.put(_STOP)
+            for sender in senders:
+                sender.join()
+
+        cancelling = cancelled.is_set() or self._status(session, job_id) == "cancelling"
+        if lost.is_set() or not self._record(session, job_id, results, lost,
+                                             status="cancelled" if cancelling else "completed",
+                                             finished_at=datetime.utcnow()):
+            # The new runner re-sends what this one did not record
+            logger.warning(f"Broadcast {job_id} was taken over by another worker")
+            session.rollback()
+            return
+        session.commit()
+        logger.info(f"Broadcast {job_id} {job.status}: {job.sent} sent, {job.failed} failed, "
+                    f"{job.duplicates} duplicate and {job.invalid} invalid numbers")
+
+    @staticmethod
+    def _status(session: Session, job_id: int) -> str:
+        """Status as stored, which an admin may have set to cancelling meanwhile"""
+        return session.scalar(select(BroadcastJob.status).where(BroadcastJob.id == job_id))
+
+    def _record(self, session: Session, job_id: int, results: "queue.SimpleQueue",
+                lost: threading.Event, **progress) -> bool:
+        """Write delivery results collected from the senders since the last call, with the
+        given job columns, while this worker holds the lease. A runner that lost it rolls
+        back and returns False, leaving the job to its new owner."""
+        updates = []
+        while True:
+            try:
+                phone, error = results.get_nowait()
+            except queue.Empty:
+                break
+            updates.append({"job_id": job_id, "phone": phone, "status": "failed" if error else "sent",
+                            "error": error[:200] if error else None})
+        if updates:
+            table = BroadcastRecipient.__table__
+            session.execute(
+                update(table).
+                where(table.c.job_id == bindparam("b_job_id"), table.c.phone == bindparam("b_phone")).
+                values(status=bindparam("b_status"), error=bindparam("b_error")),
+                [{f"b_{key}": value for key, value in u.items()} for u in updates]
+            )
+        failed = sum(1 for u in updates if u["error"])
+        owned = session.execute(
+            update(BroadcastJob).
+            where(BroadcastJob.id == job_id, BroadcastJob.lease_owner == self.owner).
+            values(sent=BroadcastJob.sent + len(updates) - failed, failed=BroadcastJob.failed + failed,
+                   **progress)
+        ).rowcount
+        if not owned:
+            session.rollback()
+            lost.set()
+        return bool(owned)
+
+    def _send_loop(self, pending: "queue.Queue", results: "queue.SimpleQueue",
+                   stopped: Callable[[], bool], message: str) -> None:
+        while True:
+            phone = pending.get()
+            if phone is _STOP:
+                return
+            if stopped():
+                # Left pending in broadcast_recipient
+                continue
+            error = self._deliver(phone, message)
+            metrics.increment("broadcast_messages_total", result="failed" if error else "sent")
+            results.put((phone, error))
+
+    def _deliver(self, phone: str, message: str) -> Optional[str]:
+        """Send with retries on Twilio throttling and server errors; returns the error, if any"""
+        attempt = 0
+        while True:
+            try:
+                self.send(self.from_, f"whatsapp:{phone}", message)
+                return None
+            except Exception as e:
+                if attempt < self.max_retries and is_retryable(e):
+                    time.sleep(self.backoff_seconds * (2 ** attempt))
+                    attempt += 1
+                    continue
+                logger.error(f"Broadcast message to {phone} failed: {str(e)}")
+                return str(e) or type(e).__name__
+
+
+def get_broadcast_runner() -> BroadcastRunner:
+    """The app's BroadcastRunner, sending through the WhatsApp service's Twilio client"""
+    if not has_app_context():
+        raise RuntimeError("No Flask application context")
+    app = current_app._get_current_object()
+    if "broadcast_runner" not in app.extensions:
+        from .whatsapp_service import get_whatsapp_service
+        service = get_whatsapp_service()
+        runner = BroadcastRunner(
+            app, service._deliver, service.phone_number,
+            workers=int(app.config.get("BROADCAST_WORKERS", 16)),
+            batch_size=int(app.config.get("BROADCAST_BATCH_SIZE", 500)),
+            country_code=str(app.config.get("BROADCAST_COUNTRY_CODE", "91")),
+            max_retries=int(app.config.get("OUTBOUND_MAX_RETRIES", 3)),
+            backoff_seconds=float(app.config.get("OUTBOUND_RETRY_BACKOFF", 0.5)),
+            lease_seconds=float(app.config.get("BROADCAST_LEASE_SECONDS", 60))
+        )
+        app.extensions["broadcast_runner"] = runner
+        metrics.register_gauges("broadcast", runner.stats)
+    return app.extensions["broadcast_runner"]
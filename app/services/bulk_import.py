@@ -0,0 +1,295 @@
+# Author: SANJAY KR
+"""Bulk member import from CSV or NDJSON.
+
+Rows are read as a stream and processed in batches. Each batch validates fields with
+the WhatsApp flow's rules, resolves Samaj and families with a handful of IN queries,
+checks family roles against cached role summaries and inserts members with a single
+executemany, so the statement count depends on the number of batches, not rows.
+"""
+import csv
+import json
+import logging
+import time
+from itertools import islice
+from typing import Any, Dict, IO, Iterable, Iterator, List, Optional, Tuple, Union
+
+from sqlalchemy import func, insert, select, update
+
+from .conversation_flow import FIELD_RULES, OPTIONAL_FIELDS, validate_value
+from .family_directory import normalize_name
+from ..models.analytics import record_member_stats
+from ..models.tags import TAG_RETURNING, write_member_tags
+from ..models.family import Samaj, Family, Member, family_role_summary, preload_family_role_summaries
+
+logger = logging.getLogger(__name__)
+
+IMPORT_BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+REQUIRED_FIELDS = ("samaj", "name", "family_role")
+MEMBER_FIELDS = tuple(field for field in FIELD_RULES if field not in ("samaj", "family_head"))
+MEMBER_COLUMNS = ("samaj_id", "family_id", "is_family_head") + MEMBER_FIELDS
+
+
+class ImportReport:
+    """Counts, timing and per-row errors of one import run"""
+
+    def __init__(self, max_errors: int = MAX_REPORTED_ERRORS):
+        self.total = 0
+        self.imported = 0
+        self.failed = 0
+        self.errors: List[Dict[str, Any]] = []
+        self.max_errors = max_errors
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+
+    def error(self, row_number: int, message: str) -> None:
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({"row": row_number, "error": message})
+
+    @property
+    def rows_per_sec(self) -> float:
+        return self.total / self.elapsed if self.elapsed else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "total": self.total,
+            "imported": self.imported,
+            "failed": self.failed,
+            "elapsed_seconds": round(self.elapsed, 3),
+            "rows_per_sec": round(self.rows_per_sec, 1),
+            "errors": self.errors,
+            "errors_truncated": self.failed > len(self.errors)
+        }
+
+
+class RecordError:
+    """A row that could not be parsed, reported as that row's error"""
+
+    def __init__(self, message: str):
+        self.message = message
+
+
+def _normalize_key(key: str) -> str:
+    return key.strip().lower().replace(" ", "_")
+
+
+def read_records(stream: IO[str], fmt: str) -> Iterator[Union[Dict[str, Any], RecordError]]:
+    """Yield one dict per row; CSV headers may be field names or the export's column titles.
+    An NDJSON line that is not a JSON object yields a RecordError, so the import goes on."""
+    if fmt == "csv":
+        for row in csv.DictReader(stream):
+            yield {_normalize_key(k): v for k, v in row.items() if k}
+    elif fmt == "ndjson":
+        for line in stream:
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield RecordError(f"Invalid JSON: {e.msg}")
+                continue
+            if not isinstance(record, dict):
+                yield RecordError("Expected a JSON object")
+                continue
+            yield {_normalize_key(k): v for k, v in record.items()}
+    else:
+        raise ValueError(f"Unsupported import format: {fmt}")
+
+
+def validate_record(record: Dict[str, Any]) -> Tuple[Optional[Dict[str, Any]], List[str]]:
+    """Apply the conversation flow's field rules; returns (clean data, errors)"""
+    data, errors = {}, []
+    for field in FIELD_RULES:
+        value = record.get(field)
+        if value is None or str(value).strip() == "":
+            if field in REQUIRED_FIELDS:
+                errors.append(f"{field} is required")
+            continue
+        is_valid, result = validate_value(field, str(value))
+        if not is_valid:
+            errors.append(f"{field}: {result}")
+        elif result is not None or field not in OPTIONAL_FIELDS:
+            data[field] = result
+    family = str(record.get("family") or "").strip()
+    if family:
+        data["family"] = family
+    if data.get("family_role") not in (None, "Head") and not data.get("family_head") and not family:
+        errors.append("family_head or family is required for members other than the head")
+    return (None, errors) if errors else (data, [])
+
+
+class BulkImporter:
+    """Imports member records into the database in batches"""
+
+    def __init__(self, session, batch_size: int = IMPORT_BATCH_SIZE, max_errors: int = MAX_REPORTED_ERRORS):
+        self.session = session
+        self.batch_size = batch_size
+        self.report = ImportReport(max_errors)
+        self._samaj_ids: Dict[str, int] = {}
+        self._families: Dict[Tuple[int, str], int] = {}
+        self._heads: Dict[Tuple[int, str], int] = {}
+
+    def run(self, records: Iterable[Union[Dict[str, Any], RecordError]]) -> ImportReport:
+        numbered = enumerate(records, 1)
+        while True:
+            batch = list(islice(numbered, self.batch_size))
+            if not batch:
+                break
+            try:
+                imported, errors = self._import_batch(batch)
+                self.session.commit()
+            except Exception as e:
+                self.session.rollback()
+                # Ids cached during the batch may belong to rolled back rows
+                self._samaj_ids.clear()
+                self._families.clear()
+                self._heads.clear()
+                logger.error(f"Import batch starting at row {batch[0][0]} failed: {str(e)}")
+                imported, errors = 0, [(row_number, f"Batch failed: {str(e)}") for row_number, _ in batch]
+            self.report.imported += imported
+            for row_number, message in errors:
+                self.report.error(row_number, message)
+            self.report.total += len(batch)
+            self.report.elapsed = time.perf_counter() - self.report.started
+        logger.info(
+            f"Imported {self.report.imported}/{self.report.total} members "
+            f"({self.report.rows_per_sec:.0f} rows/sec, {self.report.failed} failed)"
+        )
+        return self.report
+
+    def _import_batch(self, batch: List[Tuple[int, Dict[str, Any]]]) -> Tuple[int, List[Tuple[int, str]]]:
+        """Insert the valid rows of a batch; returns (rows inserted, [(row number, error)])"""
+        rows, errors = [], []
+        for row_number, record in batch:
+            if isinstance(record, RecordError):
+                errors.append((row_number, record.message))
+                continue
+            data, row_errors = validate_record(record)
+            if row_errors:
+                errors.append((row_number, "; ".join(row_errors)))
+            else:
+                rows.append((row_number, data))
+        if not rows:
+            return 0, errors
+
+        self._resolve_samaj({data["samaj"] for _, data in rows})
+        family_ids = self._resolve_families(rows)
+        preload_family_role_summaries(self.session, set(family_ids.values()))
+
+        members = []
+        new_heads = set()
+        for row_number, data in rows:
+            family_id = family_ids.get(row_number)
+            if family_id is None:
+                errors.append((row_number, f"Family head not found: {data.get('family_head')}"))
+                continue
+            member = Member(
+                samaj_id=self._samaj_ids[data["samaj"]],
+                family_id=family_id,
+                is_family_head=data["family_role"] == "Head",
+                **{field: data.get(field) for field in MEMBER_FIELDS}
+            )
+            if member.age is not None:
+                member.age = int(member.age)
+            try:
+                member.validate_family_role(self.session)
+            except ValueError as e:
+                errors.append((row_number, str(e)))
+                continue
+            # Later rows in the batch are validated against this one
+            family_role_summary(self.session, family_id).add(member, key=("row", row_number))
+            members.append({column: getattr(member, column) for column in MEMBER_COLUMNS})
+            if member.is_family_head:
+                new_heads.add(family_id)
+
+        if members:
+            inserted = self.session.execute(insert(Member.__table__).returning(*TAG_RETURNING), members)
+            tagged = {row.id: row._mapping for row in inserted}
+            record_member_stats(self.session.connection(), members)
+            write_member_tags(self.session.connection(), tagged)
+        if new_heads:
+            head_id = select(Member.id).where(
+                Member.family_id == Family.id, Member.is_family_head == True
+            ).limit(1).scalar_subquery()
+            self.session.execute(
+                update(Family.__table__).where(Family.id.in_(new_heads)).values(head_of_family_id=head_id)
+            )
+        return len(members), errors
+
+    def _resolve_samaj(self, names) -> None:
+        missing = [name for name in names if name not in self._samaj_ids]
+        if not missing:
+            return
+        self._samaj_ids.update(self.session.execute(
+            select(Samaj.name, Samaj.id).where(Samaj.name.in_(missing))
+        ).all())
+        new = [name for name in missing if name not in self._samaj_ids]
+        if new:
+            self.session.execute(insert(Samaj), [{"name": name} for name in new])
+            self._samaj_ids.update(self.session.execute(
+                select(Samaj.name, Samaj.id).where(Samaj.name.in_(new))
+            ).all())
+
+    def _resolve_families(self, rows) -> Dict[int, int]:
+        """Family id for each row number: heads get (or create) their family, others
+        are matched by family name or by their head's name, as registration matches it"""
+        by_name, by_head, heads = {}, {}, {}
+        for row_number, data in rows:
+            samaj_id = self._samaj_ids[data["samaj"]]
+            if data["family_role"] == "Head":
+                key = (samaj_id, data.get("family") or f"{data['name']}'s Family")
+                by_name[row_number] = heads[(samaj_id, normalize_name(data["name"]))] = key
+            elif data.get("family"):
+                by_name[row_number] = (samaj_id, data["family"])
+            else:
+                by_head[row_number] = (samaj_id, normalize_name(data["family_head"]))
+
+        self._load_families({key for key in by_name.values() if key not in self._families})
+        new_families = list(dict.fromkeys(key for key in heads.values() if key not in self._families))
+        if new_families:
+            self.session.execute(
+                insert(Family), [{"samaj_id": samaj_id, "name": name} for samaj_id, name in new_families]
+            )
+            self._load_families(new_families)
+
+        # Members may name a head from this batch
+        for head, key in heads.items():
+            self._heads.setdefault(head, self._families[key])
+        self._load_heads({key for key in by_head.values() if key not in self._heads})
+
+        family_ids = {row_number: self._families.get(key) for row_number, key in by_name.items()}
+        family_ids.update({row_number: self._heads.get(key) for row_number, key in by_head.items()})
+        return family_ids
+
+    def _load_families(self, keys) -> None:
+        if not keys:
+            return
+        rows = self.session.execute(
+            select(Family.samaj_id, Family.name, Family.id).where(
+                Family.samaj_id.in_({samaj_id for samaj_id, _ in keys}),
+                Family.name.in_({name for _, name in keys})
+            ).order_by(Family.id)
+        )
+        for samaj_id, name, family_id in rows:
+            self._families.setdefault((samaj_id, name), family_id)
+
+    def _load_heads(self, keys) -> None:
+        """Families of heads keyed by (samaj id, normalized name), through the samaj_id and
+        lower(name) index; the oldest family wins, as in FamilyDirectory.family_id"""
+        if not keys:
+            return
+        lower_name = func.lower(Member.name)
+        rows = self.session.execute(
+            select(Member.samaj_id, lower_name, Member.family_id).where(
+                Member.is_family_head == True,
+                Member.samaj_id.in_({samaj_id for samaj_id, _ in keys}),
+                lower_name.in_({name for _, name in keys})
+            ).order_by(Member.family_id)
+        )
+        for samaj_id, name, family_id in rows:
+            self._heads.setdefault((samaj_id, name), family_id)
+
+
+def import_members(session, stream: IO[str], fmt: str, batch_size: int = IMPORT_BATCH_SIZE) -> ImportReport:
+    return BulkImporter(session, batch_size).run(read_records(stream, fmt))
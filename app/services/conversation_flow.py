@@ -0,0 +1,266 @@
+# Author: SANJAY KR
+"""Declarative conversation flows for the WhatsApp bot.
+
+Everything here is built once at import time. A flow is an ordered tuple of steps;
+the session's ``step`` is an index into it, so dispatching a message is a tuple
+lookup plus one validator call.
+"""
+from datetime import datetime
+from typing import Any, Callable, Dict, NamedTuple, Optional, Tuple
+
+FAMILY_ROLES = ("Head", "Spouse", "Child", "Parent", "Sibling", "Other")
+BLOOD_GROUPS = ("A+", "A-", "B+", "B-", "AB+", "AB-", "O+", "O-")
+OPTIONAL_FIELDS = frozenset([
+    "mobile_2", "anniversary_date", "medical_conditions", "social_media_handles", "volunteer_interests"
+])
+
+# Control steps live above every flow's data-collection steps
+CONFIRM_STEP = 100
+CORRECTION_SELECT_STEP = 101
+CORRECTION_INPUT_STEP = 102
+
+
+class FieldRule(NamedTuple):
+    validate: Callable[[str], bool]
+    error: str
+    normalize: Optional[Callable[[str], str]] = None
+
+
+def _not_blank(x: str) -> bool:
+    return bool(x.strip())
+
+
+def _ten_digits(x: str) -> bool:
+    return x.isdigit() and len(x) == 10
+
+
+def _date(x: str) -> bool:
+    return len(x.split("/")) == 3
+
+
+def _single_spaced(x: str) -> str:
+    return " ".join(x.split())
+
+
+FIELD_RULES: Dict[str, FieldRule] = {
+    "samaj": FieldRule(lambda x: len(x) >= 2, "Please enter a valid Samaj name (at least 2 characters)"),
+    # Names are stored single-spaced so heads can be looked up by lower(name)
+    "name": FieldRule(lambda x: len(x) >= 2, "Please enter your full name (at least 2 characters)", _single_spaced),
+    "family_role": FieldRule(
+        lambda x: x.title() in FAMILY_ROLES,
+        "Please enter a valid role (Head/Spouse/Child/Parent/Sibling/Other)",
+        str.title
+    ),
+    "family_head": FieldRule(_not_blank, "Please enter the family head's name", _single_spaced),
+    "gender": FieldRule(lambda x: x.lower() in ("male", "female", "other"), "Please enter Male, Female, or Other"),
+    "age": FieldRule(lambda x: x.isdigit() and 0 <= int(x) <= 120, "Please enter a valid age between 0 and 120"),
+    "blood_group": FieldRule(
+        lambda x: x.replace(" ", "").upper() in BLOOD_GROUPS,
+        "Please enter a valid blood group (A+, A-, B+, B-, AB+, AB-, O+, O-)",
+        lambda x: x.replace(" ", "").upper()
+    ),
+    "mobile_1": FieldRule(_ten_digits, "Please enter a valid 10-digit mobile number"),
+    "mobile_2": FieldRule(_ten_digits, "Please enter a valid 10-digit mobile number or type 'skip'"),
+    "email": FieldRule(lambda x: "@" in x and "." in x.split("@")[1], "Please enter a valid email address"),
+    "birth_date": FieldRule(_date, "Please enter date in DD/MM/YYYY format"),
+    "anniversary_date": FieldRule(_date, "Please enter date in DD/MM/YYYY format or type 'skip'"),
+    "emergency_contact": FieldRule(_ten_digits, "Please enter a valid 10-digit contact number"),
+    "marital_status": FieldRule(
+        lambda x: x.title() in ("Single", "Married", "Divorced", "Widowed"),
+        "Please enter a valid status (Single, Married, Divorced, Widowed)"
+    ),
+    "relationship_status": FieldRule(
+        lambda x: x.title() in ("Single", "Married", "Divorced", "Widowed", "Other"),
+        "Please enter a valid status (Single, Married, Divorced, Widowed, Other)"
+    ),
+}
+for _field in ("education", "occupation", "address", "native_place", "current_city", "languages_known",
+               "skills", "hobbies", "medical_conditions", "dietary_preferences", "social_media_handles",
+               "profession_category", "volunteer_interests"):
+    FIELD_RULES[_field] = FieldRule(_not_blank, f"Please enter your {_field.replace('_', ' ')}")
+
+
+def validate_value(field: str, value: str) -> Tuple[bool, Optional[str]]:
+    """Validate and normalize one answer. Returns (is_valid, value or error message);
+    a skipped optional field validates to None."""
+    value = value.strip()
+    if field in OPTIONAL_FIELDS and value.lower() == "skip":
+        return True, None
+    rule = FIELD_RULES.get(field)
+    if rule is None:
+        return True, value
+    if not rule.validate(value):
+        return False, rule.error
+    return True, rule.normalize(value) if rule.normalize else value
+
+
+def new_family_context(data: Dict[str, Any], role: Optional[str] = None) -> Dict[str, Any]:
+    now = datetime.utcnow().isoformat()
+    is_head = role == "Head"
+    name = data.get("name", "")
+    context = {
+        "is_new_family": is_head,
+        "role_confirmed": role is not None,
+        "samaj_name": data.get("samaj"),
+        "samaj_id": None,
+        "family_id": None,
+        "family_head": name if is_head else None,
+        "family_head_id": None,
+        "family_members": [{"name": name, "role": "Head", "is_head": True}] if is_head else [],
+        "family_roles": {"Head": [name]} if is_head else {},
+        "validation_errors": [],
+        "creation_time": now,
+        "last_updated": now
+    }
+    if is_head:
+        context["family_name"] = f"{name}'s Family"
+    elif role is not None:
+        context["member_role"] = role
+    return context
+
+
+def apply_family_role(session: Dict[str, Any], role: str) -> None:
+    data = session["data"]
+    if role == "Head":
+        data["family_head"] = data.get("name", "")
+    elif data.get("is_family_head"):
+        # Corrected away from Head: the head's name has to be asked for
+        data.pop("family_head", None)
+    data["is_family_head"] = role == "Head"
+    session["family_context"] = new_family_context(data, role)
+
+
+def _not_head(data: Dict[str, Any]) -> bool:
+    return data.get("family_role") != "Head"
+
+
+class Step(NamedTuple):
+    field: str
+    prompt: str
+    when: Optional[Callable[[Dict[str, Any]], bool]] = None
+    on_set: Optional[Callable[[Dict[str, Any], Any], None]] = None
+
+
+class Flow:
+    """An ordered set of steps plus the WhatsAppService method that stores the result"""
+
+    def __init__(self, name: str, steps: Tuple[Step, ...], complete: str, welcome: str):
+        assert len(steps) < CONFIRM_STEP, "Flow steps would collide with the confirmation steps"
+        self.name = name
+        self.steps = steps
+        self.complete = complete
+        self.welcome = welcome
+        self.fields = tuple(step.field for step in steps)
+
+    def applies(self, index: int, data: Dict[str, Any]) -> bool:
+        when = self.steps[index].when
+        return when is None or when(data)
+
+    def next_step(self, index: int, data: Dict[str, Any]) -> Optional[int]:
+        """First applicable step after index, or None when data collection is done"""
+        index += 1
+        while index < len(self.steps):
+            if self.applies(index, data):
+                return index
+            index += 1
+        return None
+
+    def first_missing_step(self, data: Dict[str, Any]) -> Optional[int]:
+        for index, step in enumerate(self.steps):
+            if step.field not in data and self.applies(index, data):
+                return index
+        return None
+
+    def answered_fields(self, data: Dict[str, Any]) -> Tuple[str, ...]:
+        return tuple(
+            step.field for index, step in enumerate(self.steps)
+            if step.field in data and self.applies(index, data)
+        )
+
+
+REGISTRATION_FLOW = Flow(
+    "registration",
+    (
+        Step("samaj", "Please enter your Samaj name:"),
+        Step("name", "Please enter your full name:"),
+        Step("family_role", "Please enter your family role (Head/Spouse/Child/Parent/Sibling/Other):",
+             on_set=apply_family_role),
+        Step("family_head", "Please enter the full name of your family head:", when=_not_head),
+        Step("gender", "Please enter your gender (Male/Female/Other):"),
+        Step("age", "Please enter your age:"),
+        Step("blood_group", "Please enter your blood group (A+/A-/B+/B-/AB+/AB-/O+/O-):"),
+        Step("mobile_1", "Please enter your primary mobile number (10 digits):"),
+        Step("mobile_2", "Please enter your secondary mobile number (10 digits or type 'skip'):"),
+        Step("education", "Please enter your education:"),
+        Step("occupation", "Please enter your occupation:"),
+        Step("marital_status", "Please enter your marital status (Single/Married/Divorced/Widowed):"),
+        Step("address", "Please enter your address:"),
+        Step("email", "Please enter your email:"),
+        Step("birth_date", "Please enter your birth date (DD/MM/YYYY):"),
+        Step("anniversary_date", "Please enter your anniversary date (DD/MM/YYYY or type 'skip'):"),
+        Step("native_place", "Please enter your native place:"),
+        Step("current_city", "Please enter your current city:"),
+        Step("languages_known", "Please enter languages known (comma-separated):"),
+        Step("skills", "Please enter your skills (comma-separated):"),
+        Step("hobbies", "Please enter your hobbies (comma-separated):"),
+        Step("emergency_contact", "Please enter emergency contact number (10 digits):"),
+        Step("relationship_status", "Please enter your relationship status (Single/Married/Divorced/Widowed/Other):"),
+        Step("medical_conditions", "Please enter any medical conditions (or type 'skip'):"),
+        Step("dietary_preferences", "Please enter your dietary preferences:"),
+        Step("social_media_handles", "Please enter your social media handles (or type 'skip'):"),
+        Step("profession_category", "Please enter your profession category:"),
+        Step("volunteer_interests", "Please enter your volunteer interests (or type 'skip'):"),
+    ),
+    complete="save_member_data",
+    welcome="Welcome to Family & Samaj Data Collection Bot!"
+)
+
+UPDATE_PHONE_FLOW = Flow(
+    "update_phone",
+    (
+        Step("samaj", "Please enter your Samaj name:"),
+        Step("name", "Please enter your full name as registered:"),
+        Step("mobile_1", "Please enter your new primary mobile number (10 digits):"),
+    ),
+    complete="update_member_phone",
+    welcome="Let's update your registered mobile number."
+)
+
+FLOWS: Dict[str, Flow] = {flow.name: flow for flow in (REGISTRATION_FLOW, UPDATE_PHONE_FLOW)}
+
+# Messages that start (or restart) a flow
+FLOW_TRIGGERS: Dict[str, Flow] = {
+    "start": REGISTRATION_FLOW,
+    "update phone": UPDATE_PHONE_FLOW,
+}
+
+_SUMMARY_FIELDS = frozenset(["samaj", "name", "family_role", "family_head"])
+
+
+def build_confirmation(flow: Flow, session: Dict[str, Any],
+                       header: str = "Please review your information:") -> str:
+    data = session.get("data", {})
+    lines = [header, ""]
+    if "samaj" in data:
+        lines.append(f"Samaj: {data['samaj']}")
+    if "name" in data:
+        lines.append(f"Name: {data['name']}")
+    if "family_role" in data:
+        lines.append(f"Role: {data['family_role']}")
+        if data["family_role"] == "Head":
+            lines.append(f"Family Name: {session.get('family_context', {}).get('family_name', '')}")
+        else:
+            lines.append(f"Family Head: {data.get('family_head', '')}")
+
+    details = [
+        f"{field.replace('_', ' ').title()}: {data[field]}"
+        for field in flow.answered_fields(data)
+        if field not in _SUMMARY_FIELDS and data[field] is not None
+    ]
+    if details:
+        lines.append("")
+        lines.append("Your Details:")
+        lines.extend(details)
+    lines.append("")
+    lines.append("Is this information correct? (Yes/No)")
+    return "\n".join(lines)
@@ -0,0 +1,84 @@
+# Author: SANJAY KR
+"""Blood donor search over the member registry.
+
+Red cell compatibility is worked out once at import time into DONOR_RANKS: for each
+recipient group, the groups that can donate to it, ranked. The recipient's own group
+comes first; after it, donors whose blood suits the fewest recipients come first, so
+O- (which every recipient can take) is asked last. A search is then one query on the
+(blood_group, lower(current_city), age) index, ordered by rank, age and id and paged
+with a keyset cursor.
+"""
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import case, func, select, tuple_
+from sqlalchemy.orm import Session
+
+from .conversation_flow import BLOOD_GROUPS
+from ..models.family import Member, Samaj
+
+DONOR_AGE_MIN = 18
+DONOR_AGE_MAX = 65
+DONOR_PAGE_SIZE = 50
+MAX_DONOR_PAGE_SIZE = 500
+
+
+def can_donate(donor: str, recipient: str) -> bool:
+    """ABO and RhD red cell compatibility"""
+    donor_abo, donor_rh = donor[:-1], donor[-1]
+    recipient_abo, recipient_rh = recipient[:-1], recipient[-1]
+    return set(donor_abo.replace("O", "")) <= set(recipient_abo) and (donor_rh == "-" or recipient_rh == "+")
+
+
+def _donor_ranks() -> Dict[str, Dict[str, int]]:
+    recipients_served = {donor: sum(can_donate(donor, r) for r in BLOOD_GROUPS) for donor in BLOOD_GROUPS}
+    ranks = {}
+    for recipient in BLOOD_GROUPS:
+        donors = sorted(
+            (donor for donor in BLOOD_GROUPS if can_donate(donor, recipient)),
+            key=lambda donor: (donor != recipient, recipients_served[donor], BLOOD_GROUPS.index(donor))
+        )
+        ranks[recipient] = {donor: rank for rank, donor in enumerate(donors)}
+    return ranks
+
+
+# Recipient group -> {compatible donor group: rank, 0 = best match}
+DONOR_RANKS = _donor_ranks()
+
+
+def encode_cursor(rank: int, age: int, member_id: int) -> str:
+    return f"{rank}.{age}.{member_id}"
+
+
+def decode_cursor(cursor: str) -> Tuple[int, int, int]:
+    rank, age, member_id = (int(part) for part in cursor.split("."))
+    return rank, age, member_id
+
+
+def search_donors(session: Session, blood_group: str, city: str, age_min: int = DONOR_AGE_MIN,
+                  age_max: int = DONOR_AGE_MAX, limit: int = DONOR_PAGE_SIZE,
+                  after: Optional[str] = None) -> Tuple[List[Dict], Optional[str]]:
+    """Members in the city who can donate to the recipient's blood group, best match first.
+    Returns one page of donors and the cursor for the next page (None on the last page)."""
+    ranks = DONOR_RANKS.get(blood_group.replace(" ", "").upper())
+    if ranks is None:
+        raise ValueError(f"Unknown blood group: {blood_group}")
+    limit = max(1, min(limit, MAX_DONOR_PAGE_SIZE))
+    rank = case(ranks, value=Member.blood_group)
+    query = select(
+        Member.id, Member.name, Member.blood_group, Member.age,
+        Member.current_city.label("city"), Member.mobile_1.label("mobile"),
+        Samaj.name.label("samaj"), rank.label("rank")
+    ).join(Samaj, Member.samaj_id == Samaj.id).where(
+        Member.blood_group.in_(list(ranks)),
+        func.lower(Member.current_city) == " ".join(city.split()).lower(),
+        Member.age.between(age_min, age_max)
+    )
+    if after is not None:
+        query = query.where(tuple_(rank, Member.age, Member.id) > tuple_(*decode_cursor(after)))
+    rows = session.execute(query.order_by(rank, Member.age, Member.id).limit(limit + 1)).all()
+
+    next_after = None
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        next_after = encode_cursor(last.rank, last.age, last.id)
+    return [row._asdict() for row in rows[:limit]], next_after
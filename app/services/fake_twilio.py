@@ -0,0 +1,66 @@
+# Author: SANJAY KR
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+from typing import Callable, Optional
+
+from twilio.base.exceptions import TwilioRestException
+
+
+class FakeMessage:
+    def __init__(self, sid: str, from_: str, to: str, body: str):
+        self.sid = sid
+        self.from_ = from_
+        self.to = to
+        self.body = body
+        self.status = "queued"
+
+
+class FakeMessages:
+    def __init__(self, client: "FakeTwilioClient"):
+        self._client = client
+
+    def create(self, from_=None, body=None, to=None):
+        if self._client.latency_seconds:
+            time.sleep(self._client.latency_seconds)
+        return self._client._create(from_, to, body)
+
+    async def create_async(self, from_=None, body=None, to=None):
+        if self._client.latency_seconds:
+            await asyncio.sleep(self._client.latency_seconds)
+        return self._client._create(from_, to, body)
+
+
+class FakeTwilioClient:
+    """Local stand-in for twilio.rest.Client used in development and load tests.
+
+    Records sent messages instead of calling Twilio and can simulate API latency
+    and throttling (HTTP 429) to exercise the outbound queue.
+    """
+
+    def __init__(self, latency_seconds: float = 0.0, failure_rate: float = 0.0,
+                 log: Optional[Callable[[str], None]] = None, seed: Optional[int] = None,
+                 keep_last: int = 10000):
+        self.latency_seconds = latency_seconds
+        self.failure_rate = failure_rate
+        self.log = log
+        self.messages = FakeMessages(self)
+        self.sent = deque(maxlen=keep_last)
+        self.sent_count = 0
+        self.failed_count = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _create(self, from_, to, body) -> FakeMessage:
+        with self._lock:
+            if self.failure_rate and self._random.random() < self.failure_rate:
+                self.failed_count += 1
+                raise TwilioRestException(429, "/Messages.json", "Too Many Requests", code=20429, method="POST")
+            self.sent_count += 1
+            message = FakeMessage(f"SMfake{self.sent_count:032d}", from_, to, body)
+            self.sent.append(message)
+        if self.log:
+            self.log(f"[DEV] Sending message to {to}: {body}")
+        return message
@@ -0,0 +1,166 @@
+# Author: SANJAY KR
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional
+
+from sqlalchemy import event, func, inspect, or_, select, update
+
+from ..models.family import Samaj, Family, Member
+
+
+NAME_BATCH_SIZE = 1000
+
+
+def normalize_name(name: str) -> str:
+    """Head names match regardless of case and repeated spaces"""
+    return " ".join(name.split()).lower()
+
+
+def normalize_member_names(session, batch_size: int = NAME_BATCH_SIZE) -> int:
+    """Collapse repeated spaces in member names saved before registration and import did so,
+    since heads are looked up by lower(name); batch_size members per transaction. Returns the
+    number of names changed."""
+    after, changed = 0, 0
+    while True:
+        rows = session.execute(
+            select(Member.id, Member.name).
+            where(Member.id > after, or_(Member.name.contains("  "), Member.name != func.trim(Member.name))).
+            order_by(Member.id).limit(batch_size)
+        ).all()
+        if not rows:
+            return changed
+        names = []
+        for member_id, name in rows:
+            normalized = " ".join(name.split())
+            if normalized != name:
+                names.append({"id": member_id, "name": normalized})
+        if names:
+            session.execute(update(Member), names)
+            changed += len(names)
+        session.commit()
+        after = rows[-1][0]
+
+
+class FamilyDirectory:
+    """Per-process cache of Samaj name -> id and (samaj_id, head name) -> family_id.
+
+    Lookups that miss go to the database and only found ids are cached, so a Samaj or head
+    registered by another worker is seen on the next lookup and inserts need no invalidation.
+    Deletes and renames made through the ORM in this process drop the affected entries; other
+    workers' entries expire after ttl_seconds, and callers re-check a cached family against
+    its current head before using it.
+    """
+
+    def __init__(self, ttl_seconds: int = 300, max_entries: int = 50000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._mutex = threading.Lock()
+        _directories.add(self)
+
+    def samaj_id(self, session, name: str) -> Optional[int]:
+        key = ("samaj", name)
+        samaj_id = self._get(key)
+        if samaj_id is None:
+            samaj_id = session.scalar(select(Samaj.id).where(Samaj.name == name))
+            if samaj_id is not None:
+                self._put(key, samaj_id)
+        return samaj_id
+
+    def family_id(self, session, samaj_id: int, head_name: str) -> Optional[int]:
+        """Family whose head has this name in the Samaj (the oldest family if several do)"""
+        key = ("head", samaj_id, normalize_name(head_name))
+        family_id = self._get(key)
+        if family_id is None:
+            family_id = session.scalar(
+                select(Member.family_id).
+                where(Member.samaj_id == samaj_id, Member.is_family_head == True,
+                      func.lower(Member.name) == normalize_name(head_name)).
+                order_by(Member.family_id).limit(1)
+            )
+            if family_id is not None:
+                self._put(key, family_id)
+        return family_id
+
+    def remember_samaj(self, name: str, samaj_id: int) -> None:
+        self._put(("samaj", name), samaj_id)
+
+    def remember_head(self, samaj_id: int, head_name: str, family_id: int) -> None:
+        self._put(("head", samaj_id, normalize_name(head_name)), family_id)
+
+    def forget_head(self, samaj_id: int, head_name: str) -> None:
+        with self._mutex:
+            self._entries.pop(("head", samaj_id, normalize_name(head_name)), None)
+
+    def forget_heads(self, samaj_id: int) -> None:
+        """Drop every head cached under the Samaj"""
+        self._forget(lambda key, value: key[0] == "head" and key[1] == samaj_id)
+
+    def forget_samaj(self, samaj_id: int) -> None:
+        """Drop the Samaj and every head cached under it"""
+        self._forget(lambda key, value: (key[0] == "samaj" and value == samaj_id) or
+                     (key[0] == "head" and key[1] == samaj_id))
+
+    def clear(self) -> None:
+        with self._mutex:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
+
+    def _get(self, key: Hashable) -> Optional[int]:
+        with self._mutex:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] >= time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def _forget(self, stale) -> None:
+        with self._mutex:
+            for key in [key for key, (value, _) in self._entries.items() if stale(key, value)]:
+                del self._entries[key]
+
+    def _put(self, key: Hashable, value: int) -> None:
+        with self._mutex:
+            self._entries[key] = (value, time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+_directories: "weakref.WeakSet[FamilyDirectory]" = weakref.WeakSet()
+
+
+@event.listens_for(Samaj, "after_update")
+@event.listens_for(Samaj, "after_delete")
+def _samaj_changed(mapper, connection, target) -> None:
+    for directory in list(_directories):
+        directory.forget_samaj(target.id)
+
+
+@event.listens_for(Family, "after_delete")
+def _family_deleted(mapper, connection, target) -> None:
+    for directory in list(_directories):
+        directory.forget_heads(target.samaj_id)
+
+
+@event.listens_for(Member, "after_update")
+@event.listens_for(Member, "after_delete")
+def _member_changed(mapper, connection, target) -> None:
+    # Only heads are cached; a head renamed, demoted or moved drops its Samaj's heads
+    state = inspect(target)
+    if not (target.is_family_head or True in state.attrs.is_family_head.history.deleted):
+        return
+    samaj_ids = {target.samaj_id, *state.attrs.samaj_id.history.deleted}
+    for directory in list(_directories):
+        for samaj_id in samaj_ids:
+            directory.forget_heads(samaj_id)
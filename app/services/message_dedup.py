@@ -0,0 +1,151 @@
+# Author: SANJAY KR
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import select, delete, func, MetaData, Table, Column, String, Text, Boolean, DateTime
+
+from ..models.base import upsert
+from .session_store import SessionStore, SQLSessionStore, create_store_engine
+
+Reply = Tuple[str, bool]
+
+
+class ProcessedMessages:
+    """Replies already sent for inbound Twilio messages, keyed by MessageSid.
+
+    Twilio retries a webhook that times out with the same MessageSid; replaying the
+    stored reply keeps a retry from running the conversation step (or the save) twice.
+    Lookups and writes happen while the sender's session lock is held, so a retry that
+    arrives during a slow original waits for it and then finds its reply.
+    """
+
+    def __init__(self, ttl_seconds: int = 3600):
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, message_sid: str) -> Optional[Reply]:
+        reply = self._read(message_sid)
+        if reply is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return reply
+
+    def put(self, message_sid: str, response: str, success: bool) -> None:
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, int]:
+        """Replayed duplicates, first deliveries and stored replies"""
+        raise NotImplementedError
+
+    def _read(self, message_sid: str) -> Optional[Reply]:
+        raise NotImplementedError
+
+
+class InMemoryProcessedMessages(ProcessedMessages):
+    """Per-process LRU of recent replies, bounded by count and age"""
+
+    def __init__(self, ttl_seconds: int = 3600, max_entries: int = 10000):
+        super().__init__(ttl_seconds)
+        self.max_entries = max_entries
+        self._replies: "OrderedDict[str, Tuple[float, Reply]]" = OrderedDict()
+        self._mutex = threading.Lock()
+
+    def _read(self, message_sid: str) -> Optional[Reply]:
+        with self._mutex:
+            entry = self._replies.get(message_sid)
+            if entry is None or entry[0] < time.time():
+                return None
+            return entry[1]
+
+    def put(self, message_sid: str, response: str, success: bool) -> None:
+        now = time.time()
+        with self._mutex:
+            entry = self._replies.get(message_sid)
+            if entry is not None and entry[0] >= now:
+                # Keep the first reply, as the shared store does
+                return
+            self._replies[message_sid] = (now + self.ttl_seconds, (response, success))
+            self._replies.move_to_end(message_sid)
+            # Entries are in write order, so expired ones are at the front
+            while self._replies and (len(self._replies) > self.max_entries or
+                                     next(iter(self._replies.values()))[0] < now):
+                self._replies.popitem(last=False)
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._replies)}
+
+
+class SQLProcessedMessages(ProcessedMessages):
+    """Table-backed replies shared by every worker, for retries routed to another process"""
+
+    def __init__(self, engine, ttl_seconds: int = 3600, table_name: str = "whatsapp_message",
+                 sweep_every: int = 500, connection=None):
+        super().__init__(ttl_seconds)
+        self.engine = engine
+        # Sharing the session store's connection keeps the reply in the same transaction
+        # as the session write, and avoids waiting on SQLite's lock held by that transaction
+        self._connection = connection or engine.begin
+        self.sweep_every = sweep_every
+        self._writes = 0
+        self.table = Table(
+            table_name, MetaData(),
+            Column("message_sid", String(64), primary_key=True),
+            Column("response", Text, nullable=False),
+            Column("success", Boolean, nullable=False),
+            Column("expires_at", DateTime, nullable=False, index=True),
+        )
+
+    def create_table(self) -> None:
+        self.table.create(self.engine, checkfirst=True)
+
+    def _read(self, message_sid: str) -> Optional[Reply]:
+        with self._connection() as conn:
+            row = conn.execute(
+                select(self.table.c.response, self.table.c.success).
+                where(self.table.c.message_sid == message_sid,
+                      self.table.c.expires_at >= datetime.utcnow())
+            ).first()
+        return None if row is None else (row.response, row.success)
+
+    def put(self, message_sid: str, response: str, success: bool) -> None:
+        now = datetime.utcnow()
+        self._writes += 1
+        with self._connection() as conn:
+            upsert(conn, self.table, [{
+                "message_sid": message_sid, "response": response, "success": success,
+                "expires_at": now + timedelta(seconds=self.ttl_seconds)
+            }], ("message_sid",))
+            if self._writes % self.sweep_every == 0:
+                conn.execute(delete(self.table).where(self.table.c.expires_at < now))
+
+    def stats(self) -> Dict[str, int]:
+        with self.engine.connect() as conn:
+            entries = conn.execute(select(func.count()).select_from(self.table)).scalar()
+        return {"hits": self.hits, "misses": self.misses, "entries": entries}
+
+
+def create_processed_messages(app, session_store: Optional[SessionStore] = None) -> Optional[ProcessedMessages]:
+    """Build the MessageSid store selected by MESSAGE_DEDUP_STORE (memory, sqlite, postgres
+    or off); it follows SESSION_STORE by default so retries reaching another worker are caught"""
+    session_backend = app.config.get("SESSION_STORE", "memory").lower()
+    backend = (app.config.get("MESSAGE_DEDUP_STORE") or session_backend).lower()
+    ttl_seconds = int(app.config.get("MESSAGE_DEDUP_TTL_SECONDS", 3600))
+
+    if backend in ("off", "none"):
+        return None
+    if backend == "memory":
+        return InMemoryProcessedMessages(ttl_seconds, int(app.config.get("MESSAGE_DEDUP_MAX_ENTRIES", 10000)))
+
+    if backend == session_backend and isinstance(session_store, SQLSessionStore):
+        store = SQLProcessedMessages(session_store.engine, ttl_seconds, connection=session_store.connection)
+    else:
+        store = SQLProcessedMessages(create_store_engine(app, backend), ttl_seconds)
+    if not app.config.get("LAZY_STARTUP"):
+        # Lazy startup leaves the table to `flask preflight --create-tables`
+        store.create_table()
+    return store
@@ -0,0 +1,157 @@
+# Author: SANJAY KR
+import logging
+import queue
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from twilio.base.exceptions import TwilioRestException
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class OutboundQueueFull(Exception):
+    """No room was freed in time to queue a reply"""
+
+
+def is_retryable(error: Exception) -> bool:
+    """Twilio throttling and server errors are worth retrying; other 4xx are not"""
+    if isinstance(error, TwilioRestException):
+        return error.status == 429 or error.status >= 500
+    return False
+
+
+class Reservation:
+    """A place held in one worker's queue for a message that is not written yet.
+
+    The webhook reserves before the conversation step runs, so a full queue turns the
+    request away while the session is still unchanged instead of dropping the reply
+    after the step has been saved.
+    """
+
+    def __init__(self, slots: List[threading.BoundedSemaphore], worker: int):
+        self._slots = slots
+        self.worker = worker
+        self.used = False
+
+    def take(self) -> int:
+        """Hand the place to the message being queued; returns its worker"""
+        self.used = True
+        return self.worker
+
+    def release(self) -> None:
+        """Give the place back if no message took it"""
+        if not self.used:
+            self.used = True
+            self._slots[self.worker].release()
+
+
+def reserve_slot(slots: List[threading.BoundedSemaphore], to: str, timeout: Optional[float]) -> Reservation:
+    """Wait up to timeout for a place in the destination's worker queue"""
+    worker = hash(to) % len(slots)
+    if not slots[worker].acquire(timeout=timeout):
+        raise OutboundQueueFull(f"No room in the outbound queue for {to}")
+    return Reservation(slots, worker)
+
+
+class OutboundQueue:
+    """Bounded background sender for outbound WhatsApp messages.
+
+    Each destination is pinned to one worker (by hash), so messages to the same
+    phone are delivered in the order they were queued, retries included, while
+    different phones are sent in parallel.
+    """
+
+    def __init__(self, send: Callable[[str, str, str], object], workers: int = 4, max_pending: int = 1000,
+                 max_retries: int = 3, backoff_seconds: float = 0.5, enqueue_timeout: float = 0.1):
+        self.send = send
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.enqueue_timeout = enqueue_timeout
+        self.counters = {"sent": 0, "failed": 0, "retried": 0, "dropped": 0}
+        self._counter_lock = threading.Lock()
+        per_worker = max(1, max_pending // workers)
+        # The semaphores bound each queue, so a place can be held before its message exists
+        self._slots = [threading.BoundedSemaphore(per_worker) for _ in range(workers)]
+        self._queues: List[queue.Queue] = [queue.Queue() for _ in range(workers)]
+        self._threads = [
+            threading.Thread(target=self._run, args=(i,), name=f"outbound-sender-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def _count(self, key: str) -> None:
+        with self._counter_lock:
+            self.counters[key] += 1
+
+    def reserve(self, to: str, timeout: Optional[float] = None) -> Reservation:
+        """Hold a place for a message to the destination, raising OutboundQueueFull if
+        none frees up within timeout"""
+        return reserve_slot(self._slots, to, timeout)
+
+    def enqueue(self, to: str, from_: str, body: str, reservation: Optional[Reservation] = None) -> bool:
+        """Queue a message in its reserved place, or in a free one; returns False if the
+        destination's queue stays full"""
+        if reservation is None:
+            try:
+                reservation = self.reserve(to, self.enqueue_timeout)
+            except OutboundQueueFull:
+                self._count("dropped")
+                logger.error(f"Outbound queue full, dropping message to {to}")
+                return False
+        self._queues[reservation.take()].put((to, from_, body))
+        return True
+
+    def _run(self, worker: int) -> None:
+        q = self._queues[worker]
+        while True:
+            item = q.get()
+            try:
+                if item is _STOP:
+                    return
+                self._slots[worker].release()
+                self._deliver(*item)
+            finally:
+                q.task_done()
+
+    def _deliver(self, to: str, from_: str, body: str) -> None:
+        attempt = 0
+        while True:
+            try:
+                self.send(from_, to, body)
+                self._count("sent")
+                return
+            except Exception as e:
+                if attempt < self.max_retries and is_retryable(e):
+                    delay = self.backoff_seconds * (2 ** attempt)
+                    attempt += 1
+                    self._count("retried")
+                    logger.warning(f"Retrying message to {to} in {delay:.2f}s (attempt {attempt}): {str(e)}")
+                    time.sleep(delay)
+                    continue
+                self._count("failed")
+                logger.error(f"Failed to send WhatsApp message to {to}: {str(e)}")
+                return
+
+    def pending(self) -> int:
+        return sum(q.qsize() for q in self._queues)
+
+    def stats(self) -> Dict[str, int]:
+        with self._counter_lock:
+            stats = dict(self.counters)
+        stats["pending"] = self.pending()
+        return stats
+
+    def join(self) -> None:
+        """Block until every queued message has been delivered or given up on"""
+        for q in self._queues:
+            q.join()
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        for q in self._queues:
+            q.put(_STOP)
+        for thread in self._threads:
+            thread.join(timeout)
@@ -0,0 +1,155 @@
+# Author: SANJAY KR
+"""Per-sender Twilio send rate, shared by webhook replies and broadcasts.
+
+Twilio's throughput limit is per sending number, not per process, so every send from every
+worker draws from one bucket per `from_` number. SQLSendRate keeps the bucket in a table row
+(the generic cell rate algorithm: one theoretical arrival time per sender, advanced with a
+single UPDATE that row-locks it), so gunicorn workers and hosts sharing the database share
+the rate. InMemorySendRate keeps it in the process, for the single-process memory setup.
+"""
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+from sqlalchemy import Column, Float, MetaData, String, Table, case, literal, select, update
+
+from ..models.base import upsert
+from .session_store import SessionStore, SQLSessionStore, create_store_engine
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens per second, holding at most `burst`.
+    Callers that find it empty reserve the next token and sleep until it is due, so
+    waiting threads are served in arrival order and the rate holds across all of them."""
+
+    def __init__(self, rate: float, burst: Optional[float] = None,
+                 clock: Callable[[], float] = time.monotonic, sleep: Callable[[float], None] = time.sleep):
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1.0, rate)
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = self.burst
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Take one token; returns the seconds until it is due"""
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            return -self._tokens / self.rate if self._tokens < 0 else 0.0
+
+    def acquire(self) -> float:
+        """Take one token, waiting if necessary; returns the seconds waited"""
+        wait = self.reserve()
+        if wait:
+            self._sleep(wait)
+        return wait
+
+
+class SendRate:
+    """Rate of sends per sending number. reserve() books the next send and returns how
+    long to wait for it, so async callers can sleep without holding a thread."""
+
+    def __init__(self, rate: float, burst: Optional[float] = None, sleep: Callable[[float], None] = time.sleep):
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1.0, rate)
+        self._sleep = sleep
+
+    def reserve(self, sender: str) -> float:
+        raise NotImplementedError
+
+    def acquire(self, sender: str) -> float:
+        """Book a send from the number, waiting until it is due; returns the seconds waited"""
+        wait = self.reserve(sender)
+        if wait:
+            self._sleep(wait)
+        return wait
+
+    def create_table(self) -> None:
+        pass
+
+
+class InMemorySendRate(SendRate):
+    """One token bucket per sender in this process"""
+
+    def __init__(self, rate: float, burst: Optional[float] = None,
+                 clock: Callable[[], float] = time.monotonic, sleep: Callable[[float], None] = time.sleep):
+        super().__init__(rate, burst, sleep)
+        self._clock = clock
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def reserve(self, sender: str) -> float:
+        with self._lock:
+            bucket = self._buckets.get(sender)
+            if bucket is None:
+                bucket = self._buckets[sender] = TokenBucket(self.rate, self.burst, self._clock)
+        return bucket.reserve()
+
+
+class SQLSendRate(SendRate):
+    """Table-backed bucket per sender, shared by every worker using the database. The clock
+    is wall time, so hosts sharing the table need synchronized clocks."""
+
+    def __init__(self, engine, rate: float, burst: Optional[float] = None, table_name: str = "send_rate",
+                 clock: Callable[[], float] = time.time, sleep: Callable[[float], None] = time.sleep):
+        super().__init__(rate, burst, sleep)
+        self.engine = engine
+        self._clock = clock
+        self.table = Table(
+            table_name, MetaData(),
+            Column("sender", String(64), primary_key=True),
+            # Theoretical arrival time: when the bucket would be full again, in epoch seconds
+            Column("tat", Float, nullable=False),
+        )
+
+    def create_table(self) -> None:
+        self.table.create(self.engine, checkfirst=True)
+
+    def reserve(self, sender: str) -> float:
+        interval = 1.0 / self.rate
+        now = self._clock()
+        table = self.table
+        # The send is booked at max(tat, now); a full bucket lets burst sends through early
+        advance = update(table).where(table.c.sender == sender).values(
+            tat=case((table.c.tat > now, table.c.tat), else_=literal(now)) + interval
+        )
+        with self.engine.begin() as conn:
+            tat = self._advance(conn, advance, sender)
+            if tat is None:
+                upsert(conn, table, [{"sender": sender, "tat": now}], ("sender",))
+                tat = self._advance(conn, advance, sender)
+        return max(0.0, tat - interval - (self.burst - 1) * interval - now)
+
+    def _advance(self, conn, advance, sender: str) -> Optional[float]:
+        if conn.dialect.update_returning:
+            return conn.execute(advance.returning(self.table.c.tat)).scalar()
+        if conn.execute(advance).rowcount == 0:
+            return None
+        return conn.execute(select(self.table.c.tat).where(self.table.c.sender == sender)).scalar()
+
+
+def create_send_rate(app, session_store: Optional[SessionStore] = None) -> Optional[SendRate]:
+    """Build the send rate limiter selected by SEND_RATE_STORE (memory, sqlite or postgres);
+    it follows SESSION_STORE by default, so workers sharing sessions share the rate too.
+    A SEND_RATE_PER_SECOND of 0 turns limiting off."""
+    rate = float(app.config.get("SEND_RATE_PER_SECOND", 10))
+    if rate <= 0:
+        return None
+    burst = float(app.config.get("SEND_RATE_BURST") or max(1.0, rate))
+    session_backend = app.config.get("SESSION_STORE", "memory").lower()
+    backend = (app.config.get("SEND_RATE_STORE") or session_backend).lower()
+    if backend == "memory":
+        return InMemorySendRate(rate, burst)
+
+    if backend == session_backend and isinstance(session_store, SQLSessionStore):
+        limiter = SQLSendRate(session_store.engine, rate, burst)
+    else:
+        limiter = SQLSendRate(create_store_engine(app, backend), rate, burst)
+    if not app.config.get("LAZY_STARTUP"):
+        # Lazy startup leaves the table to `flask preflight --create-tables`
+        limiter.create_table()
+    return limiter
@@ -0,0 +1,385 @@
+# Author: SANJAY KR
+import json
+import logging
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional, Tuple
+
+from sqlalchemy import (
+    create_engine, select, delete, update, func, MetaData, Table, Column, String, LargeBinary, DateTime
+)
+
+from ..models.base import upsert
+
+logger = logging.getLogger(__name__)
+
+_DELETED = object()
+
+
+def serialize_session(session: Dict[str, Any]) -> bytes:
+    """Compact JSON + zlib encoding used for sessions stored outside the process"""
+    return zlib.compress(json.dumps(session, separators=(",", ":")).encode("utf-8"))
+
+
+def deserialize_session(payload: bytes) -> Dict[str, Any]:
+    return json.loads(zlib.decompress(payload).decode("utf-8"))
+
+
+def _signed_crc32(value: str) -> int:
+    """32-bit key for pg_advisory_xact_lock(int, int)"""
+    key = zlib.crc32(value.encode("utf-8"))
+    return key - (1 << 32) if key >= (1 << 31) else key
+
+
+class SessionStore:
+    """Base class for conversation session storage.
+
+    Sessions read inside ``lock(phone_number)`` are kept in a per-thread scope and
+    written back when the block exits, so callers can mutate the returned dict in
+    place exactly as they did with the old per-process ``current_sessions`` dict.
+
+    ``lock()`` applies one phone's messages one at a time: threads in this process
+    queue on one of lock_stripes locks chosen by the phone number, and stores shared
+    between processes add a database lock on top (see ``_acquire``). Phones on
+    different stripes never wait for each other in-process.
+    """
+
+    def __init__(self, ttl_seconds: int = 3600, lock_stripes: int = 1024):
+        self.ttl_seconds = ttl_seconds
+        self.evictions = {"expired": 0, "capacity": 0}
+        self._local = threading.local()
+        self._stripes = [threading.Lock() for _ in range(lock_stripes)]
+        self._sweeper: Optional[threading.Thread] = None
+        self._stop_sweeper = threading.Event()
+
+    def _scope(self) -> Optional[Dict[str, Any]]:
+        return getattr(self._local, "scope", None)
+
+    @contextmanager
+    def lock(self, phone_number: str):
+        if self._scope() is not None:
+            # Already inside a locked block on this thread
+            yield
+            return
+        with self._stripes[hash(phone_number) % len(self._stripes)], self._acquire(phone_number):
+            self._local.scope = {}
+            try:
+                yield
+                for key, session in self._local.scope.items():
+                    if session is _DELETED:
+                        self._delete(key)
+                    else:
+                        self._write(key, session)
+            finally:
+                self._local.scope = None
+
+    def get(self, phone_number: str) -> Optional[Dict[str, Any]]:
+        scope = self._scope()
+        if scope is not None and phone_number in scope:
+            session = scope[phone_number]
+            return None if session is _DELETED else session
+        session = self._read(phone_number)
+        if scope is not None and session is not None:
+            scope[phone_number] = session
+        return session
+
+    def save(self, phone_number: str, session: Dict[str, Any]) -> None:
+        scope = self._scope()
+        if scope is not None:
+            scope[phone_number] = session
+        else:
+            self._write(phone_number, session)
+
+    def delete(self, phone_number: str) -> None:
+        scope = self._scope()
+        if scope is not None:
+            scope[phone_number] = _DELETED
+        else:
+            self._delete(phone_number)
+
+    def __contains__(self, phone_number: str) -> bool:
+        return self.get(phone_number) is not None
+
+    def start_sweeper(self, interval_seconds: float) -> None:
+        """Evict idle sessions every interval_seconds from a daemon thread"""
+        if interval_seconds <= 0 or self._sweeper is not None:
+            return
+
+        def run():
+            while not self._stop_sweeper.wait(interval_seconds):
+                try:
+                    evicted = self.sweep()
+                    if evicted:
+                        logger.info(f"Evicted {evicted} idle conversation sessions")
+                except Exception as e:
+                    logger.error(f"Session sweep failed: {str(e)}")
+
+        self._stop_sweeper.clear()
+        self._sweeper = threading.Thread(target=run, name="session-sweeper", daemon=True)
+        self._sweeper.start()
+
+    def stop_sweeper(self) -> None:
+        if self._sweeper is not None:
+            self._stop_sweeper.set()
+            self._sweeper.join()
+            self._sweeper = None
+
+    def sweep(self) -> int:
+        """Evict every expired session and return how many were evicted"""
+        raise NotImplementedError
+
+    def pop_expired(self, phone_number: str) -> bool:
+        """Return True (once) if phone_number had a session that was evicted"""
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, int]:
+        """Live session count, eviction counters and an estimate of bytes held"""
+        raise NotImplementedError
+
+    @contextmanager
+    def _acquire(self, phone_number: str):
+        """Hold any cross-process lock for phone_number; the stripe lock is already held"""
+        yield
+
+    def _read(self, phone_number: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def _write(self, phone_number: str, session: Dict[str, Any]) -> None:
+        raise NotImplementedError
+
+    def _delete(self, phone_number: str) -> None:
+        raise NotImplementedError
+
+
+class InMemorySessionStore(SessionStore):
+    """Per-process store; only safe with a single worker or sticky routing.
+
+    Sessions are kept in least-recently-written order, so expired entries are always
+    at the front and the store is capped at max_sessions by evicting the oldest.
+    Evicted phones are remembered (up to max_sessions of them) so the user can be
+    told their session expired.
+    """
+
+    def __init__(self, ttl_seconds: int = 3600, max_sessions: int = 10000, lock_stripes: int = 1024):
+        super().__init__(ttl_seconds, lock_stripes)
+        self.max_sessions = max_sessions
+        self._sessions: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._evicted: "OrderedDict[str, float]" = OrderedDict()
+        self._mutex = threading.Lock()
+
+    def _evict(self, phone_number: str, reason: str) -> None:
+        # Caller holds self._mutex
+        self._sessions.pop(phone_number, None)
+        self._evicted[phone_number] = time.time()
+        self._evicted.move_to_end(phone_number)
+        while len(self._evicted) > self.max_sessions:
+            self._evicted.popitem(last=False)
+        self.evictions[reason] += 1
+
+    def _read(self, phone_number: str) -> Optional[Dict[str, Any]]:
+        with self._mutex:
+            entry = self._sessions.get(phone_number)
+            if entry is None:
+                return None
+            expires_at, session = entry
+            if expires_at < time.time():
+                self._evict(phone_number, "expired")
+                return None
+            return session
+
+    def _write(self, phone_number: str, session: Dict[str, Any]) -> None:
+        with self._mutex:
+            self._evicted.pop(phone_number, None)
+            self._sessions[phone_number] = (time.time() + self.ttl_seconds, session)
+            self._sessions.move_to_end(phone_number)
+            while len(self._sessions) > self.max_sessions:
+                oldest = next(iter(self._sessions))
+                self._evict(oldest, "capacity")
+
+    def _delete(self, phone_number: str) -> None:
+        with self._mutex:
+            self._sessions.pop(phone_number, None)
+
+    def sweep(self) -> int:
+        now = time.time()
+        evicted = 0
+        with self._mutex:
+            while self._sessions:
+                phone_number, (expires_at, _) = next(iter(self._sessions.items()))
+                if expires_at >= now:
+                    break
+                self._evict(phone_number, "expired")
+                evicted += 1
+        return evicted
+
+    def pop_expired(self, phone_number: str) -> bool:
+        with self._mutex:
+            return self._evicted.pop(phone_number, None) is not None
+
+    def stats(self) -> Dict[str, int]:
+        with self._mutex:
+            sessions = [session for _, session in self._sessions.values()]
+        return {
+            "live_sessions": len(sessions),
+            "evictions_expired": self.evictions["expired"],
+            "evictions_capacity": self.evictions["capacity"],
+            "bytes_estimate": sum(len(json.dumps(s, separators=(",", ":"))) for s in sessions),
+        }
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+
+class SQLSessionStore(SessionStore):
+    """Table-backed store shared by every worker and node pointing at the same database.
+
+    Works with SQLite and PostgreSQL. On PostgreSQL ``lock()`` takes a transaction-level
+    advisory lock on the phone number, which also covers a phone whose session row does
+    not exist yet, and different phones proceed in parallel. SQLite starts the
+    transaction with ``BEGIN IMMEDIATE``, which serializes all writers on the database.
+    Swept sessions keep an empty-payload row for tombstone_seconds so any worker can tell
+    the user their session expired.
+    """
+
+    def __init__(self, engine, ttl_seconds: int = 3600, table_name: str = "whatsapp_session",
+                 tombstone_seconds: int = 86400, lock_stripes: int = 1024):
+        super().__init__(ttl_seconds, lock_stripes)
+        self.engine = engine
+        self.tombstone_seconds = tombstone_seconds
+        self._lock_namespace = _signed_crc32(table_name)
+        self.table = Table(
+            table_name, MetaData(),
+            Column("phone_number", String(20), primary_key=True),
+            Column("payload", LargeBinary, nullable=False),
+            Column("expires_at", DateTime, nullable=False, index=True),
+        )
+
+    def create_table(self) -> None:
+        self.table.create(self.engine, checkfirst=True)
+
+    @contextmanager
+    def connection(self):
+        """The connection of the enclosing lock() on this thread, else a new transaction"""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            yield conn
+        else:
+            with self.engine.begin() as conn:
+                yield conn
+
+    @contextmanager
+    def _acquire(self, phone_number: str):
+        with self.engine.begin() as conn:
+            if conn.dialect.name == "postgresql":
+                # Released by PostgreSQL when the transaction ends
+                conn.execute(
+                    select(func.pg_advisory_xact_lock(self._lock_namespace, _signed_crc32(phone_number)))
+                )
+            elif conn.dialect.name == "sqlite":
+                # pysqlite defers BEGIN until the first write, so concurrent readers would
+                # otherwise see the same session and overwrite each other's step
+                conn.exec_driver_sql("BEGIN IMMEDIATE")
+            self._local.conn = conn
+            try:
+                yield
+            finally:
+                self._local.conn = None
+
+    def _read(self, phone_number: str) -> Optional[Dict[str, Any]]:
+        with self.connection() as conn:
+            row = conn.execute(
+                select(self.table.c.payload, self.table.c.expires_at).
+                where(self.table.c.phone_number == phone_number)
+            ).first()
+        if row is None or row.expires_at < datetime.utcnow():
+            return None
+        return deserialize_session(row.payload)
+
+    def _write(self, phone_number: str, session: Dict[str, Any]) -> None:
+        values = {
+            "phone_number": phone_number,
+            "payload": serialize_session(session),
+            "expires_at": datetime.utcnow() + timedelta(seconds=self.ttl_seconds),
+        }
+        with self.connection() as conn:
+            upsert(conn, self.table, [values], ("phone_number",),
+                   lambda excluded: {"payload": excluded.payload, "expires_at": excluded.expires_at})
+
+    def _delete(self, phone_number: str) -> None:
+        with self.connection() as conn:
+            conn.execute(delete(self.table).where(self.table.c.phone_number == phone_number))
+
+    def sweep(self) -> int:
+        now = datetime.utcnow()
+        with self.engine.begin() as conn:
+            evicted = conn.execute(
+                update(self.table).
+                where(self.table.c.expires_at < now, func.length(self.table.c.payload) > 0).
+                values(payload=b"")
+            ).rowcount
+            conn.execute(
+                delete(self.table).
+                where(self.table.c.expires_at < now - timedelta(seconds=self.tombstone_seconds))
+            )
+        self.evictions["expired"] += evicted
+        return evicted
+
+    def pop_expired(self, phone_number: str) -> bool:
+        with self.connection() as conn:
+            return conn.execute(
+                delete(self.table).
+                where(self.table.c.phone_number == phone_number,
+                      self.table.c.expires_at < datetime.utcnow())
+            ).rowcount > 0
+
+    def stats(self) -> Dict[str, int]:
+        with self.engine.connect() as conn:
+            live_sessions, bytes_estimate = conn.execute(
+                select(func.count(), func.coalesce(func.sum(func.length(self.table.c.payload)), 0)).
+                where(self.table.c.expires_at >= datetime.utcnow())
+            ).one()
+        return {
+            "live_sessions": live_sessions,
+            "evictions_expired": self.evictions["expired"],
+            "evictions_capacity": self.evictions["capacity"],
+            "bytes_estimate": bytes_estimate,
+        }
+
+
+def create_session_store(app) -> SessionStore:
+    """Build the session store selected by SESSION_STORE (memory, sqlite or postgres)"""
+    backend = app.config.get("SESSION_STORE", "memory").lower()
+    ttl_seconds = int(app.config.get("SESSION_TTL_SECONDS", 3600))
+
+    lock_stripes = int(app.config.get("SESSION_LOCK_STRIPES", 1024))
+
+    if backend == "memory":
+        return InMemorySessionStore(ttl_seconds, int(app.config.get("SESSION_MAX_SESSIONS", 10000)), lock_stripes)
+
+    store = SQLSessionStore(create_store_engine(app, backend), ttl_seconds, lock_stripes=lock_stripes)
+    if not app.config.get("LAZY_STARTUP"):
+        # Lazy startup leaves the table to `flask preflight --create-tables`
+        store.create_table()
+    return store
+
+
+def create_store_engine(app, backend: str):
+    """Engine for a sqlite or postgres backed store, configured by SESSION_STORE_URL"""
+    if backend == "sqlite":
+        url = app.config.get("SESSION_STORE_URL") or "sqlite:///whatsapp_sessions.db"
+        return create_engine(url)
+    if backend in ("postgres", "postgresql"):
+        from ..models.base import engine_options
+        url = app.config.get("SESSION_STORE_URL") or app.config["SQLALCHEMY_DATABASE_URI"]
+        # A pool of its own, even on the app's database: a webhook holds a store connection
+        # (with the phone's advisory lock) for the whole message while db.session checks out
+        # another, so sharing db.engine's pool would stall webhooks at half the pool
+        pool_config = dict(app.config,
+                           DB_POOL_SIZE=app.config.get("SESSION_STORE_POOL_SIZE", 5),
+                           DB_MAX_OVERFLOW=app.config.get("SESSION_STORE_MAX_OVERFLOW", 10))
+        return create_engine(url, **engine_options(pool_config, url))
+    raise ValueError(f"Unknown SESSION_STORE backend: {backend}")
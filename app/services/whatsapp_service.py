@@ -1,17 +1,42 @@
 # Author: SANJAY KR
-from twilio.rest import Client
 from twilio.base.exceptions import TwilioRestException
 from flask import current_app, has_app_context, Flask
 import os
+import asyncio
+from contextlib import contextmanager
 from dotenv import load_dotenv
 from typing import Dict, Any, Tuple, Optional
 from datetime import datetime
+from sqlalchemy import select
 from sqlalchemy.orm import Session
+from .session_store import SessionStore, InMemorySessionStore, SQLSessionStore, create_session_store
+from .message_dedup import (
+    ProcessedMessages, InMemoryProcessedMessages, SQLProcessedMessages, create_processed_messages
+)
+from .outbound_queue import OutboundQueue, Reservation
+from .send_rate import SendRate, SQLSendRate, create_send_rate
+from .family_directory import FamilyDirectory, normalize_name
+from .async_outbound import AsyncOutboundQueue
+from .broadcast import normalize_phone
+from ..utils.metrics import metrics
+from .fake_twilio import FakeTwilioClient
+from .conversation_flow import (
+    Flow, FLOWS, FLOW_TRIGGERS, REGISTRATION_FLOW, OPTIONAL_FIELDS,
+    CONFIRM_STEP, CORRECTION_SELECT_STEP, CORRECTION_INPUT_STEP,
+    validate_value, new_family_context, build_confirmation
+)
 
 load_dotenv()
 
 _instance = None
 
+def whatsapp_address(phone: str) -> str:
+    """The 'whatsapp:+<digits>' form send_message addresses a phone by"""
+    number = phone.strip().replace(" ", "").replace("whatsapp:", "")
+    if not number.startswith("+"):
+        number = "+" + number
+    return f"whatsapp:{number}"
+
 def get_whatsapp_service():
     if not has_app_context():
         raise RuntimeError("No Flask application context")
@@ -26,58 +51,54 @@ def get_whatsapp_service():
 
 class WhatsAppService:
     def __init__(self):
-        self.current_sessions: Dict[str, Dict[str, Any]] = {}
+        self.session_store: SessionStore = InMemorySessionStore()
+        self.processed_messages: Optional[ProcessedMessages] = InMemoryProcessedMessages()
+        self.outbound_queue: Optional[OutboundQueue] = None
+        self.send_rate: Optional[SendRate] = None
+        self.reserve_timeout = 2.0
+        self.family_directory: Optional[FamilyDirectory] = None
+        self._twilio_credentials: Optional[Tuple[str, str]] = None
         self.client = None
-        self._dev_session: Optional[Dict[str, Any]] = None
+        self.async_client = None
         self.db = None
         self.dev_mode = False
         self.phone_number: Optional[str] = None
         
-    def _create_session(self, phone_number: str, message: str) -> Dict[str, Any]:
-        if not phone_number or not message:
-            raise ValueError("Phone number and message are required")
-            
-        # Clean up phone number format
-        phone_number = phone_number.replace("whatsapp:", "").strip()
-        if not phone_number.startswith("+"):
-            phone_number = "+" + phone_number
+    @property
+    def client(self):
+        """Twilio REST client, built on first use so workers do not import twilio.rest at boot"""
+        if self._client is None and self._twilio_credentials is not None:
+            from twilio.rest import Client
+            self._client = Client(*self._twilio_credentials)
+        return self._client
+
+    @client.setter
+    def client(self, client) -> None:
+        self._client = client
+
+    def _create_session(self, phone_number: str, flow: Flow = REGISTRATION_FLOW) -> Dict[str, Any]:
+        if not phone_number:
+            raise ValueError("Phone number is required")
             
-        # Initialize session with proper typing
+        now = datetime.utcnow().isoformat()
         session: Dict[str, Any] = {
-            "step": 0 if message.lower() == "start" else -1,
+            "flow": flow.name,
+            "step": 0,
             "data": {},
             "phone_number": phone_number,
-            "created_at": datetime.utcnow().isoformat(),
-            "last_updated": datetime.utcnow().isoformat(),
-            "family_context": {
-                "family_members": [],
-                "family_roles": {},
-                "is_new_family": False,
-                "role_confirmed": False,
-                "samaj_name": None,
-                "samaj_id": None,
-                "family_id": None,
-                "family_head": None,
-                "family_head_id": None,
-                "validation_errors": [],
-                "creation_time": datetime.utcnow().isoformat(),
-                "last_updated": datetime.utcnow().isoformat()
-            }
+            "created_at": now,
+            "last_updated": now,
+            "family_context": new_family_context({})
         }
-        
-        # Store session based on mode
-        if self.dev_mode:
-            self._dev_session = session
-        else:
-            self.current_sessions[phone_number] = session
+        self.session_store.save(phone_number, session)
             
-        current_app.logger.info(f"Created new session for {phone_number} with step {session['step']}")
+        current_app.logger.info(f"Created new {flow.name} session for {phone_number}")
         return session
         
     def save_member_data(self, data: Dict[str, Any], phone_number: str, db: Session) -> Tuple[bool, str]:
         """Save member data with proper family organization"""
         try:
-            from ..models.family import Samaj, Family, Member
+            from ..models.family import Samaj, Family, Member, family_role_summary
             
             if not db:
                 current_app.logger.error("Database session not provided")
@@ -86,25 +107,23 @@ class WhatsAppService:
             session: Session = db
             
             # Get or create Samaj within transaction
-            samaj = session.query(Samaj).filter_by(name=data["samaj"]).first()
-            if not samaj:
-                samaj = Samaj(name=data["samaj"])
+            samaj_name = data["samaj"]
+            samaj_id = self._find_samaj(session, samaj_name)
+            new_samaj = samaj_id is None
+            if new_samaj:
+                samaj = Samaj(name=samaj_name)
                 session.add(samaj)
                 session.flush()
+                samaj_id = samaj.id
             
             family_role = data.get("family_role", "").title()
             
             # Handle family creation/lookup within transaction
-            if self.dev_mode:
-                if not self._dev_session:
-                    current_app.logger.error("Dev session not initialized")
-                    return False, "Session error. Please try again."
-                family_context = self._dev_session.get("family_context", {})
-            else:
-                if phone_number not in self.current_sessions:
-                    current_app.logger.error(f"No session found for {phone_number}")
-                    return False, "Session expired. Please start over."
-                family_context = self.current_sessions[phone_number].get("family_context", {})
+            current_session = self.session_store.get(phone_number)
+            if not current_session:
+                current_app.logger.error(f"No session found for {phone_number}")
+                return False, "Session expired. Please start over."
+            family_context = current_session.get("family_context", {})
             current_app.logger.info(f"Processing family context: {family_context}")
             
             if family_role == "Head":
@@ -114,12 +133,14 @@ class WhatsAppService:
                     
                 family = Family(
                     name=family_context.get("family_name", f"{data['name']}'s Family"),
-                    samaj_id=samaj.id
+                    samaj_id=samaj_id
                 )
                 session.add(family)
                 session.flush()
+                family_id = family.id
+                family_name = family.name
                 current_app.logger.info(
-                    f"Created new family: {family.name} in Samaj: {samaj.name}"
+                    f"Created new family: {family.name} in Samaj: {samaj_name}"
                 )
             else:
                 if family_context.get("is_new_family"):
@@ -128,41 +149,32 @@ class WhatsAppService:
                     
                 # Find family by head's name with validation
                 current_app.logger.info(
-                    f"Looking up family by head: {data['family_head']} in Samaj: {samaj.name}"
+                    f"Looking up family by head: {data['family_head']} in Samaj: {samaj_name}"
                 )
-                family = session.query(Family).join(Member).filter(
-                    Member.name == data['family_head'],
-                    Member.is_family_head == True,
-                    Family.samaj_id == samaj.id
-                ).first()
+                family_id = None if new_samaj else self._find_family(session, samaj_id, data['family_head'])
                 
-                if not family:
+                if family_id is None:
                     current_app.logger.error(
-                        f"Family head not found: {data['family_head']} in Samaj: {samaj.name}"
+                        f"Family head not found: {data['family_head']} in Samaj: {samaj_name}"
                     )
                     return False, "Error: Family head not found. Please try again."
                     
+                family_name = f"{data['family_head']}'s family"
                 current_app.logger.info(
-                    f"Found family: {family.name} with head: {data['family_head']}"
+                    f"Found family {family_id} with head: {data['family_head']}"
                 )
                     
                 # Validate family role constraints with comprehensive logging
                 current_app.logger.info(f"Validating family role constraints for {family_role}")
-                existing_roles = session.query(Member.family_role, Member.name).filter(
-                    Member.family_id == family.id
-                ).all()
-                
-                # Count roles and store names
-                role_counts = {}
+                # Loads the family once; the Member insert validators reuse it
+                roles = family_role_summary(session, family_id)
+                role_counts = roles.role_counts()
                 role_names = {}
-                for role, name in existing_roles:
-                    role_counts[role] = role_counts.get(role, 0) + 1
-                    if role not in role_names:
-                        role_names[role] = []
-                    role_names[role].append(name)
+                for existing in roles.members.values():
+                    role_names.setdefault(existing.family_role, []).append(existing.name)
                 
                 current_app.logger.info(
-                    f"Existing roles in family {family.name}: "
+                    f"Existing roles in family {family_name}: "
                     f"{', '.join([f'{role}({count})' for role, count in role_counts.items()])}"
                 )
                 
@@ -195,12 +207,6 @@ class WhatsAppService:
             
             # Create member record within transaction
             try:
-                # Get the appropriate session based on mode
-                if self.dev_mode:
-                    current_session = self._dev_session
-                else:
-                    current_session = self.current_sessions[phone_number]
-                
                 # Validate family context with comprehensive checks
                 if not current_session:
                     current_app.logger.error("Session not found")
@@ -214,8 +220,8 @@ class WhatsAppService:
                     raise ValueError("Family role not confirmed")
                 
                 # Update family context with current state
-                family_context["samaj_id"] = samaj.id
-                family_context["family_id"] = family.id
+                family_context["samaj_id"] = samaj_id
+                family_context["family_id"] = family_id
                 family_context["last_updated"] = datetime.utcnow().isoformat()
                 
                 if family_role == "Head":
@@ -239,16 +245,8 @@ class WhatsAppService:
                         "is_head": False
                     })
                 
-                if self.dev_mode:
-                    if self._dev_session is None:
-                        self._dev_session = {"family_context": family_context}
-                    else:
-                        self._dev_session["family_context"] = family_context
-                else:
-                    if phone_number not in self.current_sessions:
-                        self.current_sessions[phone_number] = {"family_context": family_context}
-                    else:
-                        self.current_sessions[phone_number]["family_context"] = family_context
+                current_session["family_context"] = family_context
+                self.session_store.save(phone_number, current_session)
                 current_app.logger.info(
                     f"Updated family context: roles={family_context['family_roles']}, "
                     f"members={len(family_context['family_members'])}"
@@ -257,8 +255,8 @@ class WhatsAppService:
                 # Log family relationship details
                 current_app.logger.info(
                     f"Creating member record with family relationships: "
-                    f"samaj={samaj.name}, "
-                    f"family={family.name}, "
+                    f"samaj={samaj_name}, "
+                    f"family={family_name}, "
                     f"role={family_role}, "
                     f"is_head={data.get('is_family_head', False)}"
                 )
@@ -266,8 +264,8 @@ class WhatsAppService:
                 # Create member with family context
                 member = Member(
                     name=data['name'],
-                    family_id=family.id,
-                    samaj_id=samaj.id,
+                    family_id=family_id,
+                    samaj_id=samaj_id,
                     family_role=family_role,
                     is_family_head=data.get('is_family_head', False),
                     gender=data.get('gender'),
@@ -297,9 +295,10 @@ class WhatsAppService:
                 )
             
                 # Validate and save member with family context
-                member.validate_family_role()
+                member.validate_family_role(session)
                 session.add(member)
-                session.flush()  # Get member ID before committing
+                with metrics.span("db_flush"):
+                    session.flush()  # Get member ID before committing
                 
                 if family_role == "Head":
                     family.head_of_family_id = member.id
@@ -312,19 +311,21 @@ class WhatsAppService:
                     "role": member.family_role,
                     "is_head": member.is_family_head
                 })
-                session["family_context"] = family_context
+                current_session["family_context"] = family_context
                 
-                session.commit()
+                with metrics.span("db_commit"):
+                    session.commit()
                 current_app.logger.info(
                     f"Successfully saved member {member.name} (ID: {member.id}) "
-                    f"in family {family.name} with role {member.family_role}"
+                    f"in family {family_name} with role {member.family_role}"
                 )
+                if self.family_directory is not None:
+                    self.family_directory.remember_samaj(samaj_name, samaj_id)
+                    if member.is_family_head:
+                        self.family_directory.remember_head(samaj_id, member.name, family_id)
                 
                 # Clear session after successful save
-                if self.dev_mode:
-                    self._dev_session = None
-                else:
-                    del self.current_sessions[phone_number]
+                self.session_store.delete(phone_number)
                 
                 role_messages = {
                     "Head": f"head of {data['name']}'s family in {data['samaj']} Samaj",
@@ -345,6 +346,41 @@ class WhatsAppService:
             current_app.logger.error(f"Failed to save member data: {str(e)}")
             return False, "An error occurred while saving your information. Please try again later."
         
+    def _find_samaj(self, session: Session, name: str) -> Optional[int]:
+        from ..models.family import Samaj
+        if self.family_directory is not None:
+            return self.family_directory.samaj_id(session, name)
+        return session.scalar(select(Samaj.id).where(Samaj.name == name))
+        
+    def _find_family(self, session: Session, samaj_id: int, head_name: str) -> Optional[int]:
+        """Family of the named head in the Samaj, through the directory when one is configured"""
+        from ..models.family import Family, Member, family_role_summary
+        if self.family_directory is None:
+            return session.scalar(
+                select(Family.id).join(Member, Member.family_id == Family.id).
+                where(Member.name == head_name, Member.is_family_head == True, Family.samaj_id == samaj_id)
+            )
+        family_id = self.family_directory.family_id(session, samaj_id, head_name)
+        if family_id is not None:
+            # A cached id may predate a change made by another worker; the summary is needed anyway
+            head = family_role_summary(session, family_id).head()
+            if head is None or normalize_name(head.name) != normalize_name(head_name):
+                self.family_directory.forget_head(samaj_id, head_name)
+                family_id = self.family_directory.family_id(session, samaj_id, head_name)
+        return family_id
+        
+    def _check_family_head(self, data: Dict[str, Any], head_name: str, db: Session) -> Optional[str]:
+        """Error reply when the head is not registered in the chosen Samaj, checked as it is entered"""
+        if self.family_directory is None or not db or not data.get("samaj"):
+            return None
+        samaj_id = self._find_samaj(db, data["samaj"])
+        if samaj_id is not None and self._find_family(db, samaj_id, head_name) is not None:
+            return None
+        return (
+            f"No family head named {head_name} is registered in {data['samaj']}. "
+            "Please check the spelling, or ask the head of your family to register first."
+        )
+        
     @classmethod
     def get_instance(cls):
         global _instance
@@ -360,40 +396,26 @@ class WhatsAppService:
                 
             from .. import db
             self.db = db
-            
-            # Ensure database tables exist
-            with app.app_context():
-                self.db.create_all()
                 
             self.dev_mode = os.getenv("FLASK_ENV") == "development"
-            self.current_sessions = {}
+            self.session_store = create_session_store(app)
+            self.session_store.start_sweeper(float(app.config.get("SESSION_SWEEP_INTERVAL", 60)))
+            self.processed_messages = create_processed_messages(app, self.session_store)
+            self.send_rate = create_send_rate(app, self.session_store)
+            self.family_directory = FamilyDirectory(
+                ttl_seconds=int(app.config.get("FAMILY_DIRECTORY_TTL_SECONDS", 300)),
+                max_entries=int(app.config.get("FAMILY_DIRECTORY_MAX_ENTRIES", 50000))
+            )
             
             if self.dev_mode:
                 app.logger.info("Initializing WhatsApp service in development mode")
-                class MockTwilioClient:
-                    class Messages:
-                        def create(self, from_=None, body=None, to=None):
-                            app.logger.info(f"[DEV] Sending message to {to}: {body}")
-                            return True
-                            
-                    def __init__(self):
-                        self.messages = self.Messages()
-                        
-                self.client = MockTwilioClient()
+                self.client = FakeTwilioClient(log=app.logger.info)
                 self.phone_number = "whatsapp:+14155238886"
-                self._dev_session = {
-                    "step": -1,
-                    "data": {},
-                    "family_context": {
-                        "family_members": [],
-                        "family_roles": {},
-                        "is_new_family": False,
-                        "role_confirmed": False
-                    }
-                }
+                self._init_outbound_queue(app)
                 if not hasattr(app, 'extensions'):
                     app.extensions = {}
                 app.extensions['whatsapp_service'] = self
+                self._register_gauges()
                 app.logger.info("Development mode initialized with mock sessions")
                 return self
                 
@@ -404,25 +426,29 @@ class WhatsAppService:
                 app.logger.error("Twilio credentials not properly configured")
                 raise ValueError("Twilio credentials not properly configured")
                 
-            self.client = Client(account_sid, auth_token)
+            self._twilio_credentials = (account_sid, auth_token)
             self.phone_number = os.getenv("TWILIO_PHONE_NUMBER", "whatsapp:+14155238886")
             
             # Validate phone number format
             if not self.phone_number.startswith("whatsapp:+"):
                 self.phone_number = f"whatsapp:+{self.phone_number.lstrip('+')}"
             
-            # Test Twilio connection
-            try:
-                self.client.api.accounts(account_sid).fetch()
-                app.logger.info(f"Successfully connected to Twilio account {account_sid}")
-            except Exception as e:
-                app.logger.error(f"Failed to connect to Twilio: {str(e)}")
-                raise ValueError("Failed to validate Twilio credentials")
+            # Test Twilio connection, unless it is left to `flask preflight`
+            if not app.config.get("LAZY_STARTUP"):
+                try:
+                    self.verify_twilio()
+                    app.logger.info(f"Successfully connected to Twilio account {account_sid}")
+                except Exception as e:
+                    app.logger.error(f"Failed to connect to Twilio: {str(e)}")
+                    raise ValueError("Failed to validate Twilio credentials")
+            
+            self._init_outbound_queue(app)
             
             # Store instance in app context
             if not hasattr(app, 'extensions'):
                 app.extensions = {}
             app.extensions['whatsapp_service'] = self
+            self._register_gauges()
             
             app.logger.info(f"WhatsApp service initialized successfully with number {self.phone_number}")
             return self
@@ -430,7 +456,104 @@ class WhatsAppService:
             app.logger.error(f"Failed to initialize WhatsApp service: {str(e)}")
             raise
 
-    def send_message(self, to: str, message: str) -> bool:
+    def verify_twilio(self) -> None:
+        """Fetch the Twilio account, raising if the credentials are rejected (no-op in development mode)"""
+        if self.dev_mode or isinstance(self.client, FakeTwilioClient):
+            return
+        self.client.api.accounts(self.client.username).fetch()
+
+    def sql_stores(self) -> list:
+        """Stores kept in database tables of their own, outside db.metadata"""
+        return [store for store in (self.session_store, self.processed_messages, self.send_rate)
+                if isinstance(store, (SQLSessionStore, SQLProcessedMessages, SQLSendRate))]
+
+    def _init_outbound_queue(self, app) -> None:
+        """Send replies from background workers unless OUTBOUND_QUEUE_WORKERS is 0"""
+        self.reserve_timeout = float(app.config.get("OUTBOUND_RESERVE_TIMEOUT", 2))
+        workers = int(app.config.get("OUTBOUND_QUEUE_WORKERS", 4))
+        if workers <= 0:
+            self.outbound_queue = None
+            return
+        self.outbound_queue = OutboundQueue(
+            self._deliver,
+            workers=workers,
+            max_pending=int(app.config.get("OUTBOUND_QUEUE_SIZE", 1000)),
+            max_retries=int(app.config.get("OUTBOUND_MAX_RETRIES", 3)),
+            backoff_seconds=float(app.config.get("OUTBOUND_RETRY_BACKOFF", 0.5))
+        )
+        app.logger.info(f"Outbound message queue started with {workers} workers")
+
+    def start_async_outbound(self, app) -> AsyncOutboundQueue:
+        """Replace the outbound threads with coroutines on the running event loop (ASGI entry point)"""
+        if isinstance(self.client, FakeTwilioClient):
+            self.async_client = self.client
+        else:
+            from twilio.rest import Client
+            from twilio.http.async_http_client import AsyncTwilioHttpClient
+            self.async_client = Client(self.client.username, self.client.password,
+                                       http_client=AsyncTwilioHttpClient())
+        if self.outbound_queue is not None:
+            # Closing drains what the threads already hold
+            self.outbound_queue.close()
+        workers = int(app.config.get("ASGI_OUTBOUND_CONCURRENCY", 64))
+        self.outbound_queue = AsyncOutboundQueue(
+            self._deliver_async,
+            workers=workers,
+            max_pending=int(app.config.get("OUTBOUND_QUEUE_SIZE", 1000)),
+            max_retries=int(app.config.get("OUTBOUND_MAX_RETRIES", 3)),
+            backoff_seconds=float(app.config.get("OUTBOUND_RETRY_BACKOFF", 0.5))
+        )
+        self.outbound_queue.start()
+        self._register_gauges()
+        app.logger.info(f"Async outbound queue started with {workers} workers")
+        return self.outbound_queue
+
+    def _register_gauges(self) -> None:
+        """Report session store and outbound queue sizes on /metrics"""
+        metrics.register_gauges("whatsapp_sessions", self.session_store.stats)
+        if self.processed_messages is not None:
+            metrics.register_gauges("webhook_dedup", self.processed_messages.stats)
+        if self.outbound_queue is not None:
+            metrics.register_gauges("outbound_queue", self.outbound_queue.stats)
+        if self.family_directory is not None:
+            metrics.register_gauges("family_directory", self.family_directory.stats)
+
+    def _deliver(self, from_: str, to: str, body: str):
+        """Every Twilio send, reply or broadcast, retries included, waits for the sender's rate"""
+        if self.send_rate is not None:
+            with metrics.span("send_rate_wait"):
+                self.send_rate.acquire(from_)
+        with metrics.span("twilio_send"):
+            return self.client.messages.create(from_=from_, body=body, to=to)
+
+    async def _deliver_async(self, from_: str, to: str, body: str):
+        if self.send_rate is not None:
+            with metrics.span("send_rate_wait"):
+                # Booked on a thread, as the shared bucket is a database row
+                wait = await asyncio.get_running_loop().run_in_executor(None, self.send_rate.reserve, from_)
+                if wait:
+                    await asyncio.sleep(wait)
+        with metrics.span("twilio_send"):
+            return await self.async_client.messages.create_async(from_=from_, body=body, to=to)
+
+    @contextmanager
+    def reply_slot(self, to: str):
+        """Hold a place in the outbound queue for the reply to a message from `to`.
+
+        Raises OutboundQueueFull when none frees up within OUTBOUND_RESERVE_TIMEOUT, before
+        the conversation has moved on, so the webhook can ask Twilio to redeliver. The place
+        is given back on exit unless send_message used it.
+        """
+        if self.outbound_queue is None:
+            yield None
+            return
+        reservation = self.outbound_queue.reserve(whatsapp_address(to), self.reserve_timeout)
+        try:
+            yield reservation
+        finally:
+            reservation.release()
+
+    def send_message(self, to: str, message: str, reservation: Optional[Reservation] = None) -> bool:
         try:
             if not self.client:
                 current_app.logger.error("Twilio client not initialized")
@@ -461,13 +584,12 @@ class WhatsAppService:
                 current_app.logger.error(f"Cannot send message to system number: {to_number}")
                 return False
                 
+            if self.outbound_queue is not None:
+                return self.outbound_queue.enqueue(to_number, system_number, message, reservation)
+                
             try:
                 current_app.logger.info(f"Attempting to send message from {system_number} to {to_number}")
-                self.client.messages.create(
-                    from_=system_number,
-                    body=message,
-                    to=to_number
-                )
+                self._deliver(system_number, to_number, message)
                 current_app.logger.info(f"Successfully sent message to {to_number}")
                 return True
             except Exception as e:
@@ -497,546 +619,230 @@ class WhatsAppService:
 
     def validate_field(self, value: str, field: str) -> bool:
         """Simplified validation for optional fields"""
-        if value.lower() == "skip" and field in ["mobile_2", "anniversary_date", "medical_conditions", "social_media_handles", "volunteer_interests"]:
+        if value.lower() == "skip" and field in OPTIONAL_FIELDS:
             return True
         return bool(value.strip())
         
-    def validate_input(self, field: str, value: str) -> tuple[bool, str]:
-        current_app.logger.debug(f"Validating field '{field}' with value '{value}'")
-        value = value.strip()
-        validations = {
-            "gender": lambda x: x.lower() in ["male", "female", "other"],
-            "age": lambda x: x.isdigit() and 0 <= int(x) <= 120,
-            "blood_group": lambda x: x.replace(" ", "").upper() in ["A+", "A-", "B+", "B-", "AB+", "AB-", "O+", "O-"],
-            "mobile_1": lambda x: x.isdigit() and len(x) == 10,
-            "mobile_2": lambda x: x.isdigit() and len(x) == 10 if x.lower() != "skip" else True,
-            "email": lambda x: "@" in x and "." in x.split("@")[1],
-            "birth_date": lambda x: len(x.split("/")) == 3,
-            "anniversary_date": lambda x: len(x.split("/")) == 3 if x.lower() != "skip" else True,
-            "emergency_contact": lambda x: x.isdigit() and len(x) == 10,
-            "family_role": lambda x: x.title() in ["Head", "Spouse", "Child", "Parent", "Sibling", "Other"],
-            "family_head": lambda x: bool(x.strip()),
-            "marital_status": lambda x: x.title() in ["Single", "Married", "Divorced", "Widowed"],
-            "relationship_status": lambda x: x.title() in ["Single", "Married", "Divorced", "Widowed", "Other"],
-            "medical_conditions": lambda x: bool(x.strip()) if x.lower() != "skip" else True,
-            "dietary_preferences": lambda x: bool(x.strip()),
-            "social_media_handles": lambda x: bool(x.strip()) if x.lower() != "skip" else True,
-            "volunteer_interests": lambda x: bool(x.strip()) if x.lower() != "skip" else True,
-            "samaj": lambda x: bool(x.strip()) and len(x.strip()) >= 2,
-            "name": lambda x: bool(x.strip()) and len(x.strip()) >= 2,
-            "education": lambda x: bool(x.strip()),
-            "occupation": lambda x: bool(x.strip()),
-            "address": lambda x: bool(x.strip()),
-            "native_place": lambda x: bool(x.strip()),
-            "current_city": lambda x: bool(x.strip()),
-            "languages_known": lambda x: bool(x.strip()),
-            "skills": lambda x: bool(x.strip()),
-            "hobbies": lambda x: bool(x.strip()),
-            "profession_category": lambda x: bool(x.strip())
-        }
-        
-        if field == "family_role":
-            role = value.title()
-            if role not in ["Head", "Spouse", "Child", "Parent", "Sibling", "Other"]:
-                return False, "Please enter a valid role (Head/Spouse/Child/Parent/Sibling/Other)"
-            return True, role
-        
-        if field not in validations:
-            return True, value
-            
-        is_valid = validations[field](value)
-        error_messages = {
-            "gender": "Please enter Male, Female, or Other",
-            "age": "Please enter a valid age between 0 and 120",
-            "blood_group": "Please enter a valid blood group (A+, A-, B+, B-, AB+, AB-, O+, O-)",
-            "mobile_1": "Please enter a valid 10-digit mobile number",
-            "mobile_2": "Please enter a valid 10-digit mobile number or type 'skip'",
-            "email": "Please enter a valid email address",
-            "birth_date": "Please enter date in DD/MM/YYYY format",
-            "anniversary_date": "Please enter date in DD/MM/YYYY format or type 'skip'",
-            "emergency_contact": "Please enter a valid 10-digit contact number",
-            "family_role": "Please enter a valid role (Head, Spouse, Child, Parent, Sibling, Other)",
-            "family_head": "Please enter the family head's name",
-            "marital_status": "Please enter a valid status (Single, Married, Divorced, Widowed)",
-            "family_context": "Please provide valid family information"
-        }
-        
-        return is_valid, error_messages[field] if not is_valid else value
+    def validate_input(self, field: str, value: str) -> Tuple[bool, Optional[str]]:
+        return validate_value(field, value)
 
-    def handle_message(self, phone_number: str, message: str, db: Session) -> Tuple[str, bool]:
-        try:
-            if not phone_number or not message or not db:
-                current_app.logger.error("Missing required parameters")
-                return "Invalid request. Please try again.", False
-                
-            # Extract and format phone number
-            phone_number = phone_number.replace("whatsapp:", "").strip()
-            if not phone_number.startswith("+"):
-                phone_number = "+" + phone_number
-                
-            current_app.logger.info(f"Processing message from {phone_number}: {message}")
-            
-            # Initialize or reset session on 'Start' command
-            if message.lower() == "start":
-                try:
-                    session = self._create_session(phone_number, message)
-                    current_app.logger.info(f"Created new session for {phone_number}")
-                    return "Welcome to Family & Samaj Data Collection Bot!\nPlease enter your Samaj name:", True
-                except Exception as e:
-                    current_app.logger.error(f"Failed to create session: {str(e)}")
-                    return "Failed to start session. Please try again.", False
-                
-            # Get or initialize session
-            if self.dev_mode:
-                if not self._dev_session:
-                    self._dev_session = self._create_session(phone_number, message)
-                session = self._dev_session
-            else:
-                if phone_number not in self.current_sessions:
-                    self.current_sessions[phone_number] = self._create_session(phone_number, message)
-                session = self.current_sessions[phone_number]
-            
-            # Handle sandbox join message
-            if message.lower().startswith('join'):
-                sandbox_code = message.split()[1] if len(message.split()) > 1 else None
-                if sandbox_code:
-                    current_app.logger.info(f"User {phone_number} joined sandbox with code: {sandbox_code}")
-                    return "Welcome to the Family & Samaj Data Collection bot! Send 'Start' to begin.", True
-                return "Please provide the sandbox code after 'join'. Example: 'join hello'", True
-                
-            # Check if this is the system number
-            system_number = os.getenv("TWILIO_PHONE_NUMBER", "whatsapp:+14155238886").replace("whatsapp:", "")
-            if phone_number == system_number:
-                current_app.logger.error(f"Cannot process messages from system number: {phone_number}")
-                return "Cannot process messages from the system number.", False
-                
-            if message.lower() == "start":
-                session_data = {
-                    "step": 0,
-                    "data": {},
-                    "family_context": {
-                        "is_new_family": False,
-                        "family_id": None,
-                        "family_name": None,
-                        "samaj_id": None,
-                        "correction_mode": False,
-                        "field_to_correct": None,
-                        "pending_validation": [],
-                        "role_confirmed": False,
-                        "creation_time": datetime.utcnow().isoformat(),
-                        "last_updated": datetime.utcnow().isoformat(),
-                        "family_head": None,
-                        "family_head_id": None,
-                        "family_members": [],
-                        "family_roles": {},
-                        "validation_errors": []
-                    }
-                }
-                current_app.logger.info(f"Initializing new session for {phone_number}")
-                
-                if self.dev_mode:
-                    self._dev_session = session_data
-                else:
-                    self.current_sessions[phone_number] = session_data
-                
-                return "Welcome to Family & Samaj Data Collection Bot!\nPlease enter your Samaj name:", True
-                
-            # Get session and handle initialization
-            session = self._dev_session if self.dev_mode else self.current_sessions.get(phone_number)
-            if not session:
-                if message.lower() != "start":
-                    current_app.logger.warning(f"No active session for {phone_number}")
-                    return "Please send 'Start' to begin the data collection process.", True
-                session = self._create_session(phone_number, message)
-                if self.dev_mode:
-                    self._dev_session = session
-                else:
-                    self.current_sessions[phone_number] = session
-                return "Welcome to Family & Samaj Data Collection Bot!\nPlease enter your Samaj name:", True
-            
-            step = session.get("step", -1)
-            data = session.get("data", {})
-            
-            if step == -1 and message.lower() != "start":
-                current_app.logger.warning(f"Invalid session state for {phone_number}")
-                return "Please send 'Start' to begin.", True
-                
-            if step not in range(29) and message.lower() != "start":
-                current_app.logger.error(f"Invalid step {step} for {phone_number}")
-                return "Please send 'Start' to begin.", True
-                
-        except Exception as e:
-            current_app.logger.error(f"Error accessing session data for {phone_number}: {str(e)}")
-            return "Please send 'Start' to begin.", True
-            
-        if not session:
-            return "Please send 'Start' to begin.", True
+    def handle_message(self, phone_number: str, message: str, db: Session,
+                       message_sid: Optional[str] = None) -> Tuple[str, bool]:
+        response, success, _ = self.handle_inbound(phone_number, message, db, message_sid)
+        return response, success
+
+    def handle_inbound(self, phone_number: str, message: str, db: Session,
+                       message_sid: Optional[str] = None) -> Tuple[str, bool, bool]:
+        """handle_message plus whether the reply was replayed for an already processed MessageSid"""
+        if not phone_number or not message or not db:
+            current_app.logger.error("Missing required parameters")
+            return "Invalid request. Please try again.", False, False
+            
+        # Extract and format phone number
+        phone_number = phone_number.replace("whatsapp:", "").strip()
+        if not phone_number.startswith("+"):
+            phone_number = "+" + phone_number
             
-        data = session.get("data", {})
+        # Hold the phone's session for the whole message so concurrent workers
+        # apply its steps one at a time; changes are written back on exit
+        with metrics.span("handle_message"), self.session_store.lock(phone_number):
+            dedup = self.processed_messages if message_sid else None
+            if dedup is not None:
+                replay = dedup.get(message_sid)
+                if replay is not None:
+                    current_app.logger.info(f"Replaying reply to retried message {message_sid} from {phone_number}")
+                    return replay[0], replay[1], True
+            
+            response, success = self._process_message(phone_number, message, db)
+            # Failures are not stored, so a retry gets another attempt at the step
+            if dedup is not None and success:
+                dedup.put(message_sid, response, success)
+            return response, success, False
 
-        steps = {
-            0: ("samaj", "Please enter your full name:"),
-            1: ("name", "Please enter your family role (Head/Spouse/Child/Parent/Sibling/Other):"),
-            2: ("family_role", "Please enter your gender (Male/Female/Other):"),
-            3: ("gender", "Please enter your age:"),
-            4: ("age", "Please enter your blood group (A+/A-/B+/B-/AB+/AB-/O+/O-):"),
-            5: ("blood_group", "Please enter your primary mobile number (10 digits):"),
-            6: ("mobile_1", "Please enter your secondary mobile number (10 digits or type 'skip'):"),
-            7: ("mobile_2", "Please enter your education:"),
-            8: ("education", "Please enter your occupation:"),
-            9: ("occupation", "Please enter your marital status (Single/Married/Divorced/Widowed):"),
-            10: ("marital_status", "Please enter your address:"),
-            11: ("address", "Please enter your email:"),
-            12: ("email", "Please enter your birth date (DD/MM/YYYY):"),
-            13: ("birth_date", "Please enter your anniversary date (DD/MM/YYYY or type 'skip'):"),
-            14: ("anniversary_date", "Please enter your native place:"),
-            15: ("native_place", "Please enter your current city:"),
-            16: ("current_city", "Please enter languages known (comma-separated):"),
-            17: ("languages_known", "Please enter your skills (comma-separated):"),
-            18: ("skills", "Please enter your hobbies (comma-separated):"),
-            19: ("hobbies", "Please enter emergency contact number (10 digits):"),
-            20: ("emergency_contact", "Please enter your relationship status (Single/Married/Divorced/Widowed/Other):"),
-            21: ("relationship_status", "Please enter any medical conditions (or type 'skip'):"),
-            22: ("medical_conditions", "Please enter your dietary preferences:"),
-            23: ("dietary_preferences", "Please enter your social media handles (or type 'skip'):"),
-            24: ("social_media_handles", "Please enter your profession category:"),
-            25: ("profession_category", "Please enter your volunteer interests (or type 'skip'):")
-        }
+    def _process_message(self, phone_number: str, message: str, db: Session) -> Tuple[str, bool]:
+        message = message.strip()
+        command = message.lower()
+        
+        # Start (or restart) a flow
+        flow = FLOW_TRIGGERS.get(command)
+        if flow is not None:
+            try:
+                self._create_session(phone_number, flow)
+            except Exception as e:
+                current_app.logger.error(f"Failed to create session: {str(e)}")
+                return "Failed to start session. Please try again.", False
+            return f"{flow.welcome}\n{flow.steps[0].prompt}", True
+            
+        # Handle sandbox join message
+        if command.startswith('join'):
+            parts = message.split()
+            if len(parts) > 1:
+                current_app.logger.info(f"User {phone_number} joined sandbox with code: {parts[1]}")
+                return "Welcome to the Family & Samaj Data Collection bot! Send 'Start' to begin.", True
+            return "Please provide the sandbox code after 'join'. Example: 'join hello'", True
+            
+        # Check if this is the system number
+        system_number = os.getenv("TWILIO_PHONE_NUMBER", "whatsapp:+14155238886").replace("whatsapp:", "")
+        if phone_number == system_number:
+            current_app.logger.error(f"Cannot process messages from system number: {phone_number}")
+            return "Cannot process messages from the system number.", False
+            
+        session = self.session_store.get(phone_number)
+        if session is None:
+            if self.session_store.pop_expired(phone_number):
+                current_app.logger.info(f"Session for {phone_number} expired due to inactivity")
+                return "Your previous session expired due to inactivity. Please send 'Start' to begin again.", True
+            return "Please send 'Start' to begin the data collection process.", True
+            
+        flow = FLOWS.get(session.get("flow", REGISTRATION_FLOW.name))
+        step = session.get("step", -1)
+        session["last_updated"] = datetime.utcnow().isoformat()
+        
+        if flow is not None and 0 <= step < len(flow.steps):
+            return self._handle_field_step(flow, session, step, message, phone_number, db)
+        if flow is not None and step == CONFIRM_STEP:
+            return self._handle_confirmation(flow, session, command, phone_number, db)
+        if flow is not None and step == CORRECTION_SELECT_STEP:
+            return self._handle_correction_select(flow, session, message)
+        if flow is not None and step == CORRECTION_INPUT_STEP:
+            return self._handle_correction_input(flow, session, message, db)
+            
+        current_app.logger.error(f"Invalid step {step} for {phone_number}")
+        return "Please send 'Start' to begin.", True
 
-        if step in steps:
-            field, next_prompt = steps[step]
-            is_valid, result = self.validate_input(field, message)
-            if not is_valid:
-                current_app.logger.warning(f"Invalid input for field '{field}' from {phone_number}: {message}")
-                return result, True
-                
-            if message.lower() == "skip" and field in ["mobile_2", "anniversary_date", "medical_conditions", "social_media_handles", "volunteer_interests"]:
-                data[field] = None
-                current_app.logger.info(f"User {phone_number} skipped optional field '{field}'")
-            else:
-                data[field] = result
-                current_app.logger.info(f"User {phone_number} provided valid input for '{field}': {result}")
-                
-                if field == "family_role":
-                    family_role = result
-                    current_app.logger.info(f"Processing family role: {family_role} for user {phone_number}")
-                    
-                    if family_role == "Head":
-                        data["family_head"] = data.get("name", "")
-                        data["is_family_head"] = True
-                        session["family_context"] = {
-                            "is_new_family": True,
-                            "family_name": f"{data.get('name', '')}'s Family",
-                            "role_confirmed": True,
-                            "samaj_name": data.get("samaj"),
-                            "samaj_id": None,
-                            "family_id": None,
-                            "family_head": data.get("name", ""),
-                            "family_head_id": None,
-                            "family_members": [{
-                                "name": data.get("name", ""),
-                                "role": "Head",
-                                "is_head": True
-                            }],
-                            "family_roles": {"Head": [data.get("name", "")]},
-                            "validation_errors": [],
-                            "creation_time": datetime.utcnow().isoformat(),
-                            "last_updated": datetime.utcnow().isoformat()
-                        }
-                    else:
-                        data["is_family_head"] = False
-                        session["family_context"] = {
-                            "is_new_family": False,
-                            "role_confirmed": True,
-                            "samaj_name": data.get("samaj"),
-                            "samaj_id": None,
-                            "family_id": None,
-                            "member_role": family_role,
-                            "family_head": None,
-                            "family_head_id": None,
-                            "family_members": [],
-                            "family_roles": {},
-                            "validation_errors": [],
-                            "creation_time": datetime.utcnow().isoformat(),
-                            "last_updated": datetime.utcnow().isoformat()
-                        }
-            
-            session["step"] = step + 1
-            session["data"] = data
-            current_app.logger.info(f"Advanced session for {phone_number} to step {step + 1}")
-            
-            if step == 25:  # After collecting all data, show confirmation
-                confirmation_message = "Please review your information:\n\n"
-                confirmation_message += f"Samaj: {data.get('samaj', '')}\n"
-                confirmation_message += f"Name: {data.get('name', '')}\n"
-                confirmation_message += f"Role: {data.get('family_role', '')}\n"
-                
-                family_context = session.get("family_context", {})
-                if data.get('family_role') == "Head":
-                    confirmation_message += f"Family Name: {family_context.get('family_name', '')}\n"
-                else:
-                    confirmation_message += f"Family Head: {data.get('family_head', '')}\n"
-                
-                confirmation_message += "\nYour Details:\n"
-                for field_name, value in data.items():
-                    if value is not None and field_name not in ['samaj', 'name', 'family_role', 'family_head']:
-                        confirmation_message += f"{field_name.replace('_', ' ').title()}: {value}\n"
-                
-                confirmation_message += "\nIs this information correct? (Yes/No)"
-                session["step"] = 28  # Move directly to confirmation step
-                session["data"] = data
-                return confirmation_message, True
-            
-            return next_prompt.format(data) if "{}" in next_prompt else next_prompt, True
-            
-            if message.lower() == "skip" and field in ["mobile_2", "anniversary_date", "medical_conditions", "social_media_handles", "volunteer_interests"]:
-                data[field] = None
-                current_app.logger.info(f"User {phone_number} skipped optional field '{field}'")
-            else:
-                if field == "family_role":
-                    family_role = result
-                    current_app.logger.info(f"Processing family role: {family_role} for user {phone_number}")
-                    
-                    if family_role == "Head":
-                        data["family_head"] = data.get("name", "")
-                        data["is_family_head"] = True
-                        session["family_context"] = {
-                            "is_new_family": True,
-                            "family_name": f"{data.get('name', '')}'s Family",
-                            "role_confirmed": True,
-                            "samaj_name": data.get("samaj"),
-                            "samaj_id": None,
-                            "family_id": None,
-                            "family_head": data.get("name", ""),
-                            "family_head_id": None,
-                            "family_members": [{
-                                "name": data.get("name", ""),
-                                "role": "Head",
-                                "is_head": True
-                            }],
-                            "family_roles": {"Head": [data.get("name", "")]},
-                            "validation_errors": [],
-                            "creation_time": datetime.utcnow().isoformat(),
-                            "last_updated": datetime.utcnow().isoformat()
-                        }
-                        current_app.logger.info(
-                            f"Created new family context for head: {data['name']} in {data.get('samaj')} "
-                            f"with roles: {session['family_context']['family_roles']}"
-                        )
-                    else:
-                        data["is_family_head"] = False
-                        session["family_context"] = {
-                            "is_new_family": False,
-                            "role_confirmed": True,
-                            "samaj_name": data.get("samaj"),
-                            "samaj_id": None,
-                            "family_id": None,
-                            "member_role": family_role,
-                            "family_head": None,
-                            "family_head_id": None,
-                            "family_members": [],
-                            "family_roles": {},
-                            "validation_errors": [],
-                            "creation_time": datetime.utcnow().isoformat(),
-                            "last_updated": datetime.utcnow().isoformat()
-                        }
-                        current_app.logger.info(f"Created family context for {family_role}: {data['name']} in {data.get('samaj')}")
-                    
-                    data[field] = family_role
-                else:
-                    data[field] = result
-                current_app.logger.info(f"User {phone_number} provided valid input for '{field}': {result}")
-                
-            session["step"] = step + 1
-            session["data"] = data
-            current_app.logger.info(f"Advanced session for {phone_number} to step {step + 1}")
-            
-            if step + 1 == 26:  # Before confirmation step
-                confirmation_message = "Please review your information:\n\n"
-                confirmation_message += f"Samaj: {data.get('samaj', '')}\n"
-                confirmation_message += f"Name: {data.get('name', '')}\n"
-                confirmation_message += f"Role: {data.get('family_role', '')}\n"
-                
-                family_context = session.get("family_context", {})
-                if data.get('family_role') == "Head":
-                    confirmation_message += f"Family Name: {family_context.get('family_name', '')}\n"
-                else:
-                    confirmation_message += f"Family Head: {data.get('family_head', '')}\n"
-                
-                confirmation_message += "\nYour Details:\n"
-                for field_name, value in data.items():
-                    if value is not None and field_name not in ['samaj', 'name', 'family_role', 'family_head']:
-                        confirmation_message += f"{field_name.replace('_', ' ').title()}: {value}\n"
-                
-                confirmation_message += "\nIs this information correct? (Yes/No)"
-                session["step"] = step + 1
-                session["data"] = data
-                return confirmation_message, True
-            
-            session["step"] = step + 1
-            session["data"] = data
-            current_app.logger.info(f"Advanced session for {phone_number} to step {step + 1}")
-            
-            if step == 25:  # After collecting all data, show confirmation
-                if message.lower() == "skip" or self.validate_field(message, "volunteer_interests"):
-                    if message.lower() != "skip":
-                        data["volunteer_interests"] = message
-                    
-                    confirmation_message = "Please review your information:\n\n"
-                    confirmation_message += f"Samaj: {data.get('samaj', '')}\n"
-                    confirmation_message += f"Name: {data.get('name', '')}\n"
-                    confirmation_message += f"Role: {data.get('family_role', '')}\n"
-                    
-                    family_context = session.get("family_context", {})
-                    if data.get('family_role') == "Head":
-                        confirmation_message += f"Family Name: {family_context.get('family_name', '')}\n"
-                    else:
-                        confirmation_message += f"Family Head: {data.get('family_head', '')}\n"
-                        if family_context.get("family_members"):
-                            confirmation_message += "\nExisting Family Members:\n"
-                            for member in family_context["family_members"]:
-                                confirmation_message += f"- {member['name']} ({member['role']})\n"
-                    
-                    confirmation_message += "\nYour Details:\n"
-                    for field_name, value in data.items():
-                        if value is not None and field_name not in ['samaj', 'name', 'family_role', 'family_head']:
-                            confirmation_message += f"{field_name.replace('_', ' ').title()}: {value}\n"
-                    
-                    confirmation_message += "\nIs this information correct? (Yes/No)"
-                    session["step"] = 28  # Move directly to confirmation step
-                    session["data"] = data
-                    return confirmation_message, True
-                return "Please enter valid volunteer interests or type 'skip':", True
-            
-            return next_prompt.format(data) if "{}" in next_prompt else next_prompt, True
-                
-                family_role = data.get("family_role", "").title()
-                # Build confirmation message with family context
-                confirmation_message = "Please review your information:\n\n"
-                confirmation_message += f"Samaj: {data.get('samaj', '')}\n"
-                confirmation_message += f"Name: {data.get('name', '')}\n"
-                confirmation_message += f"Role: {family_role}\n"
-                
-                family_context = session.get("family_context", {})
-                if family_role == "Head":
-                    confirmation_message += f"Family Name: {family_context.get('family_name', '')}\n"
-                else:
-                    confirmation_message += f"Family Head: {data.get('family_head', '')}\n"
-                    if family_context.get("family_members"):
-                        confirmation_message += "\nExisting Family Members:\n"
-                        for member in family_context["family_members"]:
-                            confirmation_message += f"- {member['name']} ({member['role']})\n"
-                
-                confirmation_message += "\nYour Details:\n"
-                for field, value in data.items():
-                    if value is not None and field not in ['samaj', 'name', 'family_role', 'family_head']:
-                        confirmation_message += f"{field.replace('_', ' ').title()}: {value}\n"
-                
-                confirmation_message += "\nIs this information correct? (Yes/No)"
-                return confirmation_message, True
-            return "Please enter valid volunteer interests or type 'skip':", True
-            
-        if step == 28:  # Confirmation step
-            if message.lower() == "yes":
-                try:
-                    current_app.logger.info(f"User {phone_number} confirmed data: {data}")
-                    family_context = session.get("family_context", {})
-                    if not family_context.get("role_confirmed"):
-                        return "Error: Family role not confirmed. Please start over.", False
-                    
-                    # Update family context with final state before saving
-                    family_context["last_updated"] = datetime.utcnow().isoformat()
-                    session["family_context"] = family_context
-                    
-                    # Log the complete data being saved
-                    current_app.logger.info(
-                        f"Saving data for {phone_number}:\n"
-                        f"Role: {data.get('family_role')}\n"
-                        f"Family Head: {data.get('family_head')}\n"
-                        f"Family Context: {family_context}"
-                    )
-                    
-                    current_app.logger.info(
-                        f"Saving member data for {phone_number} with family context: "
-                        f"role={data.get('family_role')}, "
-                        f"is_head={data.get('is_family_head')}, "
-                        f"samaj={data.get('samaj')}, "
-                        f"family_head={data.get('family_head')}"
-                    )
-                    
-                    success, response = self.save_member_data(data, phone_number, db)
-                    if success:
-                        current_app.logger.info(
-                            f"Successfully saved member data for {phone_number} in "
-                            f"{data.get('samaj')} Samaj, family head: {data.get('family_head')}"
-                        )
-                        if self.dev_mode:
-                            self._dev_session = None
-                        else:
-                            del self.current_sessions[phone_number]
-                    else:
-                        current_app.logger.error(
-                            f"Failed to save member data for {phone_number}: {response}"
-                        )
-                    return response, success
-                except Exception as e:
-                    current_app.logger.error(f"Failed to save user data: {str(e)}")
-                    return "An error occurred while saving your information. Please try again later.", False
-            elif message.lower() == "no":
-                session["step"] = 29  # Correction step
-                field_list = "\n".join([
-                    f"{i+1}. {field.replace('_', ' ').title()}: {value}" 
-                    for i, (field, value) in enumerate(data.items())
-                    if field != "family_head" or data.get("family_role", "").title() != "Head"
-                ])
-                return f"Which field would you like to correct? Enter the number:\n{field_list}", True
-            else:
-                return "Please reply with 'Yes' to confirm or 'No' to make corrections.", True
-                
-        if step == 29:  # Field selection for correction
+    def _handle_field_step(self, flow: Flow, session: Dict[str, Any], step: int,
+                           message: str, phone_number: str, db: Session = None) -> Tuple[str, bool]:
+        field_step = flow.steps[step]
+        is_valid, result = validate_value(field_step.field, message)
+        if is_valid and field_step.field == "family_head":
+            error = self._check_family_head(session.get("data", {}), result, db)
+            if error is not None:
+                is_valid, result = False, error
+        if not is_valid:
+            current_app.logger.warning(f"Invalid input for field '{field_step.field}' from {phone_number}: {message}")
+            metrics.increment("conversation_step_total", flow=flow.name, step=field_step.field, result="invalid")
+            return result, True
+            
+        metrics.increment("conversation_step_total", flow=flow.name, step=field_step.field, result="valid")
+        data = session.setdefault("data", {})
+        data[field_step.field] = result
+        if field_step.on_set is not None:
+            field_step.on_set(session, result)
+            
+        if session.get("correcting"):
+            next_step = flow.first_missing_step(data)
+        else:
+            next_step = flow.next_step(step, data)
+        if next_step is None:
+            # All data collected, show confirmation
+            session.pop("correcting", None)
+            session["step"] = CONFIRM_STEP
+            return build_confirmation(flow, session), True
+            
+        session["step"] = next_step
+        return flow.steps[next_step].prompt, True
+
+    def _handle_confirmation(self, flow: Flow, session: Dict[str, Any], command: str,
+                             phone_number: str, db: Session) -> Tuple[str, bool]:
+        data = session.get("data", {})
+        if command == "yes":
             try:
-                field_index = int(message) - 1
-                fields = [f for f in data.keys() if f != "family_head" or data.get("family_role", "").title() != "Head"]
-                if 0 <= field_index < len(fields):
-                    field_to_correct = fields[field_index]
-                    session["correction_field"] = field_to_correct
-                    session["step"] = 30
-                    return f"Current value of {field_to_correct.replace('_', ' ').title()}: {data[field_to_correct]}\nPlease enter the new value:", True
+                current_app.logger.info(f"User {phone_number} confirmed {flow.name} data")
+                success, response = getattr(self, flow.complete)(data, phone_number, db)
+                metrics.increment("conversation_step_total", flow=flow.name, step="confirm",
+                                  result="saved" if success else "failed")
+                if success:
+                    current_app.logger.info(f"Completed {flow.name} for {phone_number}")
+                    self.session_store.delete(phone_number)
                 else:
-                    return "Please enter a valid number from the list.", True
-            except ValueError:
-                return "Please enter a valid number from the list.", True
-                
-        if step == 30:  # Handling correction input
-            field_to_correct = session.get("correction_field")
-            if not field_to_correct:
-                return "An error occurred during correction. Please start over.", False
-                
-            is_valid, result = self.validate_input(field_to_correct, message)
-            if not is_valid:
-                return result, True
-                
-            data[field_to_correct] = result
-            session["step"] = 28  # Return to confirmation step
-            session["data"] = data
-            
-            # Show updated information
-            family_role = data.get("family_role", "").title()
-            confirmation_message = "Field updated. Please review your information:\n\n"
-            confirmation_message += f"Samaj: {data.get('samaj', '')}\n"
-            confirmation_message += f"Name: {data.get('name', '')}\n"
-            confirmation_message += f"Role: {family_role}\n"
-            
-            if family_role != "Head":
-                confirmation_message += f"Family Head: {data.get('family_head', '')}\n"
-            
-            for field, value in data.items():
-                if value is not None and field not in ['samaj', 'name', 'family_role', 'family_head']:
-                    confirmation_message += f"{field.replace('_', ' ').title()}: {value}\n"
-            
-            confirmation_message += "\nIs this information correct? (Yes/No)"
-            return confirmation_message, True
-            
-        # Default case - should never reach here
-        current_app.logger.error(f"Invalid step encountered: {step}")
-        return "Please send 'Start' to begin.", True
+                    current_app.logger.error(f"Failed to complete {flow.name} for {phone_number}: {response}")
+                return response, success
+            except Exception as e:
+                current_app.logger.error(f"Failed to save user data: {str(e)}")
+                return "An error occurred while saving your information. Please try again later.", False
+        if command == "no":
+            metrics.increment("conversation_step_total", flow=flow.name, step="confirm", result="correction")
+            session["step"] = CORRECTION_SELECT_STEP
+            field_list = "\n".join(
+                f"{i + 1}. {field.replace('_', ' ').title()}: {data[field]}"
+                for i, field in enumerate(flow.answered_fields(data))
+            )
+            return f"Which field would you like to correct? Enter the number:\n{field_list}", True
+        return "Please reply with 'Yes' to confirm or 'No' to make corrections.", True
+
+    def _handle_correction_select(self, flow: Flow, session: Dict[str, Any], message: str) -> Tuple[str, bool]:
+        fields = flow.answered_fields(session.get("data", {}))
+        try:
+            field_index = int(message) - 1
+        except ValueError:
+            return "Please enter a valid number from the list.", True
+        if not 0 <= field_index < len(fields):
+            return "Please enter a valid number from the list.", True
+            
+        field_to_correct = fields[field_index]
+        session["correction_field"] = field_to_correct
+        session["step"] = CORRECTION_INPUT_STEP
+        return (
+            f"Current value of {field_to_correct.replace('_', ' ').title()}: {session['data'][field_to_correct]}\n"
+            "Please enter the new value:"
+        ), True
+
+    def _handle_correction_input(self, flow: Flow, session: Dict[str, Any], message: str,
+                                 db: Session = None) -> Tuple[str, bool]:
+        field_to_correct = session.get("correction_field")
+        if field_to_correct not in flow.fields:
+            return "An error occurred during correction. Please start over.", False
+            
+        is_valid, result = validate_value(field_to_correct, message)
+        if is_valid and field_to_correct == "family_head":
+            error = self._check_family_head(session["data"], result, db)
+            if error is not None:
+                is_valid, result = False, error
+        metrics.increment("conversation_step_total", flow=flow.name, step=f"correct_{field_to_correct}",
+                          result="valid" if is_valid else "invalid")
+        if not is_valid:
+            return result, True
+            
+        data = session["data"]
+        data[field_to_correct] = result
+        on_set = flow.steps[flow.fields.index(field_to_correct)].on_set
+        if on_set is not None:
+            on_set(session, result)
+        session.pop("correction_field", None)
+        
+        # A correction can make another step applicable (e.g. changing the role away from Head)
+        missing_step = flow.first_missing_step(data)
+        if missing_step is not None:
+            session["step"] = missing_step
+            session["correcting"] = True
+            return flow.steps[missing_step].prompt, True
+            
+        session["step"] = CONFIRM_STEP
+        return build_confirmation(flow, session, "Field updated. Please review your information:"), True
+
+    def update_member_phone(self, data: Dict[str, Any], phone_number: str, db: Session) -> Tuple[bool, str]:
+        """Replace the primary mobile of a member registered with the sender's number"""
+        try:
+            from ..models.family import Samaj, Member
+            
+            # Stored numbers vary in format, so both sides are compared in E.164 form
+            country_code = str(current_app.config.get("BROADCAST_COUNTRY_CODE", "91"))
+            sender = normalize_phone(phone_number, country_code)
+            candidates = db.query(Member).join(Samaj, Member.samaj_id == Samaj.id).filter(
+                Samaj.name == data["samaj"],
+                Member.name == data["name"]
+            ).all()
+            member = next((m for m in candidates if sender and sender in (
+                normalize_phone(m.mobile_1, country_code), normalize_phone(m.mobile_2, country_code)
+            )), None)
+            if not member:
+                return False, "No member with that name is registered with this mobile number."
+                
+            member.mobile_1 = data["mobile_1"]
+            db.commit()
+            current_app.logger.info(f"Updated primary mobile for member {member.id}")
+            return True, "Thank you! Your mobile number has been updated."
+        except Exception as e:
+            db.rollback()
+            current_app.logger.error(f"Failed to update member phone: {str(e)}")
+            return False, "An error occurred while updating your mobile number. Please try again later."
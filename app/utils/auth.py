@@ -10,22 +10,18 @@ def login_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
         token = request.headers.get('Authorization')
-        current_app.logger.info(f"Received Authorization header: {token}")
         
         if not token or not token.startswith('Bearer '):
-            current_app.logger.error("Missing or invalid Authorization header format")
+            current_app.logger.warning(f"Missing or invalid Authorization header format on {request.path}")
             return jsonify({"error": "Missing or invalid token format"}), 401
         
         try:
-            token_value = token.split(' ')[1]
-            current_app.logger.info("Attempting to verify token")
-            username = verify_token(token_value)
+            username = verify_token(token[7:])
             
             if not username:
-                current_app.logger.error("Token verification failed")
+                current_app.logger.warning(f"Token verification failed on {request.path}")
                 return jsonify({"error": "Invalid token"}), 401
-                
-            current_app.logger.info(f"Token verified successfully for user: {username}")
+            
             return f(*args, **kwargs)
         except Exception as e:
             current_app.logger.error(f"Error during token verification: {str(e)}")
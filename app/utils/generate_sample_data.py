@@ -1,7 +1,14 @@
 # Author: SANJAY KR
 import random
-from datetime import datetime, timedelta
 import json
+import logging
+import multiprocessing
+import time
+from collections import deque
+from datetime import date, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
 
 SAMAJ_CATEGORIES = ["Bhram", "Sindhi", "Maharashtra Mandal", "Vaishnav Vanik", "Lohana", "Bhatia", "Jain", "Patel", "Connected", "Marwari"]
 
@@ -13,151 +20,201 @@ FIRST_NAMES = ["Raj", "Amit", "Priya", "Neha", "Suresh", "Ramesh", "Sanjay", "Vi
 LAST_NAMES = ["Patel", "Shah", "Mehta", "Desai", "Joshi", "Bhatt", "Trivedi", "Pandya", "Vyas", "Pathak",
               "Kumar", "Singh", "Sharma", "Verma", "Gupta", "Malhotra", "Kapoor", "Khanna", "Chopra", "Reddy"]
 
-def generate_phone():
-    return f"+91{random.randint(7000000000, 9999999999)}"
+FAMILY_BATCH_SIZE = 1000
+
+def generate_phone(rng=random):
+    return f"+91{rng.randint(7000000000, 9999999999)}"
 
-def generate_member():
-    gender = random.choice(["M", "F"])
-    first_name = random.choice(FIRST_NAMES)
-    last_name = random.choice(LAST_NAMES)
+def generate_member(rng=random, today: Optional[date] = None, age: Optional[int] = None,
+                    gender: Optional[str] = None, last_name: Optional[str] = None):
+    today = today or date.today()
+    gender = gender or rng.choice(["Male", "Female"])
+    first_name = rng.choice(FIRST_NAMES)
+    last_name = last_name or rng.choice(LAST_NAMES)
+    age = rng.randint(18, 80) if age is None else age
+    married = age >= 21 and rng.random() > 0.3
     
     return {
-        "samaj": random.choice(SAMAJ_CATEGORIES),
-        "name": f"{first_name} {random.choice('ABCDEFGHIJKLMNOPQRSTUVWXYZ')} {last_name}",
+        "samaj": rng.choice(SAMAJ_CATEGORIES),
+        "name": f"{first_name} {rng.choice('ABCDEFGHIJKLMNOPQRSTUVWXYZ')} {last_name}",
         "gender": gender,
-        "age": random.randint(18, 80),
-        "blood_group": random.choice(BLOOD_GROUPS),
-        "mobile_1": generate_phone(),
-        "mobile_2": generate_phone() if random.random() > 0.5 else None,
-        "education": random.choice(["Graduate", "Post Graduate", "PhD", "High School", "Under Graduate"]),
-        "occupation": random.choice(["Business", "Service", "Professional", "Student", "Retired"]),
-        "marital_status": random.choice(["Single", "Married", "Widowed"]),
-        "address": f"{random.randint(1, 999)}, Sample Street, City",
+        "age": age,
+        "blood_group": rng.choice(BLOOD_GROUPS),
+        "mobile_1": generate_phone(rng),
+        "mobile_2": generate_phone(rng) if rng.random() > 0.5 else None,
+        "education": rng.choice(["Graduate", "Post Graduate", "PhD", "High School", "Under Graduate"]),
+        "occupation": rng.choice(["Business", "Service", "Professional", "Student", "Retired"]),
+        "marital_status": "Married" if married else rng.choice(["Single", "Widowed"]) if age >= 21 else "Single",
+        "address": f"{rng.randint(1, 999)}, Sample Street, City",
         "email": f"{first_name.lower()}.{last_name.lower()}@example.com",
-        "birth_date": (datetime.now() - timedelta(days=random.randint(6570, 29200))).strftime("%Y-%m-%d"),
-        "anniversary_date": (datetime.now() - timedelta(days=random.randint(365, 14600))).strftime("%Y-%m-%d") if random.random() > 0.3 else None,
-        "native_place": random.choice(["Gujarat", "Maharashtra", "Rajasthan", "Delhi", "Karnataka"]),
-        "current_city": random.choice(["Mumbai", "Delhi", "Bangalore", "Ahmedabad", "Pune"]),
-        "languages_known": ", ".join(random.sample(["English", "Hindi", "Gujarati", "Marathi", "Sanskrit"], random.randint(2, 4))),
-        "skills": ", ".join(random.sample(["Computer", "Management", "Teaching", "Writing", "Public Speaking"], random.randint(1, 3))),
-        "hobbies": ", ".join(random.sample(["Reading", "Music", "Travel", "Cooking", "Photography"], random.randint(1, 3))),
-        "emergency_contact": generate_phone(),
-        "relationship_status": random.choice(["Married", "Single", "Widowed"]),
-        "family_role": random.choice(["Head", "Spouse", "Child", "Parent"]),
-        "medical_conditions": None if random.random() > 0.3 else random.choice(["None", "Diabetes", "Hypertension"]),
-        "dietary_preferences": random.choice(["Vegetarian", "Jain", "Vegan"]),
+        "birth_date": (today - timedelta(days=age * 365 + rng.randint(0, 364))).strftime("%Y-%m-%d"),
+        "anniversary_date": (today - timedelta(days=rng.randint(365, (age - 20) * 365))).strftime("%Y-%m-%d") if married and age > 21 else None,
+        "native_place": rng.choice(["Gujarat", "Maharashtra", "Rajasthan", "Delhi", "Karnataka"]),
+        "current_city": rng.choice(["Mumbai", "Delhi", "Bangalore", "Ahmedabad", "Pune"]),
+        "languages_known": ", ".join(rng.sample(["English", "Hindi", "Gujarati", "Marathi", "Sanskrit"], rng.randint(2, 4))),
+        "skills": ", ".join(rng.sample(["Computer", "Management", "Teaching", "Writing", "Public Speaking"], rng.randint(1, 3))),
+        "hobbies": ", ".join(rng.sample(["Reading", "Music", "Travel", "Cooking", "Photography"], rng.randint(1, 3))),
+        "emergency_contact": generate_phone(rng),
+        "relationship_status": "Married" if married else "Single",
+        "family_role": rng.choice(["Head", "Spouse", "Child", "Parent"]),
+        "medical_conditions": None if rng.random() > 0.3 else rng.choice(["None", "Diabetes", "Hypertension"]),
+        "dietary_preferences": rng.choice(["Vegetarian", "Jain", "Vegan"]),
         "social_media_handles": f"@{first_name.lower()}_{last_name.lower()}",
-        "profession_category": random.choice(["IT", "Healthcare", "Education", "Business", "Finance"]),
-        "volunteer_interests": ", ".join(random.sample(["Community Service", "Education", "Healthcare", "Environment"], random.randint(1, 3)))
+        "profession_category": rng.choice(["IT", "Healthcare", "Education", "Business", "Finance"]),
+        "volunteer_interests": ", ".join(rng.sample(["Community Service", "Education", "Healthcare", "Environment"], rng.randint(1, 3)))
     }
 
-def generate_sample_data(db, count=50):
-    from ..models.family import Samaj, Family, Member
+def generate_family(seed: int, samaj_index: int, family_number: int, members_per_family: int,
+                    today: date) -> List[Dict[str, Any]]:
+    """Members of one family, head first, with roles and ages that pass family role validation.
+    Each family has its own random stream, so the output does not depend on batching or workers."""
+    rng = random.Random(f"{seed}:{samaj_index}:{family_number}")
+    head_age = rng.randint(30, 75)
+    head = generate_member(rng, today, head_age)
+    last_name = head["name"].rsplit(" ", 1)[-1]
+    members = [dict(head, family_role="Head", relationship_status="Married", marital_status="Married")]
+    youngest_parent = head_age
+    parents = 0
+    
+    for position in range(1, members_per_family):
+        if position == 1:
+            age = min(max(head_age + rng.randint(-6, 6), 21), 100)
+            gender = "Female" if head["gender"] == "Male" else "Male"
+            member = dict(generate_member(rng, today, age, gender, last_name), family_role="Spouse",
+                          relationship_status="Married", marital_status="Married")
+            youngest_parent = min(youngest_parent, age)
+        elif parents < 2 and rng.random() < 0.15:
+            parents += 1
+            member = dict(generate_member(rng, today, min(head_age + rng.randint(20, 35), 110), last_name=last_name),
+                          family_role="Parent")
+        elif rng.random() < 0.1:
+            member = dict(generate_member(rng, today, max(head_age + rng.randint(-8, 8), 1), last_name=last_name),
+                          family_role="Sibling")
+        else:
+            member = dict(generate_member(rng, today, rng.randint(0, youngest_parent - 19), last_name=last_name),
+                          family_role="Child")
+        members.append(member)
+    
+    # Parents must be older than every child, which the ranges above guarantee; order them
+    # ahead of children the way the bot collects them
+    order = {"Head": 0, "Spouse": 1, "Parent": 2, "Child": 3, "Sibling": 4}
+    members.sort(key=lambda m: order[m["family_role"]])
+    for member in members:
+        del member["samaj"]
+    return members
+
+def samaj_names(count: int) -> List[str]:
+    """The first `count` Samaj names, numbering repeats once the categories run out"""
+    size = len(SAMAJ_CATEGORIES)
+    return [SAMAJ_CATEGORIES[i % size] + (f" {i // size + 1}" if i >= size else "") for i in range(count)]
+
+def _generate_chunk(task) -> List[Tuple[int, int, List[Dict[str, Any]]]]:
+    seed, families, members_per_family, today = task
+    return [
+        (samaj_index, family_number, generate_family(seed, samaj_index, family_number, members_per_family, today))
+        for samaj_index, family_number in families
+    ]
+
+def _insert_chunk(db, chunk, samaj_ids: Dict[int, int], names: List[str]) -> int:
+    """Insert one chunk of generated families with executemany statements; returns members inserted"""
+    from sqlalchemy import insert, update
+    from ..models.analytics import record_member_stats
+    from ..models.family import Family, Member
+    from ..models.tags import TAG_RETURNING, write_member_tags
     
-    samaj_data = {}
-    family_data = {}
+    family_table, member_table = Family.__table__, Member.__table__
+    family_ids = db.execute(
+        insert(family_table).returning(family_table.c.id, sort_by_parameter_order=True),
+        [{"samaj_id": samaj_ids[samaj_index], "name": f"{names[samaj_index]} Family {family_number + 1}"}
+         for samaj_index, family_number, _ in chunk]
+    ).scalars().all()
     
-    for samaj_name in SAMAJ_CATEGORIES[:count//5]:
-        existing_samaj = db.query(Samaj).filter_by(name=samaj_name).first()
-        if existing_samaj:
-            samaj_data[samaj_name] = existing_samaj
-            continue
-            
-        samaj = Samaj(name=samaj_name)
-        db.add(samaj)
-        db.flush()
-        samaj_data[samaj_name] = samaj
-        
-        # Create 5 families per samaj
-        for i in range(5):
-            family_name = f"{samaj_name} Family {i+1}"
-            family = Family(name=family_name, samaj_id=samaj.id)
-            db.add(family)
-            db.flush()
-            family_data[family_name] = family
-            
-            # Generate family head
-            head_data = generate_member()
-            head = Member(
-                samaj_id=samaj.id,
-                family_id=family.id,
-                is_family_head=True,
-                name=head_data["name"],
-                gender=head_data["gender"],
-                age=head_data["age"],
-                blood_group=head_data["blood_group"],
-                mobile_1=head_data["mobile_1"],
-                mobile_2=head_data["mobile_2"],
-                education=head_data["education"],
-                occupation=head_data["occupation"],
-                marital_status=head_data["marital_status"],
-                address=head_data["address"],
-                email=head_data["email"],
-                birth_date=head_data["birth_date"],
-                anniversary_date=head_data["anniversary_date"],
-                native_place=head_data["native_place"],
-                current_city=head_data["current_city"],
-                languages_known=head_data["languages_known"],
-                skills=head_data["skills"],
-                hobbies=head_data["hobbies"],
-                emergency_contact=head_data["emergency_contact"],
-                relationship_status=head_data["relationship_status"],
-                family_role="Head",
-                medical_conditions=head_data["medical_conditions"],
-                dietary_preferences=head_data["dietary_preferences"],
-                social_media_handles=head_data["social_media_handles"],
-                profession_category=head_data["profession_category"],
-                volunteer_interests=head_data["volunteer_interests"]
-            )
-            db.add(head)
-            db.flush()
-            
-            # Update family head reference
-            family.head_of_family_id = head.id
-            db.flush()
-            
-            # Add 4 more members to each family
-            for _ in range(4):
-                member_data = generate_member()
-                member = Member(
-                    samaj_id=samaj.id,
-                    family_id=family.id,
-                    is_family_head=False,
-                    name=member_data["name"],
-                    gender=member_data["gender"],
-                    age=member_data["age"],
-                    blood_group=member_data["blood_group"],
-                    mobile_1=member_data["mobile_1"],
-                    mobile_2=member_data["mobile_2"],
-                    education=member_data["education"],
-                    occupation=member_data["occupation"],
-                    marital_status=member_data["marital_status"],
-                    address=member_data["address"],
-                    email=member_data["email"],
-                    birth_date=member_data["birth_date"],
-                    anniversary_date=member_data["anniversary_date"],
-                    native_place=member_data["native_place"],
-                    current_city=member_data["current_city"],
-                    languages_known=member_data["languages_known"],
-                    skills=member_data["skills"],
-                    hobbies=member_data["hobbies"],
-                    emergency_contact=member_data["emergency_contact"],
-                    relationship_status=member_data["relationship_status"],
-                    family_role=random.choice(["Spouse", "Child", "Parent"]),
-                    medical_conditions=member_data["medical_conditions"],
-                    dietary_preferences=member_data["dietary_preferences"],
-                    social_media_handles=member_data["social_media_handles"],
-                    profession_category=member_data["profession_category"],
-                    volunteer_interests=member_data["volunteer_interests"]
-                )
-                db.add(member)
-            db.flush()
+    heads, others = [], []
+    for family_id, (samaj_index, _, members) in zip(family_ids, chunk):
+        ids = {"samaj_id": samaj_ids[samaj_index], "family_id": family_id}
+        heads.append(dict(members[0], is_family_head=True, **ids))
+        others.extend(dict(member, is_family_head=False, **ids) for member in members[1:])
     
-    try:
+    head_ids = db.execute(
+        insert(member_table).returning(member_table.c.id, sort_by_parameter_order=True), heads
+    ).scalars().all()
+    tagged = dict(zip(head_ids, heads))
+    if others:
+        tagged.update((row.id, row._mapping) for row in
+                      db.execute(insert(member_table).returning(*TAG_RETURNING), others))
+    record_member_stats(db.connection(), heads + others)
+    write_member_tags(db.connection(), tagged)
+    db.execute(
+        update(Family),
+        [{"id": family_id, "head_of_family_id": head_id} for family_id, head_id in zip(family_ids, head_ids)]
+    )
+    db.commit()
+    return len(heads) + len(others)
+
+def generate_dataset(db, samaj_count: int = 10, families_per_samaj: int = 5, members_per_family: int = 5,
+                     seed: Optional[int] = None, batch_size: int = FAMILY_BATCH_SIZE, workers: int = 1,
+                     progress: Optional[Callable[[int, int], None]] = None) -> Dict[str, Any]:
+    """Generate families for every Samaj that does not exist yet, inserting `batch_size`
+    families per transaction; `workers` > 1 generates rows in that many processes"""
+    from sqlalchemy import insert, select
+    from ..models.family import Samaj
+    
+    seed = random.randrange(2 ** 32) if seed is None else seed
+    today = date.today()
+    started = time.perf_counter()
+    names = samaj_names(samaj_count)
+    existing = set(db.execute(select(Samaj.name).where(Samaj.name.in_(names))).scalars())
+    new = [(i, name) for i, name in enumerate(names) if name not in existing]
+    
+    samaj_ids = {}
+    if new:
+        ids = db.execute(
+            insert(Samaj.__table__).returning(Samaj.__table__.c.id, sort_by_parameter_order=True),
+            [{"name": name} for _, name in new]
+        ).scalars().all()
+        samaj_ids = {i: samaj_id for (i, _), samaj_id in zip(new, ids)}
         db.commit()
-    except Exception as e:
+    
+    families = [(i, number) for i, _ in new for number in range(families_per_samaj)]
+    tasks = [(seed, families[start:start + batch_size], members_per_family, today)
+             for start in range(0, len(families), batch_size)]
+    stats = {"seed": seed, "samaj": len(new), "families": 0, "members": 0}
+    
+    def insert_chunk(chunk):
+        stats["members"] += _insert_chunk(db, chunk, samaj_ids, names)
+        stats["families"] += len(chunk)
+        if progress:
+            progress(len(chunk), stats["members"])
+    
+    try:
+        if workers > 1 and len(tasks) > 1:
+            # Workers only build rows; inserts stay on this session. At most two chunks
+            # per worker are held in memory at a time.
+            with multiprocessing.Pool(workers) as pool:
+                pending = deque()
+                for task in tasks:
+                    pending.append(pool.apply_async(_generate_chunk, (task,)))
+                    if len(pending) > workers * 2:
+                        insert_chunk(pending.popleft().get())
+                while pending:
+                    insert_chunk(pending.popleft().get())
+        else:
+            for task in tasks:
+                insert_chunk(_generate_chunk(task))
+    except Exception:
         db.rollback()
-        raise e
+        raise
+    
+    stats["elapsed"] = time.perf_counter() - started
+    stats["members_per_sec"] = stats["members"] / stats["elapsed"] if stats["elapsed"] else 0.0
+    logger.info(
+        f"Generated {stats['members']} members in {stats['families']} families "
+        f"({stats['members_per_sec']:.0f} members/sec, seed {seed})"
+    )
+    return stats
+
+def generate_sample_data(db, count=50):
+    return generate_dataset(db, samaj_count=count // 5, families_per_samaj=5, members_per_family=5)
 
 if __name__ == "__main__":
     data = generate_sample_data(50)
@@ -0,0 +1,176 @@
+# Author: SANJAY KR
+import bisect
+import math
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, Tuple
+
+# Latency buckets in seconds, from sub-millisecond handler work up to slow Twilio calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUANTILES = (0.5, 0.95, 0.99)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(labels: Dict[str, object]) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Labels, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    pairs = labels + extra
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """Cumulative bucket histogram plus a window of recent samples for quantiles"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, window: int = 2048):
+        self.buckets = tuple(buckets) + (math.inf,)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.recent = deque(maxlen=window)
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.recent.append(value)
+
+    def quantiles(self) -> Dict[float, float]:
+        samples = sorted(self.recent)
+        if not samples:
+            return {q: 0.0 for q in QUANTILES}
+        return {q: samples[min(len(samples) - 1, int(q * len(samples)))] for q in QUANTILES}
+
+
+class MetricsRegistry:
+    """In-process counters, latency histograms and gauges rendered in Prometheus text format.
+
+    Each gunicorn worker keeps its own registry; Prometheus sums them per instance.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[Labels, float]] = {}
+        self._histograms: Dict[str, Dict[Labels, Histogram]] = {}
+        self._help: Dict[str, str] = {}
+        self._gauge_sources: Dict[str, Callable[[], Dict[str, float]]] = {}
+
+    def describe(self, name: str, help_text: str) -> None:
+        self._help[name] = help_text
+
+    def increment(self, name: str, amount: float = 1, **labels) -> None:
+        key = _labels(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + amount
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        self._observe(name, _labels(labels), value)
+
+    def _observe(self, name: str, key: Labels, value: float) -> None:
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram()
+            histogram.observe(value)
+
+    def quantiles(self, name: str, **labels) -> Dict[float, float]:
+        """Recent p50/p95/p99 of a histogram (zeros if nothing was observed)"""
+        with self._lock:
+            histogram = self._histograms.get(name, {}).get(_labels(labels))
+            return histogram.quantiles() if histogram else {q: 0.0 for q in QUANTILES}
+
+    def span(self, stage: str, name: str = "webhook_stage_seconds") -> "_Span":
+        """Context manager timing the enclosed block and recording it under stage"""
+        return _Span(self, name, (("stage", stage),))
+
+    def register_gauges(self, prefix: str, source: Callable[[], Dict[str, float]]) -> None:
+        """Expose each key of source() as a gauge named prefix_key at scrape time"""
+        self._gauge_sources[prefix] = source
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                self._header(lines, name, "counter")
+                for labels, value in sorted(series.items()):
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+            for name, series in sorted(self._histograms.items()):
+                self._header(lines, name, "histogram")
+                for labels, histogram in sorted(series.items()):
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        cumulative += count
+                        le = (("le", _format_value(bound)),)
+                        lines.append(f"{name}_bucket{_format_labels(labels, le)} {cumulative}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(histogram.sum)}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+
+                quantile_name = f"{name}_quantile"
+                self._header(lines, quantile_name, "gauge")
+                for labels, histogram in sorted(series.items()):
+                    for q, value in histogram.quantiles().items():
+                        quantile = (("quantile", str(q)),)
+                        lines.append(f"{quantile_name}{_format_labels(labels, quantile)} {_format_value(value)}")
+
+        for prefix, source in sorted(self._gauge_sources.items()):
+            try:
+                values = source()
+            except Exception:
+                continue
+            for key, value in sorted(values.items()):
+                name = f"{prefix}_{key}"
+                self._header(lines, name, "gauge")
+                lines.append(f"{name} {_format_value(value)}")
+
+        return "\n".join(lines) + "\n"
+
+    def _header(self, lines, name: str, metric_type: str) -> None:
+        if name in self._help:
+            lines.append(f"# HELP {name} {self._help[name]}")
+        lines.append(f"# TYPE {name} {metric_type}")
+
+
+class _Span:
+    __slots__ = ("registry", "name", "key", "started")
+
+    def __init__(self, registry: MetricsRegistry, name: str, key: Labels):
+        self.registry = registry
+        self.name = name
+        self.key = key
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.registry._observe(self.name, self.key, time.perf_counter() - self.started)
+        return False
+
+
+metrics = MetricsRegistry()
+metrics.describe("webhook_stage_seconds", "Time spent in each stage of the WhatsApp webhook pipeline")
+metrics.describe("webhook_stage_seconds_quantile", "p50/p95/p99 of recent webhook stage timings")
+metrics.describe("conversation_step_total", "Messages handled per conversation step and outcome")
@@ -0,0 +1,110 @@
+# Author: SANJAY KR
+import threading
+from collections import OrderedDict
+from functools import wraps
+from typing import Dict, Hashable, Optional, Tuple
+
+from flask import Response, current_app, request
+
+from .metrics import metrics
+
+
+class ResponseCache:
+    """Per-process LRU of serialized response bodies, each stored with the ETag it was built
+    under. An entry is only served while the ETag still matches, so a write that bumps a
+    table version makes the old entries unreachable without any invalidation."""
+
+    def __init__(self, max_entries: int = 256, max_bytes: int = 64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._size = 0
+        self._entries: "OrderedDict[Hashable, Tuple[str, bytes, str]]" = OrderedDict()
+        self._mutex = threading.Lock()
+
+    def get(self, key: Hashable, etag: str) -> Optional[Tuple[bytes, str]]:
+        """Body and mimetype cached for the key under this ETag"""
+        with self._mutex:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != etag:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1], entry[2]
+
+    def put(self, key: Hashable, etag: str, body: bytes, mimetype: str) -> None:
+        if len(body) > self.max_bytes:
+            return
+        with self._mutex:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= len(old[1])
+            self._entries[key] = (etag, body, mimetype)
+            self._size += len(body)
+            while len(self._entries) > self.max_entries or self._size > self.max_bytes:
+                _, (_, evicted, _) = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+    def clear(self) -> None:
+        with self._mutex:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self._entries), "bytes": self._size, "hits": self.hits, "misses": self.misses}
+
+
+def get_response_cache() -> ResponseCache:
+    app = current_app._get_current_object()
+    if "response_cache" not in app.extensions:
+        cache = ResponseCache(
+            max_entries=int(app.config.get("ADMIN_RESPONSE_CACHE_SIZE", 256)),
+            max_bytes=int(app.config.get("ADMIN_RESPONSE_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+        )
+        app.extensions["response_cache"] = cache
+        metrics.register_gauges("admin_response_cache", cache.stats)
+    return app.extensions["response_cache"]
+
+
+def versioned_response(*tables: str):
+    """Serve a GET view with an ETag built from the versions of the tables it reads (and a
+    Last-Modified for information). A request whose If-None-Match still matches gets 304;
+    otherwise the body comes from the response cache when it was built under the same
+    versions, and from the view when not. Either way the request costs one query on
+    table_version."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            from .. import db
+            from ..models.versions import read_versions
+            versions = read_versions(db.session, tables)
+            etag = ".".join(f"{name}{versions[name][0]}" for name in tables)
+            written = [updated_at for _, updated_at in versions.values() if updated_at is not None]
+            last_modified = max(written).replace(microsecond=0) if written else None
+
+            # Only the ETag validates: Last-Modified has one-second resolution, so a write in
+            # the same second as an earlier read would still match If-Modified-Since
+            if request.if_none_match.contains(etag):
+                response = Response(status=304)
+            else:
+                cache = get_response_cache()
+                key = (request.endpoint, tuple(sorted(kwargs.items())),
+                       tuple(sorted(request.args.items(multi=True))))
+                cached = cache.get(key, etag)
+                if cached is not None:
+                    response = Response(cached[0], mimetype=cached[1])
+                else:
+                    response = current_app.make_response(view(*args, **kwargs))
+                    if response.status_code != 200:
+                        return response
+                    cache.put(key, etag, response.get_data(), response.mimetype)
+            response.set_etag(etag)
+            if last_modified is not None:
+                response.last_modified = last_modified
+            # Browsers revalidate every time, so a write is seen on the next load
+            response.headers["Cache-Control"] = "private, no-cache"
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,94 @@
+# Author: SANJAY KR
+import time
+from typing import Any, Dict, List
+
+from flask import Flask
+from sqlalchemy import inspect, text
+
+SAMPLE_SAMAJ_COUNT = 50
+
+
+def prepare_database(app: Flask, sample_data: bool = True) -> None:
+    """Create missing tables, including those of the WhatsApp stores, and fill an empty
+    database with sample data"""
+    from .. import db
+    from ..models.family import Samaj
+    from ..models.analytics import rebuild_member_stats
+    from ..models.tags import backfill_member_tags
+
+    with app.app_context():
+        existing_tables = inspect(db.engine).get_table_names()
+        db.create_all()
+        for store in _sql_stores(app):
+            store.create_table()
+        if not existing_tables:
+            app.logger.info("Database tables created successfully")
+        elif "member_stat" not in existing_tables:
+            # Members added before the analytics counters existed
+            counted = rebuild_member_stats(db.session)
+            app.logger.info(f"Analytics counters built from {counted} members")
+        if existing_tables and "member_tag" not in existing_tables:
+            # Members added before the tag tables existed
+            tagged = backfill_member_tags(db.session)
+            app.logger.info(f"Member tags built for {tagged} members")
+        if sample_data and db.session.query(Samaj).first() is None:
+            app.logger.info("Generating sample data...")
+            try:
+                from .generate_sample_data import generate_sample_data
+                generate_sample_data(db.session, SAMPLE_SAMAJ_COUNT)
+            except Exception as e:
+                app.logger.error(f"Error during sample data generation: {str(e)}")
+                db.session.rollback()
+                raise
+            app.logger.info("Sample data generated successfully")
+
+
+def _sql_stores(app: Flask) -> List[Any]:
+    # Session and MessageSid stores created with LAZY_STARTUP leave their tables to preflight
+    service = app.extensions.get("whatsapp_service")
+    return service.sql_stores() if service is not None else []
+
+
+def check_database(app: Flask) -> Dict[str, Any]:
+    """Database reachability and any model or store tables it is missing"""
+    from .. import db
+
+    with app.app_context(), db.engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+        missing = set(db.metadata.tables) - set(inspect(conn).get_table_names())
+    for store in _sql_stores(app):
+        if not inspect(store.engine).has_table(store.table.name):
+            missing.add(store.table.name)
+    missing = sorted(missing)
+    result: Dict[str, Any] = {"ok": not missing}
+    if missing:
+        result["error"] = f"missing tables: {', '.join(missing)}"
+    return result
+
+
+def check_twilio(app: Flask) -> Dict[str, Any]:
+    """Twilio credentials accepted by the API (skipped in development mode)"""
+    service = app.extensions.get("whatsapp_service")
+    if service is None:
+        return {"ok": False, "error": "WhatsApp service not initialized"}
+    if service.dev_mode:
+        return {"ok": True, "skipped": "development mode"}
+    service.verify_twilio()
+    return {"ok": True}
+
+
+CHECKS = {"database": check_database, "twilio": check_twilio}
+
+
+def run_checks(app: Flask) -> Dict[str, Dict[str, Any]]:
+    """Run the checks LAZY_STARTUP leaves out of create_app; each reports ok, error and seconds"""
+    results = {}
+    for name, check in CHECKS.items():
+        started = time.perf_counter()
+        try:
+            result = check(app)
+        except Exception as e:
+            result = {"ok": False, "error": str(e)}
+        result["seconds"] = round(time.perf_counter() - started, 4)
+        results[name] = result
+    return results
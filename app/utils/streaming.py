@@ -0,0 +1,15 @@
+# Author: SANJAY KR
+import zlib
+from typing import Iterable, Iterator
+
+def gzip_chunks(chunks: Iterable[str], level: int = 6) -> Iterator[bytes]:
+    """Gzip a stream of text chunks incrementally, without buffering the whole body"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode("utf-8"))
+        if data:
+            yield data
+    yield compressor.flush()
+
+def accepts_gzip(request) -> bool:
+    return "gzip" in request.accept_encodings
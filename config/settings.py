@@ -8,21 +8,79 @@ class Config:
     # Flask Configuration
     DEBUG = True
     TESTING = False
+    LAZY_STARTUP = os.getenv("LAZY_STARTUP", "false").lower() in ("1", "true", "yes")  # Leave schema and Twilio checks to `flask preflight`
     
     # JWT Configuration
     JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY", "development-secret-key-do-not-use-in-production")
     JWT_ALGORITHM = "HS256"
     JWT_ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("JWT_ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
+    JWT_CACHE_SIZE = int(os.getenv("JWT_CACHE_SIZE", "1024"))  # Verified tokens kept until they expire
     
     # Database Configuration
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     SQLALCHEMY_DATABASE_URI = os.getenv("DATABASE_URL", "postgresql://postgres:postgres@db:5432/whatsapp_bot")
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+    DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+    DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+    DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+    DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+    DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0"))  # PostgreSQL only, 0 disables
     
     # Twilio Configuration
     TWILIO_ACCOUNT_SID = os.getenv("TWILIO_ACCOUNT_SID")
     TWILIO_AUTH_TOKEN = os.getenv("TWILIO_AUTH_TOKEN")
     TWILIO_PHONE_NUMBER = "whatsapp:+14155238886"
     
+    # Outbound message queue (0 workers sends synchronously)
+    OUTBOUND_QUEUE_WORKERS = int(os.getenv("OUTBOUND_QUEUE_WORKERS", "4"))
+    OUTBOUND_QUEUE_SIZE = int(os.getenv("OUTBOUND_QUEUE_SIZE", "1000"))
+    OUTBOUND_MAX_RETRIES = int(os.getenv("OUTBOUND_MAX_RETRIES", "3"))
+    OUTBOUND_RETRY_BACKOFF = float(os.getenv("OUTBOUND_RETRY_BACKOFF", "0.5"))
+    OUTBOUND_RESERVE_TIMEOUT = float(os.getenv("OUTBOUND_RESERVE_TIMEOUT", "2"))
+    
+    # Twilio sends per second per sending number, shared by replies and broadcasts in every
+    # worker; kept in SEND_RATE_STORE (defaults to SESSION_STORE)
+    SEND_RATE_PER_SECOND = float(os.getenv("SEND_RATE_PER_SECOND", "10"))
+    SEND_RATE_BURST = os.getenv("SEND_RATE_BURST")
+    SEND_RATE_STORE = os.getenv("SEND_RATE_STORE")
+    
+    # Broadcast jobs: sender threads per job, members read per page, the country code given
+    # to 10-digit mobile numbers, and how long a job's worker may go silent before another
+    # worker takes the job over
+    BROADCAST_WORKERS = int(os.getenv("BROADCAST_WORKERS", "16"))
+    BROADCAST_BATCH_SIZE = int(os.getenv("BROADCAST_BATCH_SIZE", "500"))
+    BROADCAST_COUNTRY_CODE = os.getenv("BROADCAST_COUNTRY_CODE", "91")
+    BROADCAST_LEASE_SECONDS = float(os.getenv("BROADCAST_LEASE_SECONDS", "60"))
+    
+    # ASGI entry point (app.asgi): webhook DB threads, threads for other routes, concurrent sends
+    ASGI_DB_CONCURRENCY = int(os.getenv("ASGI_DB_CONCURRENCY", "10"))
+    ASGI_WSGI_THREADS = int(os.getenv("ASGI_WSGI_THREADS", "8"))
+    ASGI_OUTBOUND_CONCURRENCY = int(os.getenv("ASGI_OUTBOUND_CONCURRENCY", "64"))
+    
+    # Conversation session store: memory, sqlite or postgres
+    SESSION_STORE = os.getenv("SESSION_STORE", "memory")
+    SESSION_STORE_URL = os.getenv("SESSION_STORE_URL")
+    # The postgres stores' own connection pool, one connection per message in flight
+    SESSION_STORE_POOL_SIZE = int(os.getenv("SESSION_STORE_POOL_SIZE", "5"))
+    SESSION_STORE_MAX_OVERFLOW = int(os.getenv("SESSION_STORE_MAX_OVERFLOW", "10"))
+    SESSION_TTL_SECONDS = int(os.getenv("SESSION_TTL_SECONDS", "3600"))
+    SESSION_MAX_SESSIONS = int(os.getenv("SESSION_MAX_SESSIONS", "10000"))
+    SESSION_SWEEP_INTERVAL = int(os.getenv("SESSION_SWEEP_INTERVAL", "60"))
+    SESSION_LOCK_STRIPES = int(os.getenv("SESSION_LOCK_STRIPES", "1024"))
+    
+    # Replies to recent Twilio MessageSids, replayed when Twilio retries a webhook
+    MESSAGE_DEDUP_STORE = os.getenv("MESSAGE_DEDUP_STORE")
+    MESSAGE_DEDUP_TTL_SECONDS = int(os.getenv("MESSAGE_DEDUP_TTL_SECONDS", "3600"))
+    MESSAGE_DEDUP_MAX_ENTRIES = int(os.getenv("MESSAGE_DEDUP_MAX_ENTRIES", "10000"))
+    
+    # Per-process cache of Samaj and family-head ids used by the registration flow
+    FAMILY_DIRECTORY_TTL_SECONDS = int(os.getenv("FAMILY_DIRECTORY_TTL_SECONDS", "300"))
+    FAMILY_DIRECTORY_MAX_ENTRIES = int(os.getenv("FAMILY_DIRECTORY_MAX_ENTRIES", "50000"))
+    
+    # Per-process cache of admin read responses, validated against table_version
+    ADMIN_RESPONSE_CACHE_SIZE = int(os.getenv("ADMIN_RESPONSE_CACHE_SIZE", "256"))
+    ADMIN_RESPONSE_CACHE_MAX_BYTES = int(os.getenv("ADMIN_RESPONSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+    
     # Admin Configuration
     ADMIN_USERNAME = os.getenv("ADMIN_USERNAME", "admin")
     ADMIN_PASSWORD = os.getenv("ADMIN_PASSWORD", "admin")
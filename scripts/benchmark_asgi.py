@@ -0,0 +1,127 @@
+# Author: SANJAY KR
+"""Webhook concurrency: sync Flask workers vs the ASGI entry point (app.asgi).
+
+Each simulated user sends the first steps of the registration flow; a run ends when
+every reply has been delivered to an in-process FakeTwilioClient with --latency per send.
+The sync path serves requests on --workers threads, like gunicorn's sync workers, and
+sends replies from the threaded OutboundQueue; the ASGI path keeps up to the given
+concurrency in flight on one event loop and sends replies from coroutines.
+
+    python scripts/benchmark_asgi.py --users 400 --concurrency 4 16 64 256 --latency 0.1
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+from urllib.parse import urlencode
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+MESSAGES = ["start", "Shah Samaj", "Ramesh Shah"]
+WEBHOOK = "/api/v1/whatsapp/webhook"
+
+
+def form(user: int, step: int) -> dict:
+    return {"From": f"whatsapp:+918{user:09d}", "To": "whatsapp:+14155238886", "Body": MESSAGES[step],
+            "MessageSid": f"SMbench{user:09d}{step}", "NumMedia": "0"}
+
+
+def make_app(args):
+    from app import create_app
+    from app.services.fake_twilio import FakeTwilioClient
+
+    app = create_app()
+    service = app.extensions["whatsapp_service"]
+    service.client = FakeTwilioClient(latency_seconds=args.latency, seed=1)
+    return app, service
+
+
+def run_sync(args, concurrency: int, users: range) -> float:
+    app, service = make_app(args)
+    client = app.test_client()
+
+    def converse(user: int) -> None:
+        for step in range(len(MESSAGES)):
+            client.post(WEBHOOK, data=form(user, step))
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(min(concurrency, args.workers)) as pool:
+        list(pool.map(converse, users))
+    service.outbound_queue.join()
+    elapsed = time.perf_counter() - started
+    service.outbound_queue.close()
+    return elapsed
+
+
+def run_async(args, concurrency: int, users: range) -> float:
+    from app.asgi import create_asgi_app
+
+    app, service = make_app(args)
+    asgi = create_asgi_app(app)
+
+    async def post(user: int, step: int) -> None:
+        events = [{"type": "http.request", "body": urlencode(form(user, step)).encode()}]
+
+        async def receive():
+            return events.pop(0)
+
+        async def send(event):
+            pass
+
+        await asgi({"type": "http", "method": "POST", "path": WEBHOOK, "query_string": b"",
+                    "headers": [(b"content-type", b"application/x-www-form-urlencoded")]}, receive, send)
+
+    async def main() -> float:
+        await asgi.startup()
+        limit = asyncio.Semaphore(concurrency)
+
+        async def converse(user: int) -> None:
+            async with limit:
+                for step in range(len(MESSAGES)):
+                    await post(user, step)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(converse(user) for user in users))
+        await service.outbound_queue.join()
+        elapsed = time.perf_counter() - started
+        await asgi.shutdown()
+        return elapsed
+
+    return asyncio.run(main())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[4, 16, 64, 256],
+                        help="Conversations in flight at once")
+    parser.add_argument("--workers", type=int, default=4, help="Sync workers (docker-compose runs gunicorn with 4)")
+    parser.add_argument("--latency", type=float, default=0.1, help="Simulated Twilio API latency in seconds")
+    args = parser.parse_args()
+
+    os.environ["FLASK_ENV"] = "development"
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/benchmark_asgi.db")
+    # The fake Twilio client has no throughput limit to stay under
+    os.environ.setdefault("SEND_RATE_PER_SECOND", "0")
+    logging.disable(logging.CRITICAL)
+
+    messages = args.users * len(MESSAGES)
+    print(f"{args.users} users, {messages} messages, {args.latency * 1000:.0f} ms per Twilio send")
+    print(f"{'concurrency':>12}{'sync msg/s':>14}{'asgi msg/s':>14}")
+    offset = 0
+    for concurrency in args.concurrency:
+        results: List[float] = []
+        for run in (run_sync, run_async):
+            # Fresh phone numbers for every run, so each starts a new conversation
+            results.append(messages / run(args, concurrency, range(offset, offset + args.users)))
+            offset += args.users
+        print(f"{concurrency:>12}{results[0]:>14,.0f}{results[1]:>14,.0f}")
+
+
+if __name__ == "__main__":
+    main()
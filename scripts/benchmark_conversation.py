@@ -0,0 +1,56 @@
+# Author: SANJAY KR
+"""Microbenchmark for WhatsAppService.handle_message.
+
+Walks simulated users through every data-collection step up to the confirmation
+prompt (no database writes) and reports messages/sec.
+
+    python scripts/benchmark_conversation.py --users 2000
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from flask import Flask
+from app.services.whatsapp_service import WhatsAppService
+
+HEAD_ANSWERS = [
+    "Test Samaj", "John Doe", "Head", "Male", "45", "O+", "9876543210", "skip",
+    "Graduate", "Business", "Married", "12 Sample Street", "john@example.com",
+    "01/01/1980", "skip", "Surat", "Pune", "Gujarati, Hindi", "Teaching",
+    "Music", "9876543211", "Married", "skip", "Vegetarian", "skip", "IT", "skip",
+]
+
+
+def run(users: int) -> float:
+    app = Flask(__name__)
+    service = WhatsAppService()
+    db = object()  # No step before confirmation touches the database
+    messages = 0
+    with app.app_context():
+        started = time.perf_counter()
+        for i in range(users):
+            phone = f"+9190000{i:05d}"
+            service.handle_message(phone, "start", db)
+            messages += 1
+            for answer in HEAD_ANSWERS:
+                service.handle_message(phone, answer, db)
+                messages += 1
+        elapsed = time.perf_counter() - started
+    return messages / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    best = max(run(args.users) for _ in range(args.rounds))
+    print(f"{args.users} users x {len(HEAD_ANSWERS) + 1} messages: {best:,.0f} messages/sec")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+# Author: SANJAY KR
+"""Connection pool behaviour under concurrent webhook load.
+
+Runs the load_test_webhook registration flow at each concurrency level against one app and
+samples the pool while it runs. After every round all connections must be back in the
+pool (checked_out == 0); a request that leaked its session would leave one checked out.
+
+    python scripts/benchmark_db_pool.py --users 300 --concurrency 4 16 32 --pool-size 5 --max-overflow 5
+
+Uses a throwaway SQLite database unless --database-url is given.
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.dirname(__file__))
+
+
+class PoolSampler(threading.Thread):
+    """Records the most connections checked out at once"""
+
+    def __init__(self, engine, interval: float = 0.001):
+        super().__init__(daemon=True)
+        self.engine = engine
+        self.interval = interval
+        self.peak_checked_out = 0
+        self.peak_overflow = 0
+        self._stop_event = threading.Event()
+
+    def run(self) -> None:
+        from app.models.base import pool_stats
+        while not self._stop_event.wait(self.interval):
+            stats = pool_stats(self.engine)
+            self.peak_checked_out = max(self.peak_checked_out, stats["checked_out"])
+            self.peak_overflow = max(self.peak_overflow, stats["overflow"])
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=300, help="Simulated phone numbers per round")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[4, 16, 32])
+    parser.add_argument("--pool-size", type=int, default=5)
+    parser.add_argument("--max-overflow", type=int, default=5)
+    parser.add_argument("--database-url", help="Defaults to a temporary SQLite database")
+    args = parser.parse_args()
+
+    os.environ["FLASK_ENV"] = "development"
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{tempfile.mkdtemp()}/benchmark_pool.db"
+    os.environ["DB_POOL_SIZE"] = str(args.pool_size)
+    os.environ["DB_MAX_OVERFLOW"] = str(args.max_overflow)
+    # The fake Twilio client has no throughput limit to stay under
+    os.environ.setdefault("SEND_RATE_PER_SECOND", "0")
+    logging.disable(logging.CRITICAL)
+
+    from app import create_app, db
+    from app.models.base import pool_stats
+    from app.services.conversation_flow import REGISTRATION_FLOW
+    from app.utils.metrics import metrics
+    from load_test_webhook import LoadTest
+
+    app = create_app()
+    with app.app_context():
+        engine = db.engine
+    service = app.extensions["whatsapp_service"]
+
+    print(f"pool_size={args.pool_size} max_overflow={args.max_overflow}, {args.users} users per round")
+    print(f"{'concurrency':>12}{'msg/s':>9}{'peak out':>10}{'peak ovf':>10}{'wait p50 ms':>13}"
+          f"{'wait p99 ms':>13}{'out after':>11}{'errors':>8}")
+    leaked = False
+    for round_number, concurrency in enumerate(args.concurrency):
+        metrics.reset()
+        # Fresh phone numbers and family heads for each round
+        load_args = SimpleNamespace(users=args.users, concurrency=concurrency, family_size=3, samaj=10,
+                                    first_user=round_number * args.users)
+        load = LoadTest(app, load_args, list(REGISTRATION_FLOW.fields))
+        sampler = PoolSampler(engine)
+        sampler.start()
+        elapsed = load.run()
+        sampler.stop()
+        service.outbound_queue.join()
+        stats = pool_stats(engine)
+        wait = metrics.quantiles("db_pool_wait_seconds")
+        leaked = leaked or stats["checked_out"] != 0
+        print(f"{concurrency:>12}{load.messages / elapsed:>9,.0f}{sampler.peak_checked_out:>10}"
+              f"{sampler.peak_overflow:>10}{wait[0.5] * 1000:>13.3f}{wait[0.99] * 1000:>13.3f}"
+              f"{stats['checked_out']:>11}{load.errors:>8}")
+    print("connection leak detected" if leaked else "no connections leaked")
+    sys.exit(1 if leaked else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+# Author: SANJAY KR
+"""Outbound send throughput: inline Twilio calls vs the background OutboundQueue.
+
+Uses the local FakeTwilioClient, so no Twilio account or network is needed.
+
+    python scripts/benchmark_outbound.py --messages 2000 --latency 0.02 --failure-rate 0.05
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.services.fake_twilio import FakeTwilioClient
+from app.services.outbound_queue import OutboundQueue
+
+SYSTEM_NUMBER = "whatsapp:+14155238886"
+
+
+def destinations(count: int, phones: int):
+    return [f"whatsapp:+9190000{i % phones:05d}" for i in range(count)]
+
+
+def run_inline(args) -> None:
+    client = FakeTwilioClient(latency_seconds=args.latency, seed=1)
+    started = time.perf_counter()
+    for to in destinations(args.messages, args.phones):
+        client.messages.create(from_=SYSTEM_NUMBER, body="Please enter your age:", to=to)
+    elapsed = time.perf_counter() - started
+    print(f"inline:  {args.messages / elapsed:,.0f} messages/sec, "
+          f"{elapsed / args.messages * 1000:.3f} ms blocked per webhook")
+
+
+def run_queued(args) -> None:
+    client = FakeTwilioClient(latency_seconds=args.latency, failure_rate=args.failure_rate, seed=1)
+    outbound = OutboundQueue(
+        lambda from_, to, body: client.messages.create(from_=from_, body=body, to=to),
+        workers=args.workers, max_pending=args.messages * 2, backoff_seconds=args.latency
+    )
+    started = time.perf_counter()
+    for to in destinations(args.messages, args.phones):
+        outbound.enqueue(to, SYSTEM_NUMBER, "Please enter your age:")
+    enqueued = time.perf_counter() - started
+    outbound.join()
+    elapsed = time.perf_counter() - started
+    outbound.close()
+    print(f"queued:  {args.messages / elapsed:,.0f} messages/sec, "
+          f"{enqueued / args.messages * 1000:.3f} ms blocked per webhook, {outbound.stats()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--phones", type=int, default=500)
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=0.02, help="Simulated Twilio API latency in seconds")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Fraction of sends failing with HTTP 429")
+    args = parser.parse_args()
+    logging.getLogger("app.services.outbound_queue").setLevel(logging.ERROR)
+
+    run_inline(args)
+    run_queued(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+# Author: SANJAY KR
+"""End-to-end load test for the WhatsApp webhook.
+
+Simulated users walk the whole registration flow through POST /api/v1/whatsapp/webhook
+with Twilio-style form payloads, then confirm. Users are grouped into families: the head
+registers first, then the spouse and children name that head. Replies go out through
+the outbound queue to an in-process FakeTwilioClient, so no Twilio account is needed.
+
+    python scripts/load_test_webhook.py --users 500 --concurrency 16 --family-size 3
+
+Uses a throwaway SQLite database unless --database-url is given; SQLite serializes
+writes, so use PostgreSQL to measure concurrency.
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from queue import Empty, Queue
+from typing import Dict, List, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+ROLES = [("Head", "Male", "45", "Married"), ("Spouse", "Female", "42", "Married")]
+CHILD = ("Child", "Male", "12", "Single")
+SYSTEM_NUMBER = "whatsapp:+14155238886"
+
+
+def conversation(fields: List[str], user: int, family: int, position: int, samaj: str) -> List[Tuple[str, str]]:
+    """(step label, message) pairs for one user's registration, ending with the confirmation"""
+    role, gender, age, status = ROLES[position] if position < len(ROLES) else CHILD
+    head = f"Load Head {family}"
+    answers = {
+        "samaj": samaj, "name": head if role == "Head" else f"Load User {user}", "family_role": role,
+        "family_head": head, "gender": gender, "age": age, "blood_group": "O+",
+        "mobile_1": f"9{user:09d}", "mobile_2": "skip", "education": "Graduate", "occupation": "Business",
+        "marital_status": status, "address": "12 Sample Street", "email": f"user{user}@example.com",
+        "birth_date": "01/01/1980", "anniversary_date": "skip", "native_place": "Surat", "current_city": "Pune",
+        "languages_known": "Gujarati, Hindi", "skills": "Teaching", "hobbies": "Music",
+        "emergency_contact": "9876543211", "relationship_status": status, "medical_conditions": "skip",
+        "dietary_preferences": "Vegetarian", "social_media_handles": "skip", "profession_category": "IT",
+        "volunteer_interests": "skip",
+    }
+    steps = [field for field in fields if role != "Head" or field != "family_head"]
+    return [("start", "start")] + [(field, answers[field]) for field in steps] + [("confirm", "yes")]
+
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else 0.0
+
+
+class LoadTest:
+    def __init__(self, app, args, fields: List[str]):
+        self.app = app
+        self.args = args
+        self.fields = fields
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.messages = 0
+        self.errors = 0
+        self.error_samples: List[str] = []
+        self.completed = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def families(self) -> "Queue":
+        families = Queue()
+        size, start = self.args.family_size, self.args.first_user
+        end = start + self.args.users
+        for first in range(start, end, size):
+            families.put((first // size, range(first, min(first + size, end))))
+        return families
+
+    def worker(self, families: "Queue") -> None:
+        client = self.app.test_client()
+        while True:
+            try:
+                family, users = families.get_nowait()
+            except Empty:
+                return
+            samaj = f"Load Samaj {family % self.args.samaj}"
+            # A family's members register one after another, after their head
+            for position, user in enumerate(users):
+                messages = conversation(self.fields, user, family, position, samaj)
+                self.register(client, f"whatsapp:+918{user:09d}", messages)
+
+    def register(self, client, sender: str, messages: List[Tuple[str, str]]) -> None:
+        timings, failures, reply = [], [], ""
+        for label, body in messages:
+            started = time.perf_counter()
+            try:
+                response = client.post("/api/v1/whatsapp/webhook", data={
+                    "From": sender, "To": SYSTEM_NUMBER, "Body": body,
+                    "MessageSid": f"SMload{sender[-10:]}{len(timings):04d}", "NumMedia": "0"
+                })
+                ok = response.status_code == 200
+                reply = response.get_json()["message"] if ok else response.get_data(as_text=True)
+            except Exception as e:
+                ok, reply = False, str(e)
+            timings.append((label, time.perf_counter() - started))
+            if not ok:
+                failures.append(f"{label}: {reply[:120]}")
+        # The reply to the confirmation tells whether the member was saved
+        registered = reply.startswith("Thank you!")
+        samples = failures if registered else failures + [f"{sender} not registered: {reply[:120]}"]
+        with self._lock:
+            for label, elapsed in timings:
+                self.latencies[label].append(elapsed)
+            self.messages += len(timings)
+            self.errors += len(failures)
+            if registered:
+                self.completed += 1
+            else:
+                self.rejected += 1
+            self.error_samples.extend(samples[:5 - len(self.error_samples)])
+
+    def run(self) -> float:
+        families = self.families()
+        threads = [threading.Thread(target=self.worker, args=(families,)) for _ in range(self.args.concurrency)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return time.perf_counter() - started
+
+    def report(self, elapsed: float, twilio) -> None:
+        all_latencies = [value for values in self.latencies.values() for value in values]
+        print(f"{self.args.users} users, {self.args.concurrency} concurrent: {self.messages} messages "
+              f"in {elapsed:.2f}s ({self.messages / elapsed:,.0f} messages/sec)")
+        print(f"registrations completed: {self.completed}, not completed: {self.rejected}")
+        print(f"HTTP errors: {self.errors} ({self.errors / max(self.messages, 1):.2%})")
+        print(f"fake Twilio sends: {twilio.sent_count} sent, {twilio.failed_count} throttled")
+        print(f"\n{'step':<22}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+        labels = ["start"] + self.fields + ["confirm"]
+        for label, values in [(label, self.latencies[label]) for label in labels] + [("all", all_latencies)]:
+            print(f"{label:<22}{len(values):>8}" + "".join(
+                f"{percentile(values, q) * 1000:>10.2f}" for q in (0.5, 0.95, 0.99)
+            ))
+        for sample in self.error_samples:
+            print(f"  e.g. {sample}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=200, help="Simulated phone numbers")
+    parser.add_argument("--concurrency", type=int, default=8, help="Conversations in flight at once")
+    parser.add_argument("--family-size", type=int, default=3, help="Users per family (head, spouse, children)")
+    parser.add_argument("--samaj", type=int, default=10, help="Number of Samaj the families are spread over")
+    parser.add_argument("--first-user", type=int, default=0, help="Number of the first simulated user, to rerun "
+                        "against the same database with new phones")
+    parser.add_argument("--database-url", help="Defaults to a temporary SQLite database")
+    parser.add_argument("--latency", type=float, default=0.0, help="Simulated Twilio API latency in seconds")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Fraction of sends failing with HTTP 429")
+    args = parser.parse_args()
+
+    os.environ["FLASK_ENV"] = "development"
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{tempfile.mkdtemp()}/load_test.db"
+    # The fake Twilio client has no throughput limit to stay under
+    os.environ.setdefault("SEND_RATE_PER_SECOND", "0")
+    logging.disable(logging.CRITICAL)
+
+    from app import create_app
+    from app.services.fake_twilio import FakeTwilioClient
+    from app.services.conversation_flow import REGISTRATION_FLOW
+
+    app = create_app()
+    service = app.extensions["whatsapp_service"]
+    service.client = FakeTwilioClient(latency_seconds=args.latency, failure_rate=args.failure_rate, seed=1)
+
+    test = LoadTest(app, args, list(REGISTRATION_FLOW.fields))
+    elapsed = test.run()
+    if service.outbound_queue:
+        service.outbound_queue.join()
+    test.report(elapsed, service.client)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,15 @@
 # Author: SANJAY KR
 import pytest
 import os
+from contextlib import contextmanager
 from dotenv import load_dotenv
+from flask import Flask
+from sqlalchemy import event, text
 
 load_dotenv()
 
+CSV_HEADER = "Samaj,Family,Name,Gender,Age,Blood Group,Family Role,Family Head\n"
+
 @pytest.fixture(autouse=True)
 def env_setup():
     """Setup environment variables for testing"""
@@ -12,3 +17,87 @@ def env_setup():
     os.environ['JWT_SECRET_KEY'] = 'test-secret-key'
     os.environ['ADMIN_USERNAME'] = 'admin'
     os.environ['ADMIN_PASSWORD'] = 'admin'
+
+@pytest.fixture
+def database_uri():
+    """Database of the `app` fixture; modules override it, e.g. with a file for threaded tests"""
+    return "sqlite://"
+
+@pytest.fixture
+def app(database_uri):
+    """Flask app with the admin routes and every table created, inside an app context"""
+    from app import db
+    from app.routes.admin import admin_bp
+    app = Flask(__name__)
+    app.config.update(
+        SQLALCHEMY_DATABASE_URI=database_uri,
+        JWT_SECRET_KEY="test-secret-key",
+        JWT_ALGORITHM="HS256"
+    )
+    db.init_app(app)
+    app.register_blueprint(admin_bp, url_prefix="/api/v1/admin")
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+@pytest.fixture
+def auth_headers(app):
+    from app.controllers.auth_controller import create_access_token
+    return {"Authorization": f"Bearer {create_access_token({'sub': 'admin'})}"}
+
+def seed(samaj_count: int, families_per_samaj: int) -> None:
+    """Add samaj with families of a head, spouse and child each"""
+    from app import db
+    from app.models.family import Samaj, Family, Member
+    offset = db.session.query(Samaj).count()
+    for s in range(offset, offset + samaj_count):
+        samaj = Samaj(name=f"Samaj {s}")
+        db.session.add(samaj)
+        db.session.flush()
+        for f in range(families_per_samaj):
+            family = Family(name=f"Family {s}-{f}", samaj_id=samaj.id)
+            db.session.add(family)
+            db.session.flush()
+            for name, role, age in (("Head", "Head", 45), ("Spouse", "Spouse", 42), ("Child", "Child", 12)):
+                db.session.add(Member(
+                    samaj_id=samaj.id, family_id=family.id, name=f"{name} {s}-{f}",
+                    family_role=role, is_family_head=role == "Head", age=age, blood_group="B+"
+                ))
+                db.session.flush()
+    db.session.commit()
+
+def family_csv(count: int, samaj: str = "Shah Samaj") -> str:
+    """CSV with a head, spouse and child for each family, heads first"""
+    rows = [CSV_HEADER]
+    for f in range(count):
+        rows.append(f"{samaj},,Head {f},Male,45,B+,Head,\n")
+        rows.append(f"{samaj},,Spouse {f},Female,42,A+,Spouse,Head {f}\n")
+        rows.append(f"{samaj},,Child {f},Male,12,O+,Child,Head {f}\n")
+    return "".join(rows)
+
+@contextmanager
+def count_queries():
+    """Collect the SQL statements executed on the app's engine"""
+    from app import db
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, "before_cursor_execute", before_cursor_execute)
+
+def query_plan(query) -> str:
+    """SQLite's EXPLAIN QUERY PLAN for an ORM query"""
+    from app import db
+    compiled = query.statement.compile(db.engine, compile_kwargs={"literal_binds": True})
+    rows = db.session.execute(text(f"EXPLAIN QUERY PLAN {compiled}")).all()
+    return "\n".join(row[-1] for row in rows)
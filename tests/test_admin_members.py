@@ -0,0 +1,109 @@
+# Author: SANJAY KR
+import gzip
+import json
+import pytest
+from flask import Flask
+from app import db
+from app.controllers.admin_controller import export_members_csv, get_members_page, iter_members
+from app.controllers.auth_controller import create_access_token
+from app.models.family import Samaj, Family, Member
+from app.routes.admin import admin_bp
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config.update(
+        SQLALCHEMY_DATABASE_URI="sqlite://",
+        JWT_SECRET_KEY="test-secret-key",
+        JWT_ALGORITHM="HS256"
+    )
+    db.init_app(app)
+    app.register_blueprint(admin_bp, url_prefix="/api/v1/admin")
+    with app.app_context():
+        db.create_all()
+        for s in range(2):
+            samaj = Samaj(name=f"Samaj {s}")
+            db.session.add(samaj)
+            db.session.flush()
+            for f in range(5):
+                family = Family(name=f"Family {s}-{f}", samaj_id=samaj.id)
+                db.session.add(family)
+                db.session.flush()
+                db.session.add(Member(
+                    samaj_id=samaj.id, family_id=family.id, name=f"Head {s}-{f}", family_role="Head",
+                    is_family_head=True, age=40 + f, blood_group="O+" if f % 2 else "A+"
+                ))
+                db.session.flush()
+        db.session.commit()
+        yield app
+        db.session.remove()
+
+@pytest.fixture
+def auth_headers(app):
+    with app.app_context():
+        return {"Authorization": f"Bearer {create_access_token({'sub': 'admin'})}"}
+
+def test_members_page_follows_cursor(app):
+    """Test keyset pages cover every member exactly once, in id order"""
+    with app.app_context():
+        seen = []
+        after = None
+        while True:
+            rows, after = get_members_page(db.session, limit=3, after=after)
+            seen.extend(row["id"] for row in rows)
+            if after is None:
+                break
+        assert seen == sorted(seen)
+        assert len(seen) == len(set(seen)) == 10
+        assert rows[-1]["samaj"] == "Samaj 1"
+
+def test_members_page_applies_filters(app):
+    """Test filters narrow the page and the last page has no cursor"""
+    with app.app_context():
+        rows, after = get_members_page(db.session, {"samaj_name": "Samaj 0", "blood_group": "O+"}, limit=10)
+        assert [row["name"] for row in rows] == ["Head 0-1", "Head 0-3"]
+        assert after is None
+        assert len(list(iter_members(db.session, {"age_min": 43}, batch_size=2))) == 4
+
+def test_list_members_returns_next_cursor(app, auth_headers):
+    """Test /members returns one page plus the cursor for the next one"""
+    client = app.test_client()
+    response = client.get("/api/v1/admin/members?limit=4", headers=auth_headers)
+    assert response.status_code == 200
+    assert len(response.json) == 4
+    after = response.headers["X-Next-Cursor"]
+    assert after == str(response.json[-1]["id"])
+
+    response = client.get(f"/api/v1/admin/members?limit=10&after={after}", headers=auth_headers)
+    assert len(response.json) == 6
+    assert "X-Next-Cursor" not in response.headers
+
+def test_list_members_streams_ndjson(app, auth_headers):
+    """Test format=ndjson streams every matching member as one JSON object per line"""
+    client = app.test_client()
+    response = client.get("/api/v1/admin/members?format=ndjson&samaj_name=Samaj 1", headers=auth_headers)
+    assert response.status_code == 200
+    assert response.mimetype == "application/x-ndjson"
+    rows = [json.loads(line) for line in response.data.decode().splitlines()]
+    assert len(rows) == 5
+    assert {row["samaj"] for row in rows} == {"Samaj 1"}
+
+def test_export_csv_is_generated_in_chunks(app):
+    """Test the CSV export yields one chunk per batch instead of one big string"""
+    with app.app_context():
+        chunks, filename = export_members_csv(db.session, {"samaj_name": "Samaj 0"}, batch_size=2)
+        chunks = list(chunks)
+        assert filename == "members_Samaj 0.csv"
+        assert len(chunks) == 3
+        lines = "".join(chunks).splitlines()
+        assert lines[0].startswith("Samaj,Family,Name")
+        assert len(lines) == 6
+
+def test_export_csv_streams_gzip(app, auth_headers):
+    """Test the export is gzipped when the client accepts it"""
+    client = app.test_client()
+    response = client.get("/api/v1/admin/export/csv", headers=dict(auth_headers, **{"Accept-Encoding": "gzip"}))
+    assert response.status_code == 200
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.headers["Content-Disposition"] == 'attachment; filename="members_all.csv"'
+    assert len(gzip.decompress(response.data).decode().splitlines()) == 11
@@ -0,0 +1,49 @@
+# Author: SANJAY KR
+"""Statement-count checks for the admin endpoints.
+
+Each endpoint is requested against a small and a larger data set; the number of
+SQL statements must not grow with the number of rows (no N+1 loading).
+"""
+import pytest
+from app import db
+from tests.conftest import count_queries, seed
+
+ENDPOINTS = [
+    "/api/v1/admin/samaj",
+    "/api/v1/admin/families/summary",
+    "/api/v1/admin/members",
+    "/api/v1/admin/members?format=ndjson",
+    "/api/v1/admin/members/1",
+    "/api/v1/admin/families/1/members",
+    "/api/v1/admin/export/csv",
+    "/api/v1/admin/analytics",
+]
+
+def statements_for(client, url, headers):
+    db.session.expire_all()
+    with count_queries() as statements:
+        response = client.get(url, headers=headers)
+        response.get_data()
+    assert response.status_code == 200, response.get_data(as_text=True)
+    return len(statements)
+
+@pytest.mark.parametrize("url", ENDPOINTS)
+def test_statement_count_does_not_scale_with_rows(client, auth_headers, url):
+    """Test each admin endpoint issues the same number of statements for 2 or 60 families"""
+    seed(1, 2)
+    small = statements_for(client, url, auth_headers)
+    seed(5, 10)
+    large = statements_for(client, url, auth_headers)
+    assert large == small, f"{url}: {small} statements for 2 families, {large} for 52"
+
+def test_summaries_are_aggregated(client, auth_headers):
+    """Test the aggregate queries still report the right counts and heads"""
+    seed(2, 3)
+    samaj = client.get("/api/v1/admin/samaj", headers=auth_headers).json
+    assert [(s["name"], s["family_count"], s["member_count"]) for s in samaj] == [
+        ("Samaj 0", 3, 9), ("Samaj 1", 3, 9)
+    ]
+    families = client.get("/api/v1/admin/families/summary?samaj_name=Samaj 1", headers=auth_headers).json
+    assert [(f["name"], f["head_name"], f["member_count"]) for f in families] == [
+        ("Family 1-0", "Head 1-0", 3), ("Family 1-1", "Head 1-1", 3), ("Family 1-2", "Head 1-2", 3)
+    ]
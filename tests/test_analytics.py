@@ -0,0 +1,109 @@
+# Author: SANJAY KR
+import io
+import os
+import threading
+import pytest
+from flask import Flask
+from sqlalchemy import create_engine, func, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+from app import db
+from app.models.analytics import MemberStatDelta, fold_member_stat_deltas, read_member_stats, rebuild_member_stats
+from app.models.family import Samaj, Family, Member
+from app.services.bulk_import import import_members
+from tests.conftest import count_queries, family_csv, seed
+
+def test_counters_follow_inserts_updates_and_deletes(app):
+    """Test ORM and bulk writes keep the counters equal to a full recount"""
+    seed(2, 3)
+    import_members(db.session, io.StringIO(family_csv(4)), "csv")
+    child = db.session.query(Member).filter_by(name="Child 0-0").one()
+    child.age = 19
+    child.current_city = "Surat"
+    db.session.delete(db.session.query(Member).filter_by(name="Child 1-2").one())
+    db.session.commit()
+
+    stats = read_member_stats(db.session)
+    total = db.session.query(func.count(Member.id)).scalar()
+    assert sum(stats["role"].values()) == total == 29
+    assert stats["city"] == {"Surat": 1, "Unknown": 28}
+    assert stats["age_band"] == {"31-45": 20, "Under 18": 8, "18-30": 1}
+    assert fold_member_stat_deltas(db.session) > 0
+    assert db.session.query(MemberStatDelta).count() == 0
+    assert read_member_stats(db.session) == stats
+    assert rebuild_member_stats(db.session) == total
+    assert read_member_stats(db.session) == stats
+
+def test_rolled_back_writes_are_not_counted(app):
+    """Test counters written during a flush are undone with the rolled back members"""
+    seed(1, 1)
+    db.session.add(Member(samaj_id=1, family_id=1, name="Extra", family_role="Other", age=30))
+    db.session.flush()
+    db.session.rollback()
+    assert read_member_stats(db.session)["role"] == {"Head": 1, "Spouse": 1, "Child": 1}
+
+def test_analytics_endpoint_reads_only_counters(client, auth_headers):
+    """Test /analytics answers from the counters and deltas without scanning members or writing"""
+    seed(3, 2)
+    deltas = db.session.query(MemberStatDelta).count()
+    with count_queries() as statements:
+        data = client.get("/api/v1/admin/analytics?top=2", headers=auth_headers).json
+    assert not any("FROM member " in statement or "FROM member\n" in statement for statement in statements)
+    assert all(statement.lstrip().upper().startswith("SELECT") for statement in statements)
+    assert db.session.query(MemberStatDelta).count() == deltas > 0
+    assert data["total_members"] == 18
+    assert data["age_groups"] == {"Under 18": 6, "31-45": 12}
+    assert data["blood_groups"] == {"B+": 18}
+    assert data["family_roles"] == {"Child": 6, "Head": 6, "Spouse": 6}
+    assert data["samaj"] == {"Samaj 0": 6, "Samaj 1": 6}
+    assert data["profession_categories"] == {"Unknown": 18}
+
+def test_concurrent_member_inserts_do_not_block():
+    """Test two open transactions counting the same values don't wait on each other (PostgreSQL)"""
+    url = os.environ.get("DATABASE_URL", "")
+    if not url.startswith("postgresql"):
+        pytest.skip("PostgreSQL not configured")
+    engine = create_engine(url)
+    try:
+        engine.connect().close()
+    except OperationalError:
+        pytest.skip("PostgreSQL not reachable")
+
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = url
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        seed(1, 1)
+        family = db.session.query(Family).order_by(Family.id.desc()).first()
+        names = ("Concurrent First", "Concurrent Second")
+        sessions = [Session(db.engine), Session(db.engine)]
+        flushed = threading.Barrier(2, timeout=10)
+        errors = []
+
+        def insert(session, name):
+            try:
+                # Fails instead of waiting if the other transaction holds a row this one needs
+                session.execute(text("SET LOCAL lock_timeout = '2s'"))
+                session.add(Member(samaj_id=family.samaj_id, family_id=family.id, name=name,
+                                   family_role="Other", age=30, blood_group="B+"))
+                session.flush()
+                flushed.wait()
+                session.commit()
+            except Exception as e:
+                errors.append(e)
+                flushed.abort()
+
+        threads = [threading.Thread(target=insert, args=pair) for pair in zip(sessions, names)]
+        try:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            assert errors == []
+        finally:
+            for session in sessions:
+                session.close()
+            db.session.query(Member).filter(Member.name.in_(names)).delete()
+            db.session.commit()
+            db.session.remove()
@@ -0,0 +1,78 @@
+# Author: SANJAY KR
+import asyncio
+import json
+from urllib.parse import urlencode
+import pytest
+from app.asgi import create_asgi_app
+from app.services.async_outbound import AsyncOutboundQueue
+
+@pytest.fixture
+def flask_app(monkeypatch, tmp_path):
+    monkeypatch.setenv("FLASK_ENV", "development")
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path}/asgi.db")
+    monkeypatch.setenv("SESSION_STORE", "memory")
+    from app import create_app
+    return create_app()
+
+async def call(asgi, method, path, body=b"", headers=()):
+    """Drive one HTTP request through the ASGI app and collect the response"""
+    scope = {"type": "http", "method": method, "path": path, "query_string": b"",
+             "headers": list(headers), "http_version": "1.1"}
+    events = [{"type": "http.request", "body": body, "more_body": False}]
+    sent = []
+
+    async def receive():
+        return events.pop(0)
+
+    async def send(event):
+        sent.append(event)
+
+    await asgi(scope, receive, send)
+    status = sent[0]["status"]
+    return status, dict(sent[0]["headers"]), b"".join(e.get("body", b"") for e in sent[1:])
+
+def webhook_form(body, sid, **extra):
+    fields = {"From": "whatsapp:+919812345678", "To": "whatsapp:+14155238886",
+              "Body": body, "MessageSid": sid, "NumMedia": "0", **extra}
+    return urlencode(fields).encode(), [(b"content-type", b"application/x-www-form-urlencoded")]
+
+def test_webhook_replies_through_async_outbound(flask_app):
+    """Test the webhook runs the conversation and sends the reply from the event loop"""
+    asgi = create_asgi_app(flask_app)
+    service = flask_app.extensions["whatsapp_service"]
+
+    async def scenario():
+        await asgi.startup()
+        assert isinstance(service.outbound_queue, AsyncOutboundQueue)
+        results = [await call(asgi, "POST", "/api/v1/whatsapp/webhook", *webhook_form(text, f"SMasgi{i}"))
+                   for i, text in enumerate(["start", "Shah Samaj"])]
+        await service.outbound_queue.join()
+        stats = service.outbound_queue.stats()
+        await asgi.shutdown()
+        return results, stats
+
+    results, stats = asyncio.run(scenario())
+    for status, headers, body in results:
+        assert status == 200
+        assert headers[b"content-type"] == b"application/json"
+        assert json.loads(body)["success"] is True
+    assert stats["sent"] == 2
+    assert [m.body for m in service.client.sent] == [json.loads(body)["message"] for _, _, body in results]
+
+def test_webhook_rejects_media(flask_app):
+    """Test media messages get the same 400 as the Flask route"""
+    asgi = create_asgi_app(flask_app)
+    status, _, body = asyncio.run(call(asgi, "POST", "/api/v1/whatsapp/webhook",
+                                       *webhook_form("photo", "SMmedia", NumMedia="1")))
+    assert status == 400
+    assert json.loads(body)["success"] is False
+
+def test_other_routes_are_served_by_flask(flask_app):
+    """Test routes other than the webhook go through the WSGI bridge"""
+    asgi = create_asgi_app(flask_app)
+    status, headers, body = asyncio.run(call(asgi, "GET", "/metrics"))
+    assert status == 200
+    assert headers[b"content-type"].startswith(b"text/plain")
+    assert b"# TYPE" in body
+    status, _, _ = asyncio.run(call(asgi, "GET", "/no-such-route"))
+    assert status == 404
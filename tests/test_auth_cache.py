@@ -0,0 +1,66 @@
+# Author: SANJAY KR
+import logging
+import pytest
+from flask import Flask
+from app.controllers import auth_controller
+from app.controllers.auth_controller import create_access_token, verify_token
+from app.utils.auth import login_required
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config.update(JWT_SECRET_KEY="test-secret-key", JWT_ALGORITHM="HS256", JWT_CACHE_SIZE=2)
+    auth_controller._verified_tokens.clear()
+    with app.app_context():
+        yield app
+    auth_controller._verified_tokens.clear()
+
+@pytest.fixture
+def decode_calls(monkeypatch):
+    calls = []
+    decode = auth_controller.jwt.decode
+
+    def counting_decode(*args, **kwargs):
+        calls.append(args[0])
+        return decode(*args, **kwargs)
+
+    monkeypatch.setattr(auth_controller.jwt, "decode", counting_decode)
+    return calls
+
+def test_verified_token_is_cached(app, decode_calls):
+    """Test a token is decoded once and then served from the cache"""
+    token = create_access_token({"sub": "admin"})
+    assert verify_token(token) == "admin"
+    assert verify_token(token) == "admin"
+    assert len(decode_calls) == 1
+
+def test_cache_honors_expiry(app, decode_calls, monkeypatch):
+    """Test a cached token is verified again once its exp has passed"""
+    token = create_access_token({"sub": "admin"})
+    verify_token(token)
+    expires_at = auth_controller._verified_tokens[next(iter(auth_controller._verified_tokens))][1]
+    monkeypatch.setattr(auth_controller.time, "time", lambda: expires_at + 1)
+    verify_token(token)
+    assert len(decode_calls) == 2
+
+def test_cache_is_keyed_by_secret_and_bounded(app, decode_calls):
+    """Test a changed secret does not reuse cached results and old entries are evicted"""
+    token = create_access_token({"sub": "admin"})
+    verify_token(token)
+    app.config["JWT_SECRET_KEY"] = "rotated-secret-key"
+    assert verify_token(token) is None
+    for user in ("a", "b", "c"):
+        verify_token(create_access_token({"sub": user}))
+    assert len(auth_controller._verified_tokens) == 2
+
+def test_login_required_does_not_log_token(app, caplog):
+    """Test the Authorization header is not written to the logs"""
+    token = create_access_token({"sub": "admin"})
+    view = login_required(lambda: "ok")
+    with caplog.at_level(logging.DEBUG):
+        with app.test_request_context(headers={"Authorization": f"Bearer {token}"}):
+            assert view() == "ok"
+        with app.test_request_context(headers={"Authorization": "Bearer not-a-token"}):
+            assert view()[1] == 401
+    assert token not in caplog.text
+    assert "not-a-token" not in caplog.text
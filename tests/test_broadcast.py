@@ -0,0 +1,156 @@
+# Author: SANJAY KR
+import pytest
+from datetime import datetime, timedelta
+from sqlalchemy import update
+from twilio.base.exceptions import TwilioRestException
+from app import db
+from app.models.broadcast import BroadcastJob, BroadcastRecipient
+from app.models.family import Samaj, Family, Member
+from app.services.broadcast import BroadcastRunner, normalize_phone
+
+@pytest.fixture
+def database_uri(tmp_path):
+    # A file database, since jobs run on their own threads and connections
+    return f"sqlite:///{tmp_path}/broadcast.db"
+
+@pytest.fixture(autouse=True)
+def members(app):
+    samaj = Samaj(name="Shah Samaj")
+    db.session.add(samaj)
+    db.session.flush()
+    family = Family(name="Shah Family", samaj_id=samaj.id)
+    db.session.add(family)
+    db.session.flush()
+    mobiles = [("9800000001", None), ("9800000002", "98000 00001"), ("919800000003", "skip"),
+               ("12345", "9800000004"), ("9800000005", "9800000005")]
+    for i, (mobile_1, mobile_2) in enumerate(mobiles):
+        db.session.add(Member(samaj_id=samaj.id, family_id=family.id, name=f"Member {i}", family_role="Other",
+                              blood_group="O-", current_city="Pune", mobile_1=mobile_1, mobile_2=mobile_2))
+    db.session.add(Member(samaj_id=samaj.id, family_id=family.id, name="Other City", family_role="Other",
+                          blood_group="O-", current_city="Surat", mobile_1="9800000009"))
+    db.session.commit()
+
+class Sender:
+    def __init__(self, fail=()):
+        self.fail = set(fail)
+        self.sent = []
+
+    def __call__(self, from_, to, body):
+        if to in self.fail:
+            raise TwilioRestException(400, "/Messages.json", "Invalid 'To' number", method="POST")
+        self.sent.append(to)
+
+def test_normalize_phone():
+    """Test stored numbers become E.164 and malformed ones are rejected"""
+    assert normalize_phone("98000 00001", "91") == "+919800000001"
+    assert normalize_phone("+91-9800000001", "91") == "+919800000001"
+    assert normalize_phone("12345", "91") is None
+    assert normalize_phone(None, "91") is None
+
+def test_broadcast_dedups_numbers_and_records_failures(app):
+    """Test a job sends once per distinct number, skips invalid ones and records failures"""
+    sender = Sender(fail={"whatsapp:+919800000004"})
+    runner = BroadcastRunner(app, sender, "whatsapp:+14155238886", workers=3, batch_size=2)
+    with app.app_context():
+        job = runner.create(db.session, "Blood needed at City Hospital", {"blood_group": "O-", "city": "Pune"})
+        job_id = job.id
+    runner.wait(job_id, timeout=10)
+    assert sorted(sender.sent) == ["whatsapp:+919800000001", "whatsapp:+919800000002",
+                                   "whatsapp:+919800000003", "whatsapp:+919800000005"]
+    with app.app_context():
+        job = db.session.get(BroadcastJob, job_id).to_dict()
+        assert (job["status"], job["recipients"], job["sent"], job["failed"], job["pending"]) == \
+            ("completed", 5, 4, 1, 0)
+        assert (job["duplicates"], job["invalid"]) == (2, 1)
+        failure = db.session.query(BroadcastRecipient).filter_by(job_id=job_id, status="failed").one()
+        assert failure.phone == "+919800000004" and "Invalid 'To' number" in failure.error
+
+def test_broadcast_endpoints(app, client, auth_headers):
+    """Test jobs are validated, started, reported and their failures listed"""
+    sender = Sender(fail={"whatsapp:+919800000001", "whatsapp:+919800000002"})
+    app.extensions["broadcast_runner"] = runner = BroadcastRunner(app, sender, "whatsapp:+14155238886")
+    assert client.post("/api/v1/admin/broadcasts", json={"message": ""}, headers=auth_headers).status_code == 400
+    assert client.post("/api/v1/admin/broadcasts", json={"message": "Hi", "filters": {"mobile": "1"}},
+                       headers=auth_headers).status_code == 400
+    response = client.post("/api/v1/admin/broadcasts", json={"message": "Hi", "filters": {"age_min": "abc"}},
+                           headers=auth_headers)
+    assert response.status_code == 400
+    assert db.session.query(BroadcastJob).count() == 0
+    response = client.post("/api/v1/admin/broadcasts", json={"message": "Hi", "filters": {"city": "Surat"}},
+                           headers=auth_headers)
+    assert response.status_code == 202
+    job_id = response.json["id"]
+    runner.wait(job_id, timeout=10)
+    job = client.get(f"/api/v1/admin/broadcasts/{job_id}", headers=auth_headers).json
+    assert (job["status"], job["sent"]) == ("completed", 1)
+
+    job_id = client.post("/api/v1/admin/broadcasts", json={"message": "Hi", "filters": {"city": "Pune"}},
+                         headers=auth_headers).json["id"]
+    runner.wait(job_id, timeout=10)
+    page = client.get(f"/api/v1/admin/broadcasts/{job_id}/failures?limit=1", headers=auth_headers)
+    assert [row["phone"] for row in page.json] == ["+919800000001"]
+    page = client.get(f"/api/v1/admin/broadcasts/{job_id}/failures",
+                      query_string={"after": page.headers["X-Next-Cursor"]}, headers=auth_headers)
+    assert [row["phone"] for row in page.json] == ["+919800000002"]
+    assert client.get("/api/v1/admin/broadcasts/999", headers=auth_headers).status_code == 404
+
+def dead_runner_job(heartbeat_at) -> int:
+    """A job left running by another worker after scanning members 1-2, with one number
+    recorded as sent and one still pending"""
+    job = BroadcastJob(message="Blood needed", filters={"blood_group": "O-", "city": "Pune"}, status="running",
+                       cursor=2, recipients=2, duplicates=1, sent=1, lease_owner="dead-worker",
+                       heartbeat_at=heartbeat_at, started_at=datetime.utcnow() - timedelta(minutes=10))
+    db.session.add(job)
+    db.session.flush()
+    db.session.add_all([
+        BroadcastRecipient(job_id=job.id, phone="+919800000001", member_id=1, status="sent"),
+        BroadcastRecipient(job_id=job.id, phone="+919800000002", member_id=2, status="pending"),
+    ])
+    db.session.commit()
+    return job.id
+
+def test_job_of_dead_runner_is_resumed(app):
+    """Test an expired lease is taken over, sending the pending numbers and the rest of the scan once"""
+    job_id = dead_runner_job(datetime.utcnow() - timedelta(minutes=5))
+    sender = Sender()
+    runner = BroadcastRunner(app, sender, "whatsapp:+14155238886", workers=2, batch_size=2, lease_seconds=60)
+    assert runner.recover(db.session) == [job_id]
+    runner.wait(job_id, timeout=10)
+    assert sorted(sender.sent) == ["whatsapp:+919800000002", "whatsapp:+919800000003",
+                                   "whatsapp:+919800000004", "whatsapp:+919800000005"]
+    db.session.expire_all()
+    job = db.session.get(BroadcastJob, job_id)
+    assert job.lease_owner == runner.owner
+    job = job.to_dict()
+    assert (job["status"], job["recipients"], job["sent"], job["pending"]) == ("completed", 5, 5, 0)
+    assert (job["duplicates"], job["invalid"]) == (2, 1)
+
+def test_live_lease_is_not_taken_over(app):
+    """Test a job whose runner renews its lease is left alone until the lease expires"""
+    job_id = dead_runner_job(datetime.utcnow())
+    runner = BroadcastRunner(app, Sender(), "whatsapp:+14155238886", lease_seconds=60)
+    assert runner.recover(db.session) == []
+    assert not runner.claim(db.session, job_id)
+    db.session.get(BroadcastJob, job_id).heartbeat_at = datetime.utcnow() - timedelta(seconds=61)
+    db.session.commit()
+    assert runner.claim(db.session, job_id)
+    assert not BroadcastRunner(app, Sender(), "whatsapp:+14155238886").claim(db.session, job_id)
+
+def test_runner_that_lost_its_lease_writes_nothing(app):
+    """Test a runner whose lease another worker took leaves the job's counts and status alone"""
+    job_id = dead_runner_job(datetime.utcnow() - timedelta(minutes=5))
+    engine = db.engine
+
+    class Usurped(Sender):
+        def __call__(self, from_, to, body):
+            super().__call__(from_, to, body)
+            # Another worker takes the lease before this send is recorded
+            with engine.begin() as conn:
+                conn.execute(update(BroadcastJob).where(BroadcastJob.id == job_id).values(lease_owner="new-worker"))
+
+    runner = BroadcastRunner(app, Usurped(), "whatsapp:+14155238886", workers=1, batch_size=2, lease_seconds=60)
+    assert runner.recover(db.session) == [job_id]
+    runner.wait(job_id, timeout=10)
+    db.session.expire_all()
+    job = db.session.get(BroadcastJob, job_id)
+    assert (job.lease_owner, job.status, job.sent, job.failed) == ("new-worker", "running", 1, 0)
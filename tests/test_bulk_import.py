@@ -0,0 +1,102 @@
+# Author: SANJAY KR
+import io
+import json
+import pytest
+from app import db
+from app.models.family import Samaj, Family, Member
+from app.services.bulk_import import import_members
+from tests.conftest import CSV_HEADER, count_queries, family_csv
+
+def test_csv_import_creates_samaj_families_and_heads(app):
+    """Test heads create their family and other members join it by the head's name"""
+    with app.app_context():
+        report = import_members(db.session, io.StringIO(family_csv(3)), "csv", batch_size=4)
+        assert (report.total, report.imported, report.failed) == (9, 9, 0)
+        assert db.session.query(Samaj).count() == 1
+        families = db.session.query(Family).order_by(Family.id).all()
+        assert [f.name for f in families] == ["Head 0's Family", "Head 1's Family", "Head 2's Family"]
+        for family in families:
+            assert db.session.get(Member, family.head_of_family_id).name == family.name.split("'")[0]
+            assert sorted(m.family_role for m in family.members) == ["Child", "Head", "Spouse"]
+
+def test_invalid_rows_are_reported_and_skipped(app):
+    """Test field, role and missing-head errors are reported per row without failing the batch"""
+    with app.app_context():
+        data = CSV_HEADER + "\n".join([
+            "Shah Samaj,,Head A,Male,45,B+,Head,",
+            "Shah Samaj,,Old Child,Male,150,B+,Child,Head A",
+            "Shah Samaj,,Second Head,Male,50,B+,Head,Head A",
+            "Shah Samaj,Head A's Family,Another Head,Male,50,B+,Head,",
+            "Shah Samaj,,Orphan,Female,20,B+,Child,Nobody",
+            "Shah Samaj,,Spouse A,Female,40,B+,Spouse,Head A",
+        ]) + "\n"
+        report = import_members(db.session, io.StringIO(data), "csv")
+        assert (report.total, report.imported, report.failed) == (6, 3, 3)
+        errors = {error["row"]: error["error"] for error in report.errors}
+        assert sorted(errors) == [2, 4, 5]
+        assert errors[2].startswith("age:")
+        assert "head" in errors[4].lower()
+        assert errors[5] == "Family head not found: Nobody"
+        assert sorted(name for name, in db.session.query(Member.name)) == ["Head A", "Second Head", "Spouse A"]
+
+def test_ndjson_import_joins_existing_family(app):
+    """Test NDJSON rows can reference heads imported by an earlier run"""
+    with app.app_context():
+        import_members(db.session, io.StringIO(family_csv(1)), "csv")
+        data = "\n".join(json.dumps(row) for row in [
+            {"samaj": "Shah Samaj", "name": "Child B", "family_role": "Child", "age": 8, "family_head": "Head 0"},
+            {"samaj": "Shah Samaj", "name": "Parent", "family_role": "Parent", "age": 70, "family": "Head 0's Family"},
+        ])
+        report = import_members(db.session, io.StringIO(data), "ndjson")
+        assert (report.imported, report.failed) == (2, 0)
+        family = db.session.query(Family).one()
+        assert len(family.members) == 5
+
+def test_head_names_match_regardless_of_case_and_spacing(app):
+    """Test members find their head like registration does, by single-spaced lower(name)"""
+    with app.app_context():
+        import_members(db.session, io.StringIO(family_csv(1)), "csv")
+        data = CSV_HEADER + "Shah Samaj,,Late Child,Male,9,B+,Child,  head   0 \n"
+        report = import_members(db.session, io.StringIO(data), "csv")
+        assert (report.imported, report.failed) == (1, 0)
+        family = db.session.query(Family).one()
+        assert len(family.members) == 4
+
+def test_malformed_ndjson_lines_are_reported_per_row(app):
+    """Test a line that is not JSON, or not an object, fails alone and the import goes on"""
+    with app.app_context():
+        lines = [
+            json.dumps({"samaj": "Shah Samaj", "name": "Head A", "family_role": "Head", "age": 45}),
+            '{"samaj": "Shah Samaj", "name": ',
+            json.dumps(["Shah Samaj", "Listed", "Child"]),
+            json.dumps({"samaj": "Shah Samaj", "name": "Child A", "family_role": "Child", "age": 8,
+                        "family_head": "Head A"}),
+        ]
+        report = import_members(db.session, io.StringIO("\n".join(lines)), "ndjson", batch_size=2)
+        assert (report.total, report.imported, report.failed) == (4, 2, 2)
+        errors = {error["row"]: error["error"] for error in report.errors}
+        assert errors[2].startswith("Invalid JSON") and errors[3] == "Expected a JSON object"
+        assert sorted(name for name, in db.session.query(Member.name)) == ["Child A", "Head A"]
+
+def test_statement_count_depends_on_batches_not_rows(app):
+    """Test a batch of 30 rows issues as many statements as a batch of 3"""
+    with app.app_context():
+        with count_queries() as small:
+            import_members(db.session, io.StringIO(family_csv(1, "Samaj A")), "csv", batch_size=100)
+        with count_queries() as large:
+            import_members(db.session, io.StringIO(family_csv(10, "Samaj B")), "csv", batch_size=100)
+        assert len(large) == len(small)
+        assert db.session.query(Member).count() == 33
+
+def test_import_endpoint_accepts_upload(client, auth_headers):
+    """Test POST /import reads a multipart CSV upload and returns the report"""
+    response = client.post(
+        "/api/v1/admin/import", headers=auth_headers,
+        data={"file": (io.BytesIO(family_csv(2).encode()), "members.csv")}
+    )
+    assert response.status_code == 200, response.get_data(as_text=True)
+    assert response.json["imported"] == 6
+    assert response.json["errors"] == []
+
+    response = client.post("/api/v1/admin/import?format=xml", headers=auth_headers, data="")
+    assert response.status_code == 400
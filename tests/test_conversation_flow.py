@@ -0,0 +1,69 @@
+# Author: SANJAY KR
+import pytest
+from flask import Flask
+from app.services.conversation_flow import (
+    REGISTRATION_FLOW, CONFIRM_STEP, validate_value, build_confirmation
+)
+from app.services.whatsapp_service import WhatsAppService
+
+@pytest.fixture
+def service():
+    app = Flask(__name__)
+    with app.app_context():
+        yield WhatsAppService()
+
+def test_validate_value():
+    """Test validators normalize valid input and explain invalid input"""
+    assert validate_value("family_role", "head") == (True, "Head")
+    assert validate_value("blood_group", "o +") == (True, "O+")
+    assert validate_value("mobile_2", "Skip") == (True, None)
+    assert validate_value("age", "130") == (False, "Please enter a valid age between 0 and 120")
+    assert validate_value("name", "J")[0] is False
+
+def test_family_head_step_only_for_non_heads():
+    """Test the family head question is skipped for heads"""
+    role_step = REGISTRATION_FLOW.fields.index("family_role")
+    head_step = REGISTRATION_FLOW.fields.index("family_head")
+    assert REGISTRATION_FLOW.next_step(role_step, {"family_role": "Head"}) == head_step + 1
+    assert REGISTRATION_FLOW.next_step(role_step, {"family_role": "Child"}) == head_step
+
+def test_build_confirmation_lists_answered_fields():
+    """Test the confirmation message shows the collected details"""
+    session = {
+        "data": {"samaj": "Test Samaj", "name": "John Doe", "family_role": "Child",
+                 "family_head": "Ram Doe", "age": "12", "mobile_2": None},
+        "family_context": {}
+    }
+    message = build_confirmation(REGISTRATION_FLOW, session)
+    assert "Family Head: Ram Doe" in message
+    assert "Age: 12" in message
+    assert "Mobile 2" not in message
+    assert message.endswith("Is this information correct? (Yes/No)")
+
+def test_handle_message_walks_flow_to_confirmation(service):
+    """Test a member reaches the confirmation step with every field collected"""
+    phone = "+919876543210"
+    answers = ["Test Samaj", "John Doe", "Child", "Ram Doe", "Male", "12", "O+", "9876543210", "skip",
+               "School", "Student", "Single", "Address", "john@example.com", "01/01/2012", "skip",
+               "Surat", "Pune", "Gujarati", "Drawing", "Music", "9876543211", "Single", "skip",
+               "Vegetarian", "skip", "Education", "skip"]
+    response, success = service.handle_message(phone, "start", db=object())
+    assert success and "Samaj name" in response
+    for answer in answers:
+        response, success = service.handle_message(phone, answer, db=object())
+        assert success
+    assert response.startswith("Please review your information:")
+    session = service.session_store.get(phone)
+    assert session["step"] == CONFIRM_STEP
+    assert set(REGISTRATION_FLOW.fields) <= set(session["data"])
+
+def test_handle_message_rejects_invalid_input(service):
+    """Test invalid answers keep the user on the same step"""
+    phone = "+919876543210"
+    service.handle_message(phone, "start", db=object())
+    service.handle_message(phone, "Test Samaj", db=object())
+    service.handle_message(phone, "John Doe", db=object())
+    response, success = service.handle_message(phone, "Uncle", db=object())
+    assert success
+    assert response == "Please enter a valid role (Head/Spouse/Child/Parent/Sibling/Other)"
+    assert service.session_store.get(phone)["step"] == REGISTRATION_FLOW.fields.index("family_role")
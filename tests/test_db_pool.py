@@ -0,0 +1,60 @@
+# Author: SANJAY KR
+import pytest
+from flask import Flask
+from sqlalchemy import create_engine, exc
+from app import db
+from app.models.base import MeteredQueuePool, engine_options, init_session_lifecycle, pool_stats
+from app.models.family import Samaj
+from app.utils.metrics import metrics
+
+def test_engine_options_from_config():
+    """Test pool settings apply to pooled databases and the statement timeout only to PostgreSQL"""
+    config = {"DB_POOL_SIZE": 8, "DB_MAX_OVERFLOW": 2, "DB_POOL_TIMEOUT": 5, "DB_STATEMENT_TIMEOUT_MS": 3000}
+    options = engine_options(config, "postgresql://u:p@db/app")
+    assert options["poolclass"] is MeteredQueuePool
+    assert (options["pool_size"], options["max_overflow"], options["pool_timeout"]) == (8, 2, 5.0)
+    assert options["pool_pre_ping"] is True
+    assert options["connect_args"] == {"options": "-c statement_timeout=3000"}
+    assert "connect_args" not in engine_options(config, "sqlite:////tmp/app.db")
+    assert "pool_size" not in engine_options(config, "sqlite://")
+
+def test_pool_records_waits_and_timeouts(tmp_path):
+    """Test checkouts feed the wait histogram and an exhausted pool counts a timeout"""
+    metrics.reset()
+    url = f"sqlite:///{tmp_path}/pool.db"
+    engine = create_engine(url, **engine_options({"DB_POOL_SIZE": 1, "DB_MAX_OVERFLOW": 0,
+                                                  "DB_POOL_TIMEOUT": 0.05}, url))
+    held = engine.connect()
+    assert pool_stats(engine)["checked_out"] == 1
+    with pytest.raises(exc.TimeoutError):
+        engine.connect()
+    held.close()
+    assert pool_stats(engine) == {"size": 1, "checked_out": 0, "checked_in": 1, "overflow": 0}
+    output = metrics.render()
+    assert "db_pool_timeouts_total 1" in output
+    assert "db_pool_wait_seconds_count 2" in output
+
+def test_teardown_releases_session_and_discards_uncommitted_writes(tmp_path):
+    """Test a request that forgets to commit returns its connection and leaves no row behind"""
+    metrics.reset()
+    app = Flask(__name__)
+    url = f"sqlite:///{tmp_path}/app.db"
+    app.config.update(SQLALCHEMY_DATABASE_URI=url, SQLALCHEMY_ENGINE_OPTIONS=engine_options({}, url))
+    db.init_app(app)
+    init_session_lifecycle(app)
+
+    @app.route("/forgetful")
+    def forgetful():
+        db.session.add(Samaj(name="Uncommitted Samaj"))
+        db.session.query(Samaj).count()
+        return "ok"
+
+    with app.app_context():
+        db.create_all()
+        engine = db.engine
+    assert app.test_client().get("/forgetful").status_code == 200
+    assert pool_stats(engine)["checked_out"] == 0
+    with app.app_context():
+        assert db.session.query(Samaj).count() == 0
+    assert pool_stats(engine)["checked_out"] == 0
+    assert "db_session_rollbacks_total 1" in metrics.render()
@@ -0,0 +1,59 @@
+# Author: SANJAY KR
+import pytest
+from app import db
+from app.models.family import Samaj, Family, Member
+from app.services.donor_search import DONOR_RANKS, can_donate, search_donors
+from tests.conftest import query_plan
+
+@pytest.fixture(autouse=True)
+def donors(app):
+    samaj = Samaj(name="Shah Samaj")
+    db.session.add(samaj)
+    db.session.flush()
+    family = Family(name="Shah Family", samaj_id=samaj.id)
+    db.session.add(family)
+    db.session.flush()
+    donors = [("O-", "Surat", 30), ("A+", "surat", 40), ("A-", "Surat", 25), ("A+", "Surat", 22),
+              ("B+", "Surat", 35), ("A+", "Pune", 30), ("O+", "Surat", 70), ("AB+", "Surat", 28)]
+    for i, (group, city, age) in enumerate(donors):
+        db.session.add(Member(samaj_id=samaj.id, family_id=family.id, name=f"Donor {i}", family_role="Other",
+                              blood_group=group, current_city=city, age=age))
+    db.session.commit()
+
+def test_compatibility_matrix():
+    """Test the precomputed ranks follow ABO/Rh rules and save universal donors for last"""
+    assert can_donate("O-", "AB+") and can_donate("A-", "AB-") and not can_donate("A+", "A-")
+    assert not can_donate("AB+", "O+") and not can_donate("B-", "A+")
+    assert list(DONOR_RANKS["O-"]) == ["O-"]
+    assert list(DONOR_RANKS["A+"]) == ["A+", "A-", "O+", "O-"]
+    assert list(DONOR_RANKS["AB+"])[0] == "AB+" and list(DONOR_RANKS["AB+"])[-1] == "O-"
+
+def test_search_ranks_and_pages_donors(app):
+    """Test donors come exact group first, then by rank and age, across cursor pages"""
+    with app.app_context():
+        page, after = search_donors(db.session, "a+", " SURAT ", limit=2)
+        assert [(d["blood_group"], d["age"]) for d in page] == [("A+", 22), ("A+", 40)]
+        page, after = search_donors(db.session, "A+", "Surat", limit=2, after=after)
+        assert [(d["blood_group"], d["age"]) for d in page] == [("A-", 25), ("O-", 30)]
+        assert after is None
+        with pytest.raises(ValueError):
+            search_donors(db.session, "C+", "Surat")
+
+def test_donor_query_uses_composite_index(app):
+    """Test the search filters through the (blood_group, lower(city), age) index"""
+    with app.app_context():
+        from sqlalchemy import func
+        query = db.session.query(Member.id).filter(
+            Member.blood_group.in_(["A+", "O-"]), func.lower(Member.current_city) == "surat",
+            Member.age.between(18, 65)
+        )
+        assert "ix_member_blood_group_city_age" in query_plan(query)
+
+def test_donors_endpoint(client, auth_headers):
+    """Test the endpoint validates its parameters and returns the cursor header"""
+    assert client.get("/api/v1/admin/donors?blood_group=A%2B", headers=auth_headers).status_code == 400
+    assert client.get("/api/v1/admin/donors?blood_group=Z&city=Surat", headers=auth_headers).status_code == 400
+    response = client.get("/api/v1/admin/donors?blood_group=AB%2B&city=Surat&limit=3", headers=auth_headers)
+    assert response.status_code == 200
+    assert [d["blood_group"] for d in response.json] == ["AB+", "A+", "A+"]
+    assert response.headers["X-Next-Cursor"] == "1.40.2"
@@ -0,0 +1,109 @@
+# Author: SANJAY KR
+import pytest
+from sqlalchemy import event
+from app import db
+from app.models.family import Samaj, Family, Member
+from app.services.family_directory import FamilyDirectory, normalize_member_names
+from app.services.whatsapp_service import WhatsAppService
+
+@pytest.fixture
+def service(app):
+    service = WhatsAppService()
+    service.family_directory = FamilyDirectory()
+    return service
+
+def register(service, phone, name, role, head=None, samaj="Shah Samaj"):
+    answers = [samaj, name, role] + ([head] if head else []) + [
+        "Male", "40", "O+", phone[-10:], "skip", "Graduate", "Business", "Married", "Address",
+        "shah@example.com", "01/01/1985", "skip", "Surat", "Surat", "Gujarati", "Cooking", "Music",
+        "9876543211", "Married", "skip", "Vegetarian", "skip", "Business", "skip", "yes"]
+    for answer in ["start"] + answers:
+        response, success = service.handle_message(phone, answer, db=db.session)
+    return success, response
+
+def test_saved_ids_resolve_members_without_member_queries(service):
+    """Test a registered head is cached, matched loosely and found without querying members by name"""
+    assert register(service, "+919800000001", "Ramesh Shah", "Head")[0]
+    head_lookups = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        if "is_family_head" in statement and "lower(" in statement:
+            head_lookups.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", count)
+    try:
+        success, message = register(service, "+919800000002", "Meena Shah", "Spouse", head="ramesh  SHAH")
+    finally:
+        event.remove(db.engine, "before_cursor_execute", count)
+    assert success, message
+    assert head_lookups == []
+    spouse = db.session.query(Member).filter_by(name="Meena Shah").one()
+    head = db.session.query(Member).filter_by(name="Ramesh Shah").one()
+    assert spouse.family_id == head.family_id
+    # Only the first lookup of the new Samaj went to the database
+    assert service.family_directory.stats()["misses"] == 1
+
+def test_renamed_head_and_samaj_are_forgotten(service):
+    """Test ORM updates drop cached entries so stale names no longer resolve"""
+    register(service, "+919800000001", "Ramesh Shah", "Head")
+    head = db.session.query(Member).filter_by(name="Ramesh Shah").one()
+    head.name = "Ramesh Kumar Shah"
+    db.session.commit()
+    assert service.family_directory.stats()["entries"] == 1
+    assert service.family_directory.family_id(db.session, head.samaj_id, "Ramesh Shah") is None
+    assert register(service, "+919800000002", "Meena Shah", "Spouse", head="Ramesh Kumar Shah")[0]
+    assert db.session.query(Member).filter_by(name="Meena Shah").one().family_id == head.family_id
+
+    samaj = db.session.query(Samaj).one()
+    samaj.name = "Shah Samaj Surat"
+    db.session.commit()
+    assert service.family_directory.stats()["entries"] == 0
+    assert service.family_directory.samaj_id(db.session, "Shah Samaj Surat") == samaj.id
+
+def test_unknown_head_is_rejected_when_entered(service):
+    """Test the family head step asks again when the head is not registered in the Samaj"""
+    register(service, "+919800000001", "Ramesh Shah", "Head")
+    phone = "+919812345678"
+    for answer in ("start", "Shah Samaj", "Meena Shah", "Spouse"):
+        service.handle_message(phone, answer, db=db.session)
+    response, success = service.handle_message(phone, "Suresh Shah", db=db.session)
+    assert success
+    assert response.startswith("No family head named Suresh Shah is registered in Shah Samaj.")
+    head_step = service.session_store.get(phone)["step"]
+    response, success = service.handle_message(phone, "Ramesh Shah", db=db.session)
+    assert success
+    assert service.session_store.get(phone)["step"] == head_step + 1
+
+def test_head_names_with_repeated_spaces_are_found(service):
+    """Test names are saved single-spaced, and names saved before that are found once normalized"""
+    assert register(service, "+919800000001", "Ramesh  Shah", "Head")[0]
+    head = db.session.query(Member).filter_by(is_family_head=True).one()
+    assert head.name == "Ramesh Shah"
+    assert register(service, "+919800000002", "Meena Shah", "Spouse", head="ramesh   SHAH")[0]
+
+    # A head saved with the spacing it was typed in
+    family = Family(name="Suresh Shah's Family", samaj_id=head.samaj_id)
+    db.session.add(family)
+    db.session.flush()
+    db.session.add(Member(samaj_id=head.samaj_id, family_id=family.id, name=" Suresh  Shah",
+                          family_role="Head", is_family_head=True, age=50))
+    db.session.commit()
+    assert normalize_member_names(db.session) == 1
+    assert service.family_directory.family_id(db.session, head.samaj_id, "Suresh  Shah") == family.id
+
+def test_phone_update_matches_the_whole_sender_number(service):
+    """Test the update flow finds members by normalized number, not its last 10 digits"""
+    samaj = Samaj(name="Shah Samaj")
+    db.session.add(samaj)
+    db.session.flush()
+    family = Family(name="Shah Family", samaj_id=samaj.id)
+    db.session.add(family)
+    db.session.flush()
+    member = Member(samaj_id=samaj.id, family_id=family.id, name="Ram Shah", family_role="Head",
+                    is_family_head=True, mobile_1="98765 43210")
+    db.session.add(member)
+    db.session.commit()
+    data = {"samaj": "Shah Samaj", "name": "Ram Shah", "mobile_1": "9123456789"}
+    assert service.update_member_phone(data, "+449876543210", db.session)[0] is False
+    assert service.update_member_phone(data, "+919876543210", db.session)[0] is True
+    assert db.session.get(Member, member.id).mobile_1 == "9123456789"
@@ -0,0 +1,77 @@
+# Author: SANJAY KR
+import pytest
+from flask import Flask
+from sqlalchemy import event
+from app import db
+from app.models.family import Samaj, Family, Member, family_role_summary
+
+@pytest.fixture
+def family():
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite://"
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        samaj = Samaj(name="Test Samaj")
+        db.session.add(samaj)
+        db.session.flush()
+        family = Family(name="Doe Family", samaj_id=samaj.id)
+        db.session.add(family)
+        db.session.flush()
+        db.session.add(Member(samaj_id=samaj.id, family_id=family.id, name="John Doe",
+                              family_role="Head", is_family_head=True, age=45))
+        db.session.commit()
+        yield family
+        db.session.remove()
+
+def add_member(family, name, role, age):
+    member = Member(samaj_id=family.samaj_id, family_id=family.id, name=name, family_role=role, age=age)
+    member.validate_family_role(db.session)
+    db.session.add(member)
+    db.session.flush()
+    return member
+
+def test_adding_member_loads_family_once(family):
+    """Test validating and inserting members runs one member query per transaction"""
+    member_selects = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT") and "FROM member" in statement:
+            member_selects.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", count)
+    try:
+        add_member(family, "Jane Doe", "Spouse", 42)
+        add_member(family, "Jim Doe", "Child", 12)
+        add_member(family, "Joy Doe", "Child", 9)
+    finally:
+        event.remove(db.engine, "before_cursor_execute", count)
+    assert len(member_selects) == 1
+
+def test_summary_tracks_inserts_within_transaction(family):
+    """Test the cached summary sees members added earlier in the same transaction"""
+    add_member(family, "Jane Doe", "Spouse", 42)
+    with pytest.raises(ValueError, match="already has a spouse member: Jane Doe"):
+        add_member(family, "Janet Doe", "Spouse", 40)
+    db.session.rollback()
+
+def test_summary_validates_ages_and_head(family):
+    """Test age and head rules use the youngest parent and the existing head"""
+    add_member(family, "Jane Doe", "Spouse", 30)
+    with pytest.raises(ValueError, match=r"parent's age \(30, Jane Doe\)"):
+        add_member(family, "Jim Doe", "Child", 35)
+    with pytest.raises(ValueError, match="already has a head member: John Doe"):
+        head = Member(samaj_id=family.samaj_id, family_id=family.id, name="Ram Doe",
+                      family_role="Head", is_family_head=True, age=50)
+        head.validate_family_role(db.session)
+    db.session.rollback()
+
+def test_summary_follows_deletes_and_is_dropped_on_commit(family):
+    """Test deleted members leave the summary and commits clear the cache"""
+    spouse = add_member(family, "Jane Doe", "Spouse", 42)
+    db.session.delete(spouse)
+    db.session.flush()
+    assert family_role_summary(db.session, family.id).role_counts() == {"Head": 1}
+    add_member(family, "Janet Doe", "Spouse", 40)
+    db.session.commit()
+    assert "family_role_summaries" not in db.session.info
@@ -0,0 +1,65 @@
+# Author: SANJAY KR
+import pytest
+from flask import Flask
+from app import db
+from app.models.family import Samaj, Family, Member
+from app.utils.generate_sample_data import generate_dataset, samaj_names
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite://"
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+
+def member_rows():
+    columns = [c for c in Member.__table__.c if c.name not in ("id", "created_at", "updated_at")]
+    return db.session.query(*columns).order_by(Member.family_id, Member.is_family_head.desc(), Member.id).all()
+
+def test_generates_requested_counts_with_valid_roles(app):
+    """Test every family gets a head and members that pass family role validation"""
+    with app.app_context():
+        stats = generate_dataset(db.session, samaj_count=12, families_per_samaj=4, members_per_family=6,
+                                 seed=7, batch_size=5)
+        assert (stats["samaj"], stats["families"], stats["members"]) == (12, 48, 288)
+        assert db.session.query(Samaj.name).order_by(Samaj.id).all()[-2:] == [("Bhram 2",), ("Sindhi 2",)]
+        for family in db.session.query(Family):
+            head = db.session.get(Member, family.head_of_family_id)
+            assert head.family_id == family.id and head.family_role == "Head"
+            for member in family.members:
+                member.validate_family_role(db.session)
+
+def test_same_seed_generates_same_data(app):
+    """Test the seed alone determines the data, whatever the batch size"""
+    with app.app_context():
+        generate_dataset(db.session, samaj_count=2, families_per_samaj=3, seed=42, batch_size=1)
+        first = member_rows()
+        db.session.query(Member).delete()
+        db.session.query(Family).delete()
+        db.session.query(Samaj).delete()
+        db.session.commit()
+        generate_dataset(db.session, samaj_count=2, families_per_samaj=3, seed=42, batch_size=4)
+        assert [row[2:] for row in member_rows()] == [row[2:] for row in first]
+
+def test_workers_generate_same_data_as_single_process(app):
+    """Test multiprocess generation inserts the same rows in the same order"""
+    with app.app_context():
+        generate_dataset(db.session, samaj_count=1, families_per_samaj=6, seed=3, batch_size=2)
+        single = member_rows()
+        db.session.query(Member).delete()
+        db.session.query(Family).delete()
+        db.session.query(Samaj).delete()
+        db.session.commit()
+        generate_dataset(db.session, samaj_count=1, families_per_samaj=6, seed=3, batch_size=2, workers=2)
+        assert [row[2:] for row in member_rows()] == [row[2:] for row in single]
+
+def test_existing_samaj_are_skipped(app):
+    """Test rerunning only fills Samaj that do not exist yet"""
+    with app.app_context():
+        generate_dataset(db.session, samaj_count=2, families_per_samaj=1, seed=1)
+        stats = generate_dataset(db.session, samaj_count=3, families_per_samaj=1, seed=1)
+        assert (stats["samaj"], stats["families"]) == (1, 1)
+        assert samaj_names(3)[2] == db.session.query(Samaj.name).order_by(Samaj.id.desc()).first()[0]
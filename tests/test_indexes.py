@@ -0,0 +1,70 @@
+# Author: SANJAY KR
+import os
+import pytest
+from flask import Flask
+from sqlalchemy import create_engine, func, text
+from sqlalchemy.exc import OperationalError
+from app import db
+from app.models.base import create_indexes
+from app.models.family import Samaj, Family, Member
+from tests.conftest import query_plan
+
+def test_foreign_key_and_filter_queries_use_indexes(app):
+    """Test the planner picks the FK and composite indexes for common lookups"""
+    with app.app_context():
+        head_lookup = db.session.query(Member.id).filter(Member.family_id == 1, Member.is_family_head == True)
+        assert "ix_member_family_id_is_family_head" in query_plan(head_lookup)
+
+        role_lookup = db.session.query(Member.id).filter(Member.samaj_id == 1, Member.family_role == "Head")
+        assert "ix_member_samaj_id_family_role" in query_plan(role_lookup)
+
+        blood_filter = db.session.query(Member.id).filter(Member.blood_group == "O+", Member.age >= 18)
+        assert "ix_member_blood_group_city_age" in query_plan(blood_filter)
+
+        head_name = db.session.query(Member.family_id).filter(
+            Member.samaj_id == 1, Member.is_family_head == True, func.lower(Member.name) == "ramesh shah"
+        )
+        assert "ix_member_samaj_id_lower_name" in query_plan(head_name)
+
+        families = db.session.query(Family.id).filter(Family.samaj_id == 1)
+        assert "ix_family_samaj_id" in query_plan(families)
+
+def test_create_indexes_adds_missing_indexes(app):
+    """Test indexes missing from an existing database are created, only those, and retired ones dropped"""
+    with app.app_context():
+        db.session.execute(text("DROP INDEX ix_member_name"))
+        db.session.execute(text("DROP INDEX ix_member_blood_group_city_age"))
+        db.session.execute(text("CREATE INDEX ix_member_blood_group_age ON member (blood_group, age)"))
+        db.session.commit()
+        assert create_indexes() == ["ix_member_blood_group_city_age", "ix_member_name"]
+        assert create_indexes() == []
+        indexes = db.session.execute(text("SELECT name FROM sqlite_master WHERE type = 'index'")).scalars()
+        assert "ix_member_blood_group_age" not in set(indexes)
+
+def test_substring_filters_use_trigram_indexes():
+    """Test ilike('%...%') filters use the pg_trgm indexes on PostgreSQL"""
+    url = os.environ.get("DATABASE_URL", "")
+    if not url.startswith("postgresql"):
+        pytest.skip("PostgreSQL not configured")
+    engine = create_engine(url)
+    try:
+        engine.connect().close()
+    except OperationalError:
+        pytest.skip("PostgreSQL not reachable")
+
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = url
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        create_indexes()
+        db.session.execute(text("SET enable_seqscan = off"))
+        for column, index in ((Member.name, "ix_member_name_trgm"),
+                              (Member.current_city, "ix_member_current_city_trgm"),
+                              (Member.profession_category, "ix_member_profession_category_trgm")):
+            query = db.session.query(Member.id).filter(column.ilike("%shah%"))
+            compiled = query.statement.compile(db.engine, compile_kwargs={"literal_binds": True})
+            plan = "\n".join(row[0] for row in db.session.execute(text(f"EXPLAIN {compiled}")))
+            assert index in plan
+        db.session.rollback()
+        db.session.remove()
@@ -0,0 +1,105 @@
+# Author: SANJAY KR
+import threading
+import time
+import pytest
+from flask import Flask
+from sqlalchemy import create_engine
+from app.services.message_dedup import InMemoryProcessedMessages, SQLProcessedMessages, create_processed_messages
+from app.services.session_store import create_session_store
+from app.services.whatsapp_service import WhatsAppService
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        return InMemoryProcessedMessages(ttl_seconds=60)
+    store = SQLProcessedMessages(create_engine(f"sqlite:///{tmp_path / 'messages.db'}"), ttl_seconds=60)
+    store.create_table()
+    return store
+
+@pytest.fixture
+def service():
+    app = Flask(__name__)
+    with app.app_context():
+        yield WhatsAppService()
+
+def test_put_and_get(store):
+    """Test a stored reply is returned for its MessageSid only, and counted"""
+    assert store.get("SM1") is None
+    store.put("SM1", "Please enter your name:", True)
+    store.put("SM1", "ignored", True)
+    assert store.get("SM1") == ("Please enter your name:", True)
+    assert store.stats() == {"hits": 1, "misses": 1, "entries": 1}
+
+def test_expired_replies_are_not_replayed(store):
+    """Test replies older than the TTL are treated as new messages"""
+    store.ttl_seconds = -1
+    store.put("SM1", "reply", True)
+    assert store.get("SM1") is None
+
+def test_memory_store_is_bounded():
+    """Test the in-memory store keeps only the newest max_entries replies"""
+    store = InMemoryProcessedMessages(ttl_seconds=60, max_entries=2)
+    for sid in ("SM1", "SM2", "SM3"):
+        store.put(sid, sid, True)
+    assert store.get("SM1") is None
+    assert store.get("SM3") == ("SM3", True)
+    assert store.stats()["entries"] == 2
+
+def test_retried_message_does_not_advance_step(service):
+    """Test a retry of the same MessageSid replays the reply instead of taking the next step"""
+    phone = "+919876543210"
+    service.handle_message(phone, "start", db=object(), message_sid="SM1")
+    first = service.handle_inbound(phone, "Test Samaj", db=object(), message_sid="SM2")
+    retry = service.handle_inbound(phone, "Test Samaj", db=object(), message_sid="SM2")
+    assert retry == (first[0], True, True)
+    assert first[2] is False
+    assert service.session_store.get(phone)["step"] == 1
+    assert service.session_store.get(phone)["data"] == {"samaj": "Test Samaj"}
+
+def test_retry_during_slow_original_waits_for_its_reply(service, monkeypatch):
+    """Test a retry arriving while the original is still processing is replayed, not re-run"""
+    app = Flask(__name__)
+    calls = []
+
+    def slow_process(phone_number, message, db):
+        calls.append(message)
+        time.sleep(0.2)
+        return f"processed {message}", True
+
+    monkeypatch.setattr(service, "_process_message", slow_process)
+    replies = []
+
+    def deliver():
+        with app.app_context():
+            replies.append(service.handle_inbound("+919876543210", "yes", db=object(), message_sid="SM9"))
+
+    threads = [threading.Thread(target=deliver) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+        time.sleep(0.05)
+    for thread in threads:
+        thread.join()
+    assert calls == ["yes"]
+    assert sorted(replies) == [("processed yes", True, False), ("processed yes", True, True)]
+
+def test_failed_messages_are_retried(service, monkeypatch):
+    """Test a failed attempt is not stored, so Twilio's retry runs the step again"""
+    results = iter([("Database error. Please try again later.", False), ("Saved", True)])
+    monkeypatch.setattr(service, "_process_message", lambda *args: next(results))
+    assert service.handle_message("+919876543210", "yes", db=object(), message_sid="SM5")[1] is False
+    assert service.handle_message("+919876543210", "yes", db=object(), message_sid="SM5") == ("Saved", True)
+    assert service.handle_inbound("+919876543210", "yes", db=object(), message_sid="SM5")[2] is True
+
+def test_shared_store_uses_session_transaction(tmp_path):
+    """Test the SQLite-backed store writes through the session lock's transaction instead of
+    waiting on the database lock that transaction holds"""
+    app = Flask(__name__)
+    app.config.update(SESSION_STORE="sqlite", SESSION_STORE_URL=f"sqlite:///{tmp_path / 'sessions.db'}")
+    with app.app_context():
+        service = WhatsAppService()
+        service.session_store = create_session_store(app)
+        service.processed_messages = create_processed_messages(app, service.session_store)
+        started = time.perf_counter()
+        service.handle_message("+919876543210", "start", db=object(), message_sid="SM1")
+        assert service.handle_inbound("+919876543210", "start", db=object(), message_sid="SM1")[2] is True
+        assert time.perf_counter() - started < 1
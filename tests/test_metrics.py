@@ -0,0 +1,45 @@
+# Author: SANJAY KR
+from flask import Flask
+from app.routes.metrics import metrics_bp
+from app.utils.metrics import MetricsRegistry, metrics
+
+def test_span_records_histogram_and_quantiles():
+    """Test spans feed cumulative buckets, sum/count and quantile gauges"""
+    registry = MetricsRegistry()
+    for _ in range(10):
+        with registry.span("parse_form"):
+            pass
+    registry.observe("webhook_stage_seconds", 3.0, stage="twilio_send")
+    output = registry.render()
+    assert "# TYPE webhook_stage_seconds histogram" in output
+    assert 'webhook_stage_seconds_bucket{stage="parse_form",le="+Inf"} 10' in output
+    assert 'webhook_stage_seconds_count{stage="parse_form"} 10' in output
+    assert 'webhook_stage_seconds_bucket{stage="twilio_send",le="2.5"} 0' in output
+    assert 'webhook_stage_seconds_quantile{stage="twilio_send",quantile="0.99"} 3.0' in output
+
+def test_counters_and_gauges_render():
+    """Test per-step counters and registered gauge sources appear in the scrape output"""
+    registry = MetricsRegistry()
+    registry.increment("conversation_step_total", flow="registration", step="age", result="invalid")
+    registry.increment("conversation_step_total", flow="registration", step="age", result="invalid")
+    registry.register_gauges("outbound_queue", lambda: {"pending": 3})
+    output = registry.render()
+    assert 'conversation_step_total{flow="registration",result="invalid",step="age"} 2' in output
+    assert "# TYPE outbound_queue_pending gauge" in output
+    assert "outbound_queue_pending 3" in output
+
+def test_label_values_are_escaped():
+    """Test quotes and newlines in label values do not break the text format"""
+    registry = MetricsRegistry()
+    registry.increment("requests_total", step='say "hi"\n')
+    assert 'requests_total{step="say \\"hi\\"\\n"} 1' in registry.render()
+
+def test_metrics_endpoint():
+    """Test /metrics serves the Prometheus text format"""
+    app = Flask(__name__)
+    app.register_blueprint(metrics_bp)
+    metrics.increment("conversation_step_total", flow="registration", step="samaj", result="valid")
+    response = app.test_client().get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+    assert b"conversation_step_total" in response.data
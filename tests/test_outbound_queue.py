@@ -0,0 +1,130 @@
+# Author: SANJAY KR
+import asyncio
+import pytest
+from twilio.base.exceptions import TwilioRestException
+from app.services.fake_twilio import FakeTwilioClient
+from app.services.outbound_queue import OutboundQueue, OutboundQueueFull
+from app.services.async_outbound import AsyncOutboundQueue
+
+def make_queue(client, **kwargs):
+    return OutboundQueue(
+        lambda from_, to, body: client.messages.create(from_=from_, body=body, to=to),
+        backoff_seconds=0, **kwargs
+    )
+
+def test_messages_to_one_destination_keep_order():
+    """Test messages to the same phone are delivered in the order queued"""
+    client = FakeTwilioClient()
+    outbound = make_queue(client, workers=4)
+    for i in range(50):
+        for phone in ("whatsapp:+911111111111", "whatsapp:+912222222222"):
+            assert outbound.enqueue(phone, "whatsapp:+14155238886", str(i))
+    outbound.join()
+    outbound.close()
+    for phone in ("whatsapp:+911111111111", "whatsapp:+912222222222"):
+        assert [m.body for m in client.sent if m.to == phone] == [str(i) for i in range(50)]
+
+def test_throttled_sends_are_retried():
+    """Test Twilio 429 responses are retried until they succeed"""
+    client = FakeTwilioClient(failure_rate=0.3, seed=7)
+    outbound = make_queue(client, workers=2, max_retries=10)
+    for i in range(100):
+        outbound.enqueue(f"whatsapp:+91111111{i:04d}", "whatsapp:+14155238886", "hello")
+    outbound.join()
+    outbound.close()
+    stats = outbound.stats()
+    assert stats["sent"] == 100
+    assert stats["retried"] == client.failed_count > 0
+    assert stats["failed"] == 0
+
+def test_client_errors_are_not_retried():
+    """Test non-retryable Twilio errors fail immediately"""
+    calls = []
+
+    def send(from_, to, body):
+        calls.append(to)
+        raise TwilioRestException(400, "/Messages.json", "Invalid 'To' Phone Number")
+
+    outbound = OutboundQueue(send, workers=1, backoff_seconds=0)
+    outbound.enqueue("whatsapp:+911111111111", "whatsapp:+14155238886", "hello")
+    outbound.join()
+    outbound.close()
+    assert len(calls) == 1
+    assert outbound.stats()["failed"] == 1
+
+def test_async_queue_keeps_order_and_retries():
+    """Test the coroutine sender keeps per-phone order and retries throttled sends"""
+    client = FakeTwilioClient(failure_rate=0.3, seed=7)
+
+    async def scenario():
+        outbound = AsyncOutboundQueue(
+            lambda from_, to, body: client.messages.create_async(from_=from_, body=body, to=to),
+            workers=8, max_retries=10, backoff_seconds=0
+        )
+        outbound.start()
+        for i in range(50):
+            for phone in ("whatsapp:+911111111111", "whatsapp:+912222222222"):
+                assert outbound.enqueue(phone, "whatsapp:+14155238886", str(i))
+        await outbound.join()
+        await outbound.close()
+        return outbound.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["sent"] == 100
+    assert stats["retried"] == client.failed_count > 0
+    for phone in ("whatsapp:+911111111111", "whatsapp:+912222222222"):
+        assert [m.body for m in client.sent if m.to == phone] == [str(i) for i in range(50)]
+
+def test_reserved_places_bound_the_queue():
+    """Test reservations count against the queue size and an unused one is given back"""
+    client = FakeTwilioClient()
+    outbound = make_queue(client, workers=1, max_pending=1, enqueue_timeout=0)
+    reservation = outbound.reserve("whatsapp:+911111111111")
+    with pytest.raises(OutboundQueueFull):
+        outbound.reserve("whatsapp:+912222222222", timeout=0)
+    assert not outbound.enqueue("whatsapp:+912222222222", "whatsapp:+14155238886", "dropped")
+    reservation.release()
+    reservation.release()
+    assert outbound.enqueue("whatsapp:+912222222222", "whatsapp:+14155238886", "sent")
+    outbound.join()
+    outbound.close()
+    assert [m.body for m in client.sent] == ["sent"]
+    assert outbound.stats()["dropped"] == 1
+
+@pytest.fixture
+def flask_app(monkeypatch, tmp_path):
+    monkeypatch.setenv("FLASK_ENV", "development")
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path}/outbound.db")
+    monkeypatch.setenv("SESSION_STORE", "memory")
+    monkeypatch.setenv("OUTBOUND_QUEUE_WORKERS", "1")
+    monkeypatch.setenv("OUTBOUND_QUEUE_SIZE", "1")
+    monkeypatch.setenv("OUTBOUND_RESERVE_TIMEOUT", "0")
+    from app import create_app
+    return create_app()
+
+def test_full_queue_refuses_webhook_before_step_advances(flask_app):
+    """Test a webhook that finds the outbound queue full gets 503 with the session unchanged,
+    so Twilio's redelivery takes the step and its reply is sent"""
+    from app.services.whatsapp_service import whatsapp_address
+    service = flask_app.extensions["whatsapp_service"]
+    client = flask_app.test_client()
+    phone = "+919812345678"
+
+    def post(body, sid):
+        return client.post("/api/v1/whatsapp/webhook", data={
+            "From": f"whatsapp:{phone}", "Body": body, "MessageSid": sid, "NumMedia": "0"
+        })
+
+    assert post("start", "SMfull0").status_code == 200
+    service.outbound_queue.join()
+    held = service.outbound_queue.reserve(whatsapp_address(phone))
+    response = post("Shah Samaj", "SMfull1")
+    assert response.status_code == 503 and response.headers["Retry-After"] == "5"
+    session = service.session_store.get(phone)
+    assert session["step"] == 0 and "samaj" not in session.get("data", {})
+
+    held.release()
+    assert post("Shah Samaj", "SMfull1").status_code == 200
+    service.outbound_queue.join()
+    assert service.session_store.get(phone)["data"]["samaj"] == "Shah Samaj"
+    assert service.outbound_queue.stats()["sent"] == 2
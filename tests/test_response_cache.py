@@ -0,0 +1,91 @@
+# Author: SANJAY KR
+import io
+import pytest
+from app import db
+from app.models.family import Member
+from app.models.versions import read_versions
+from app.services.bulk_import import import_members
+from app.utils.response_cache import ResponseCache
+from tests.conftest import count_queries, family_csv, seed
+
+@pytest.fixture(autouse=True)
+def families(app):
+    seed(2, 2)
+
+def test_writes_bump_table_versions(app):
+    """Test ORM flushes, bulk statements and executemany imports bump their tables' versions"""
+    before = read_versions(db.session, ("samaj", "family", "member"))
+    db.session.query(Member).filter_by(name="Head 0-0").one().age = 50
+    db.session.commit()
+    after_update = read_versions(db.session, ("samaj", "family", "member"))
+    assert after_update["member"][0] == before["member"][0] + 1
+    assert after_update["samaj"] == before["samaj"]
+
+    import_members(db.session, io.StringIO(family_csv(2)), "csv")
+    after_import = read_versions(db.session, ("samaj", "family", "member"))
+    assert all(after_import[name][0] > after_update[name][0] for name in after_import)
+
+    db.session.query(Member).filter(Member.name == "Child 0").delete()
+    db.session.commit()
+    assert read_versions(db.session, ("member",))["member"][0] > after_import["member"][0]
+
+def test_versions_are_bumped_after_commit(app):
+    """Test the data transaction leaves table_version alone; the bump follows the commit"""
+    before = read_versions(db.session, ("member",))["member"]
+    db.session.query(Member).filter_by(name="Head 0-0").one().age = 50
+    with count_queries() as statements:
+        db.session.flush()
+    assert not any("table_version" in statement for statement in statements)
+    db.session.rollback()
+    assert read_versions(db.session, ("member",))["member"] == before
+
+    db.session.query(Member).filter_by(name="Head 0-0").one().age = 51
+    db.session.commit()
+    version, updated_at = read_versions(db.session, ("member",))["member"]
+    assert version == before[0] + 1 and updated_at >= before[1]
+
+def test_repeated_reads_cost_one_query(client, auth_headers):
+    """Test a repeated request is served from the cache after reading table_version only"""
+    first = client.get("/api/v1/admin/samaj", headers=auth_headers)
+    with count_queries() as statements:
+        second = client.get("/api/v1/admin/samaj", headers=auth_headers)
+    assert second.status_code == 200
+    assert second.get_data() == first.get_data()
+    assert second.headers["ETag"] == first.headers["ETag"]
+    assert len(statements) == 1 and "table_version" in statements[0]
+
+def test_matching_etag_gets_304(client, auth_headers):
+    """Test If-None-Match answers 304 until a write changes the data; If-Modified-Since alone never does"""
+    first = client.get("/api/v1/admin/members/1", headers=auth_headers)
+    etag, modified = first.headers["ETag"], first.headers["Last-Modified"]
+    response = client.get("/api/v1/admin/members/1", headers=dict(auth_headers, **{"If-None-Match": etag}))
+    assert response.status_code == 304 and response.get_data() == b""
+    response = client.get("/api/v1/admin/members/1", headers=dict(auth_headers, **{"If-Modified-Since": modified}))
+    assert response.status_code == 200
+
+    db.session.get(Member, 1).current_city = "Surat"
+    db.session.commit()
+    response = client.get("/api/v1/admin/members/1", headers=dict(auth_headers, **{"If-None-Match": etag}))
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert response.json["current_city"] == "Surat"
+
+def test_errors_are_not_cached(client, auth_headers):
+    """Test a 404 is recomputed rather than served from the cache"""
+    assert client.get("/api/v1/admin/members/999", headers=auth_headers).status_code == 404
+    db.session.add(Member(id=999, samaj_id=1, family_id=1, name="Late", family_role="Other", age=30))
+    db.session.commit()
+    assert client.get("/api/v1/admin/members/999", headers=auth_headers).json["name"] == "Late"
+
+def test_cache_evicts_least_recently_used_within_byte_budget():
+    """Test entries are evicted oldest first to stay within the entry and byte limits"""
+    cache = ResponseCache(max_entries=3, max_bytes=10)
+    cache.put("a", "v1", b"1234", "application/json")
+    cache.put("b", "v1", b"1234", "application/json")
+    assert cache.get("a", "v1") == (b"1234", "application/json")
+    cache.put("c", "v1", b"1234", "application/json")
+    assert cache.get("b", "v1") is None
+    assert cache.get("a", "v2") is None
+    assert cache.get("c", "v1") is not None
+    cache.put("huge", "v1", b"x" * 11, "application/json")
+    assert cache.stats()["entries"] == 2 and cache.stats()["bytes"] == 8
@@ -0,0 +1,41 @@
+# Author: SANJAY KR
+import pytest
+from sqlalchemy import create_engine
+from app.services.fake_twilio import FakeTwilioClient
+from app.services.send_rate import InMemorySendRate, SQLSendRate, TokenBucket
+from app.services.whatsapp_service import WhatsAppService
+
+SENDER = "whatsapp:+14155238886"
+
+def test_token_bucket_spaces_calls_at_the_rate():
+    """Test the bucket allows its burst, then makes callers wait 1/rate per token"""
+    now = [0.0]
+    waits = []
+    bucket = TokenBucket(rate=10, burst=2, clock=lambda: now[0], sleep=waits.append)
+    assert [bucket.acquire() for _ in range(4)] == [0.0, 0.0, pytest.approx(0.1), pytest.approx(0.2)]
+    now[0] = 1.0
+    assert bucket.acquire() == 0.0
+
+def test_workers_share_the_sender_bucket(tmp_path):
+    """Test limiters of two workers on one database draw from a single bucket per sender"""
+    now = [1000.0]
+    engine = create_engine(f"sqlite:///{tmp_path}/send_rate.db")
+    workers = [SQLSendRate(engine, rate=10, burst=2, clock=lambda: now[0]) for _ in range(2)]
+    workers[0].create_table()
+    waits = [workers[i % 2].reserve(SENDER) for i in range(4)]
+    assert waits == [0.0, 0.0, pytest.approx(0.1), pytest.approx(0.2)]
+    assert workers[1].reserve("whatsapp:+14155230000") == 0.0
+    now[0] += 10
+    assert workers[0].reserve(SENDER) == 0.0
+
+def test_replies_wait_for_the_sender_rate():
+    """Test every Twilio send from the service, reply or broadcast, books the sender's rate"""
+    now = [0.0]
+    waits = []
+    service = WhatsAppService()
+    service.client = FakeTwilioClient()
+    service.send_rate = InMemorySendRate(rate=5, burst=1, clock=lambda: now[0], sleep=waits.append)
+    for i in range(3):
+        service._deliver(SENDER, f"whatsapp:+91980000000{i}", "hello")
+    assert waits == [pytest.approx(0.2), pytest.approx(0.4)]
+    assert len(service.client.sent) == 3
@@ -0,0 +1,149 @@
+# Author: SANJAY KR
+import threading
+import pytest
+from sqlalchemy import create_engine
+from app.services.session_store import (
+    InMemorySessionStore, SQLSessionStore, create_store_engine, serialize_session, deserialize_session
+)
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        return InMemorySessionStore(ttl_seconds=60)
+    engine = create_engine(f"sqlite:///{tmp_path / 'sessions.db'}")
+    store = SQLSessionStore(engine, ttl_seconds=60)
+    store.create_table()
+    return store
+
+def test_save_and_get(store):
+    """Test a saved session can be read back"""
+    store.save("+911234567890", {"step": 3, "data": {"samaj": "Test Samaj"}})
+    session = store.get("+911234567890")
+    assert session["step"] == 3
+    assert session["data"]["samaj"] == "Test Samaj"
+    assert "+919999999999" not in store
+
+def test_lock_writes_back_in_place_changes(store):
+    """Test changes made to a session inside lock() are persisted on exit"""
+    store.save("+911234567890", {"step": 0, "data": {}})
+    with store.lock("+911234567890"):
+        session = store.get("+911234567890")
+        session["step"] = 1
+        session["data"]["samaj"] = "Test Samaj"
+    assert store.get("+911234567890") == {"step": 1, "data": {"samaj": "Test Samaj"}}
+
+def test_lock_delete(store):
+    """Test deleting a session inside lock() removes it"""
+    store.save("+911234567890", {"step": 28, "data": {}})
+    with store.lock("+911234567890"):
+        store.delete("+911234567890")
+        assert store.get("+911234567890") is None
+    assert store.get("+911234567890") is None
+
+def test_expired_session_is_not_returned(store):
+    """Test sessions past their TTL are treated as missing"""
+    store.ttl_seconds = -1
+    store.save("+911234567890", {"step": 5, "data": {}})
+    assert store.get("+911234567890") is None
+
+def test_lock_serializes_same_phone():
+    """Test concurrent locked updates for one phone are applied one at a time"""
+    store = InMemorySessionStore()
+    store.save("+911234567890", {"step": 0})
+
+    def advance():
+        for _ in range(200):
+            with store.lock("+911234567890"):
+                session = store.get("+911234567890")
+                session["step"] = session["step"] + 1
+
+    threads = [threading.Thread(target=advance) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert store.get("+911234567890")["step"] == 800
+
+def test_lock_serializes_same_phone_across_workers(tmp_path):
+    """Test stores in different workers sharing a database never lose a step, even for a new phone"""
+    url = f"sqlite:///{tmp_path / 'sessions.db'}"
+    stores = [SQLSessionStore(create_engine(url), ttl_seconds=60) for _ in range(4)]
+    stores[0].create_table()
+
+    def advance(store):
+        for _ in range(50):
+            with store.lock("+911234567890"):
+                session = store.get("+911234567890") or {"step": 0}
+                session["step"] += 1
+                store.save("+911234567890", session)
+
+    threads = [threading.Thread(target=advance, args=(store,)) for store in stores]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert stores[0].get("+911234567890")["step"] == 200
+
+def test_other_phones_are_not_blocked():
+    """Test a phone held in lock() does not block a phone on another stripe"""
+    store = InMemorySessionStore(lock_stripes=2)
+    phones = ["+911234567890"]
+    phones.append(next(p for p in (f"+9198765432{i:02d}" for i in range(100))
+                       if hash(p) % 2 != hash(phones[0]) % 2))
+    entered = threading.Event()
+
+    def other():
+        with store.lock(phones[1]):
+            entered.set()
+
+    with store.lock(phones[0]):
+        thread = threading.Thread(target=other)
+        thread.start()
+        assert entered.wait(1)
+    thread.join()
+
+def test_serialization_round_trip():
+    """Test sessions survive the compact serialized form"""
+    session = {"step": 2, "data": {"name": "John Doe"}, "family_context": {"family_roles": {}}}
+    payload = serialize_session(session)
+    assert isinstance(payload, bytes)
+    assert deserialize_session(payload) == session
+
+def test_sweep_evicts_expired_and_remembers_phone(store):
+    """Test the sweeper evicts idle sessions and flags the phone as expired once"""
+    store.ttl_seconds = -1
+    store.save("+919999999999", {"step": 2, "data": {}})
+    store.ttl_seconds = 60
+    store.save("+911234567890", {"step": 5, "data": {}})
+    assert store.sweep() == 1
+    assert store.stats()["live_sessions"] == 1
+    assert store.stats()["evictions_expired"] == 1
+    assert store.pop_expired("+919999999999") is True
+    assert store.pop_expired("+919999999999") is False
+    assert store.pop_expired("+911234567890") is False
+
+def test_memory_cap_evicts_least_recently_written():
+    """Test the in-memory store never holds more than max_sessions"""
+    store = InMemorySessionStore(max_sessions=2)
+    store.save("+911111111111", {"step": 1})
+    store.save("+912222222222", {"step": 1})
+    with store.lock("+911111111111"):
+        store.get("+911111111111")["step"] = 2
+    store.save("+913333333333", {"step": 1})
+    assert len(store) == 2
+    assert store.get("+912222222222") is None
+    assert store.get("+911111111111") == {"step": 2}
+    assert store.pop_expired("+912222222222") is True
+    stats = store.stats()
+    assert stats["evictions_capacity"] == 1
+    assert stats["bytes_estimate"] > 0
+
+def test_postgres_store_has_its_own_pool(tmp_path):
+    """Test the postgres store never borrows the app's pool, even on the app's database"""
+    class App:
+        config = {"SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'app.db'}",
+                  "DB_POOL_SIZE": 20, "SESSION_STORE_POOL_SIZE": 3, "SESSION_STORE_MAX_OVERFLOW": 1}
+    engine = create_store_engine(App, "postgres")
+    assert str(engine.url) == App.config["SQLALCHEMY_DATABASE_URI"]
+    assert engine.pool.size() == 3
+    assert engine.pool._max_overflow == 1
@@ -0,0 +1,75 @@
+# Author: SANJAY KR
+import pytest
+from sqlalchemy import inspect
+from app import create_app, db
+from app.utils.startup import prepare_database
+
+@pytest.fixture
+def lazy_app(monkeypatch, tmp_path):
+    monkeypatch.setenv("FLASK_ENV", "development")
+    monkeypatch.setenv("LAZY_STARTUP", "1")
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path}/startup.db")
+    monkeypatch.setenv("SESSION_STORE", "memory")
+    return create_app()
+
+def test_lazy_startup_leaves_schema_to_preflight(lazy_app):
+    """Test a lazy boot creates no tables and the admin-only deep health check reports them missing"""
+    with lazy_app.app_context():
+        assert inspect(db.engine).get_table_names() == []
+    client = lazy_app.test_client()
+    response = client.get("/health")
+    assert response.status_code == 200
+    assert response.get_json()["boot_seconds"] > 0
+    assert client.get("/health?deep=1").status_code == 401
+    with lazy_app.app_context():
+        from app.controllers.auth_controller import create_access_token
+        headers = {"Authorization": f"Bearer {create_access_token({'sub': 'admin'})}"}
+    response = client.get("/health?deep=1", headers=headers)
+    assert response.status_code == 503
+    checks = response.get_json()["checks"]
+    assert checks["database"]["error"] == "missing tables: broadcast_job, broadcast_recipient, family, member, member_stat, member_stat_delta, member_tag, samaj, table_version, tag"
+    assert checks["twilio"]["skipped"] == "development mode"
+
+    prepare_database(lazy_app, sample_data=False)
+    assert client.get("/health?deep=1", headers=headers).status_code == 200
+
+def test_preflight_command(lazy_app):
+    """Test flask preflight fails on a missing schema and passes once it creates the tables"""
+    runner = lazy_app.test_cli_runner()
+    result = runner.invoke(args=["preflight"])
+    assert result.exit_code == 1
+    assert "database: FAILED" in result.output
+    result = runner.invoke(args=["preflight", "--create-tables"])
+    assert result.exit_code == 0, result.output
+    assert "database: ok" in result.output
+
+def test_lazy_startup_leaves_store_tables_to_preflight(monkeypatch, tmp_path):
+    """Test a lazy boot skips the session, MessageSid and send rate store DDL, which preflight reports and creates"""
+    monkeypatch.setenv("FLASK_ENV", "development")
+    monkeypatch.setenv("LAZY_STARTUP", "1")
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path}/startup.db")
+    monkeypatch.setenv("SESSION_STORE", "sqlite")
+    monkeypatch.setenv("SESSION_STORE_URL", f"sqlite:///{tmp_path}/sessions.db")
+    app = create_app()
+    store = app.extensions["whatsapp_service"].session_store
+    assert inspect(store.engine).get_table_names() == []
+    runner = app.test_cli_runner()
+    result = runner.invoke(args=["preflight"])
+    assert all(name in result.output for name in ("send_rate", "whatsapp_message", "whatsapp_session"))
+    result = runner.invoke(args=["preflight", "--create-tables"])
+    assert result.exit_code == 0, result.output
+    assert sorted(inspect(store.engine).get_table_names()) == ["send_rate", "whatsapp_message", "whatsapp_session"]
+    store.stop_sweeper()
+
+def test_lazy_production_boot_skips_twilio(monkeypatch, tmp_path):
+    """Test a lazy production boot makes no Twilio call and builds the client on first use"""
+    monkeypatch.setenv("FLASK_ENV", "production")
+    monkeypatch.setenv("LAZY_STARTUP", "true")
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path}/startup.db")
+    monkeypatch.setenv("TWILIO_ACCOUNT_SID", "ACtest")
+    monkeypatch.setenv("TWILIO_AUTH_TOKEN", "token")
+    app = create_app()
+    service = app.extensions["whatsapp_service"]
+    assert service._client is None
+    assert service.client.username == "ACtest"
+    service.outbound_queue.close()
@@ -0,0 +1,99 @@
+# Author: SANJAY KR
+import io
+import json
+import pytest
+from sqlalchemy import select, text
+from app import db
+from app.controllers.admin_controller import get_members_page
+from app.models.family import Member
+from app.models.tags import MemberTag, Tag, backfill_member_tags, split_tags
+from app.services.bulk_import import import_members
+from tests.conftest import count_queries, seed
+
+@pytest.fixture(autouse=True)
+def families(app):
+    seed(1, 3)
+
+def _tag(name, **tags):
+    member = db.session.query(Member).filter_by(name=name).one()
+    for column, value in tags.items():
+        setattr(member, column, value)
+    return member
+
+def _member_tags():
+    rows = db.session.execute(
+        select(Member.name, Tag.kind, Tag.label).
+        join(MemberTag, MemberTag.member_id == Member.id).
+        join(Tag, Tag.id == MemberTag.tag_id)
+    ).all()
+    return sorted(tuple(row) for row in rows)
+
+def test_split_tags_normalizes_entries():
+    """Test entries are trimmed, matched case-insensitively and de-duplicated"""
+    assert split_tags(" Gujarati,  hindi ,GUJARATI,, Public   Speaking") == {
+        "gujarati": "Gujarati", "hindi": "hindi", "public speaking": "Public Speaking"
+    }
+    assert split_tags(None) == split_tags("skip") == {}
+
+def test_tags_follow_member_saves(app):
+    """Test ORM inserts, updates and deletes keep the tag tables equal to a backfill"""
+    _tag("Head 0-0", languages_known="Gujarati, Hindi", skills="Teaching")
+    _tag("Spouse 0-0", languages_known="gujarati", hobbies="Music")
+    db.session.commit()
+    _tag("Head 0-0", skills="Teaching, Writing")
+    db.session.delete(db.session.query(Member).filter_by(name="Spouse 0-0").one())
+    db.session.commit()
+
+    tags = _member_tags()
+    assert tags == [
+        ("Head 0-0", "language", "Gujarati"), ("Head 0-0", "language", "Hindi"),
+        ("Head 0-0", "skill", "Teaching"), ("Head 0-0", "skill", "Writing"),
+    ]
+    assert backfill_member_tags(db.session, batch_size=2) == 8
+    assert _member_tags() == tags
+
+def test_bulk_import_writes_tags(app):
+    """Test executemany imports tag the members they insert"""
+    records = [
+        {"samaj": "Shah Samaj", "name": "Head A", "gender": "Male", "age": 45, "blood_group": "B+",
+         "family_role": "Head", "languages_known": "Gujarati, English", "skills": "Teaching"},
+        {"samaj": "Shah Samaj", "name": "Spouse A", "gender": "Female", "age": 42, "blood_group": "A+",
+         "family_role": "Spouse", "family_head": "Head A", "hobbies": "Music"},
+    ]
+    data = "".join(json.dumps(record) + "\n" for record in records)
+    report = import_members(db.session, io.StringIO(data), "ndjson")
+    assert (report.imported, report.failed) == (2, 0)
+    assert [row for row in _member_tags() if row[0] in ("Head A", "Spouse A")] == [
+        ("Head A", "language", "English"), ("Head A", "language", "Gujarati"),
+        ("Head A", "skill", "Teaching"), ("Spouse A", "hobby", "Music"),
+    ]
+
+def test_tag_filters_match_any_or_all(client, auth_headers):
+    """Test tag filters combine across kinds and match any or all tags of a kind"""
+    _tag("Head 0-0", languages_known="Gujarati, Hindi", skills="Teaching")
+    _tag("Head 0-1", languages_known="Gujarati", skills="Teaching")
+    _tag("Head 0-2", languages_known="Hindi", skills="Cooking")
+    db.session.commit()
+
+    def names(**filters):
+        rows, _ = get_members_page(db.session, filters)
+        return sorted(row["name"] for row in rows)
+
+    assert names(language="gujarati", skill="Teaching") == ["Head 0-0", "Head 0-1"]
+    assert names(language="Gujarati,Hindi") == ["Head 0-0", "Head 0-1", "Head 0-2"]
+    assert names(language="Gujarati,Hindi", tag_match="all") == ["Head 0-0"]
+    assert names(language="Tamil") == []
+
+    with count_queries() as statements:
+        data = client.get("/api/v1/admin/members?language=Hindi&skill=Cooking", headers=auth_headers).json
+    assert [row["name"] for row in data] == ["Head 0-2"]
+    assert not any("LIKE" in statement.upper() for statement in statements)
+
+def test_tag_filter_uses_indexes(app):
+    """Test the tag lookup is answered from the tag and member_tag indexes"""
+    plan = " ".join(str(row[-1]) for row in db.session.execute(text(
+        "EXPLAIN QUERY PLAN SELECT member_tag.member_id FROM member_tag JOIN tag ON tag.id = member_tag.tag_id "
+        "WHERE tag.kind = 'language' AND tag.name IN ('gujarati', 'hindi')"
+    )))
+    assert "SCAN" not in plan
+    assert "ix_member_tag_tag_id_member_id" in plan